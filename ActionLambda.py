@@ -1,103 +1,1147 @@
+import os
+import re
+import csv
 import json
+import time
+import heapq
+from array import array
+from bisect import bisect_left
+from collections import Counter, namedtuple
+from operator import itemgetter
 
-def lambda_handler(event, context):
-    print(event)
-  
-    # Mock data for demonstration purposes
-    company_data = [
-        #Technology Industry
-        {"companyId": 1, "companyName": "TechStashNova Inc.", "industrySector": "Technology", "revenue": 10000, "expenses": 3000, "profit": 7000, "employees": 10},
-        {"companyId": 2, "companyName": "QuantumPirateLeap Technologies", "industrySector": "Technology", "revenue": 20000, "expenses": 4000, "profit": 16000, "employees": 10},
-        {"companyId": 3, "companyName": "CyberCipherSecure IT", "industrySector": "Technology", "revenue": 30000, "expenses": 5000, "profit": 25000, "employees": 10},
-        {"companyId": 4, "companyName": "DigitalMyricalDreams Gaming", "industrySector": "Technology", "revenue": 40000, "expenses": 6000, "profit": 34000, "employees": 10},
-        {"companyId": 5, "companyName": "NanoMedNoLand Pharmaceuticals", "industrySector": "Technology", "revenue": 50000, "expenses": 7000, "profit": 43000, "employees": 10},
-        {"companyId": 6, "companyName": "RoboSuperBombTech Industries", "industrySector": "Technology", "revenue": 60000, "expenses": 8000, "profit": 52000, "employees": 12},
-        {"companyId": 7, "companyName": "FuturePastNet Solutions", "industrySector": "Technology",  "revenue": 60000, "expenses": 9000, "profit": 51000, "employees": 10},
-        {"companyId": 8, "companyName": "InnovativeCreativeAI Corp", "industrySector": "Technology", "revenue": 65000, "expenses": 10000, "profit": 55000, "employees": 15},
-        {"companyId": 9, "companyName": "EcoLeekoTech Energy", "industrySector": "Technology", "revenue": 70000, "expenses": 11000, "profit": 59000, "employees": 10},
-        {"companyId": 10, "companyName": "TechyWealthHealth Systems", "industrySector": "Technology", "revenue": 80000, "expenses": 12000, "profit": 68000, "employees": 10},
-    
-        #Real Estate Industry
-        {"companyId": 11, "companyName": "LuxuryToNiceLiving Real Estate", "industrySector": "Real Estate", "revenue": 90000, "expenses": 13000, "profit": 77000, "employees": 10},
-        {"companyId": 12, "companyName": "UrbanTurbanDevelopers Inc.", "industrySector": "Real Estate", "revenue": 100000, "expenses": 14000, "profit": 86000, "employees": 10},
-        {"companyId": 13, "companyName": "SkyLowHigh Towers", "industrySector": "Real Estate", "revenue": 110000, "expenses": 15000, "profit": 95000, "employees": 18},
-        {"companyId": 14, "companyName": "GreenBrownSpace Properties", "industrySector": "Real Estate", "revenue": 120000, "expenses": 16000, "profit": 104000, "employees": 10},
-        {"companyId": 15, "companyName": "ModernFutureHomes Ltd.", "industrySector": "Real Estate", "revenue": 130000, "expenses": 17000, "profit": 113000, "employees": 10},
-        {"companyId": 16, "companyName": "CityCountycape Estates", "industrySector": "Real Estate", "revenue": 140000, "expenses": 18000, "profit": 122000, "employees": 10},
-        {"companyId": 17, "companyName": "CoastalFocalRealty Group", "industrySector": "Real Estate", "revenue": 150000, "expenses": 19000, "profit": 131000, "employees": 10},
-        {"companyId": 18, "companyName": "InnovativeModernLiving Spaces", "industrySector": "Real Estate", "revenue": 160000, "expenses": 20000, "profit": 140000, "employees": 10},
-        {"companyId": 19, "companyName": "GlobalRegional Properties Alliance", "industrySector": "Real Estate", "revenue": 170000, "expenses": 21000, "profit": 149000, "employees": 11},
-        {"companyId": 20, "companyName": "NextGenPast Residences", "industrySector": "Real Estate", "revenue": 180000, "expenses": 22000, "profit": 158000, "employees": 260}
-    ]
-    
-  
-    def get_named_parameter(event, name):
-        return next(item for item in event['parameters'] if item['name'] == name)['value']
-    
-    def get_named_property(event, name):
-        return next(item for item in event['requestBody']['content']['application/json']['properties'] if item['name'] == name)['value']
+# cfn/2-bedrock-agent-lambda-template.yaml deploys this file from a zip in
+# S3 (ActionCodeS3Bucket/ActionCodeS3Key), together with ActionSchema.json.
 
- 
-    def companyResearch(event):
-        companyName = get_named_parameter(event, 'name').lower()
-        print("NAME PRINTED: ", companyName)
-        
-        for company_info in company_data:
-            if company_info["companyName"].lower() == companyName:
-                return company_info
+# NumPy is optional (portfolio queries fall back to pure Python) and is
+# imported on first use by load_numpy: importing it is most of the cold
+# start, and the common "top N by profit" query never needs it.
+np = None
+_numpy_loaded = False
+
+
+def load_numpy():
+    """Imports NumPy on first call; returns the module, or None if it is not installed."""
+    global np, _numpy_loaded
+    if not _numpy_loaded:
+        try:
+            import numpy
+            np = numpy
+        except ImportError:
+            np = None
+        _numpy_loaded = True
+    return np
+
+# Mock data for demonstration purposes
+COMPANY_DATA = [
+    #Technology Industry
+    {"companyId": 1, "companyName": "TechStashNova Inc.", "industrySector": "Technology", "revenue": 10000, "expenses": 3000, "profit": 7000, "employees": 10},
+    {"companyId": 2, "companyName": "QuantumPirateLeap Technologies", "industrySector": "Technology", "revenue": 20000, "expenses": 4000, "profit": 16000, "employees": 10},
+    {"companyId": 3, "companyName": "CyberCipherSecure IT", "industrySector": "Technology", "revenue": 30000, "expenses": 5000, "profit": 25000, "employees": 10},
+    {"companyId": 4, "companyName": "DigitalMyricalDreams Gaming", "industrySector": "Technology", "revenue": 40000, "expenses": 6000, "profit": 34000, "employees": 10},
+    {"companyId": 5, "companyName": "NanoMedNoLand Pharmaceuticals", "industrySector": "Technology", "revenue": 50000, "expenses": 7000, "profit": 43000, "employees": 10},
+    {"companyId": 6, "companyName": "RoboSuperBombTech Industries", "industrySector": "Technology", "revenue": 60000, "expenses": 8000, "profit": 52000, "employees": 12},
+    {"companyId": 7, "companyName": "FuturePastNet Solutions", "industrySector": "Technology",  "revenue": 60000, "expenses": 9000, "profit": 51000, "employees": 10},
+    {"companyId": 8, "companyName": "InnovativeCreativeAI Corp", "industrySector": "Technology", "revenue": 65000, "expenses": 10000, "profit": 55000, "employees": 15},
+    {"companyId": 9, "companyName": "EcoLeekoTech Energy", "industrySector": "Technology", "revenue": 70000, "expenses": 11000, "profit": 59000, "employees": 10},
+    {"companyId": 10, "companyName": "TechyWealthHealth Systems", "industrySector": "Technology", "revenue": 80000, "expenses": 12000, "profit": 68000, "employees": 10},
+
+    #Real Estate Industry
+    {"companyId": 11, "companyName": "LuxuryToNiceLiving Real Estate", "industrySector": "Real Estate", "revenue": 90000, "expenses": 13000, "profit": 77000, "employees": 10},
+    {"companyId": 12, "companyName": "UrbanTurbanDevelopers Inc.", "industrySector": "Real Estate", "revenue": 100000, "expenses": 14000, "profit": 86000, "employees": 10},
+    {"companyId": 13, "companyName": "SkyLowHigh Towers", "industrySector": "Real Estate", "revenue": 110000, "expenses": 15000, "profit": 95000, "employees": 18},
+    {"companyId": 14, "companyName": "GreenBrownSpace Properties", "industrySector": "Real Estate", "revenue": 120000, "expenses": 16000, "profit": 104000, "employees": 10},
+    {"companyId": 15, "companyName": "ModernFutureHomes Ltd.", "industrySector": "Real Estate", "revenue": 130000, "expenses": 17000, "profit": 113000, "employees": 10},
+    {"companyId": 16, "companyName": "CityCountycape Estates", "industrySector": "Real Estate", "revenue": 140000, "expenses": 18000, "profit": 122000, "employees": 10},
+    {"companyId": 17, "companyName": "CoastalFocalRealty Group", "industrySector": "Real Estate", "revenue": 150000, "expenses": 19000, "profit": 131000, "employees": 10},
+    {"companyId": 18, "companyName": "InnovativeModernLiving Spaces", "industrySector": "Real Estate", "revenue": 160000, "expenses": 20000, "profit": 140000, "employees": 10},
+    {"companyId": 19, "companyName": "GlobalRegional Properties Alliance", "industrySector": "Real Estate", "revenue": 170000, "expenses": 21000, "profit": 149000, "employees": 11},
+    {"companyId": 20, "companyName": "NextGenPast Residences", "industrySector": "Real Estate", "revenue": 180000, "expenses": 22000, "profit": 158000, "employees": 260}
+]
+
+
+# ---------------------------------------------------------------------
+# COMPANY DATA STORE
+#
+# Built once per Lambda execution environment (cold start) and reused by
+# every invocation. Set COMPANY_DATA_PATH to a .json, .csv or .parquet file
+# with the same columns as COMPANY_DATA to load a larger data set.
+# ---------------------------------------------------------------------
+COMPANY_COLUMNS = ["companyId", "companyName", "industrySector", "revenue", "expenses", "profit", "employees"]
+NUMERIC_COLUMNS = ["companyId", "revenue", "expenses", "profit", "employees"]
+
+
+# ---------------------------------------------------------------------
+# STRUCTURED RESULTS
+#
+# Tabular results are returned as a tagged, columnar envelope instead of a
+# list of row dicts:
+#
+#   {"contentType": TABLE_CONTENT_TYPE,
+#    "schema": [{"name": "companyId", "type": "integer"}, ...],
+#    "rowCount": 3,
+#    "columns": {"companyId": [1, 2, 3], ...}}
+#
+# The client finds it in the action group observation of the trace and
+# builds a DataFrame straight from the columns, with types from the schema.
+# Column names appear once instead of once per row, so it is also smaller.
+# ---------------------------------------------------------------------
+TABLE_CONTENT_TYPE = "application/vnd.bedrock-agent.table+json"
+
+
+def table_result(schema, columns):
+    """
+    Builds a table envelope.
+
+    Args:
+        schema: List of (name, type) pairs; type is an OpenAPI type name
+            (integer, number, string, boolean).
+        columns: Mapping of column name -> list of values, all the same length.
+    """
+    row_count = len(columns[schema[0][0]]) if schema else 0
+    return {
+        "contentType": TABLE_CONTENT_TYPE,
+        "schema": [{"name": name, "type": type_name} for name, type_name in schema],
+        "rowCount": row_count,
+        "columns": {name: columns[name] for name, _ in schema},
+    }
+
+
+# ---------------------------------------------------------------------
+# COMPANY NAME LOOKUP
+#
+# LLM-extracted names rarely match the stored name exactly ("TechStashNova",
+# "techstash nova inc" for "TechStashNova Inc."). Names are normalized to a
+# compact key (lowercase alphanumerics, trailing corporate suffixes dropped)
+# and looked up by exact key, by the key without its last word ("TechStashNova"
+# for "TechStashNova Technologies"), and only then by key prefix and trigram
+# + bounded edit distance.
+# ---------------------------------------------------------------------
+CORPORATE_SUFFIXES = frozenset([
+    "inc", "incorporated", "corp", "corporation", "co", "company", "ltd", "limited",
+    "llc", "plc", "group", "holdings", "the",
+])
+_NAME_TOKEN = re.compile(r"[a-z0-9]+")
+
+# A fuzzy candidate must share at least this fraction of the query trigrams
+MIN_TRIGRAM_OVERLAP = 0.75
+# Trigrams found in more terms (of a length close to the query's) than this
+# are too common to generate candidates from; they still count when scoring
+MAX_POSTING_LENGTH = 1000
+# Fuzzy candidates fully scored per requested result
+FUZZY_CANDIDATES_PER_RESULT = 4
+# Score of a name matched by its key without the last word
+BASE_MATCH_SCORE = 0.95
+# Fuzzy candidates are read from terms whose length is within this many
+# times the allowed edit distance of the query's
+FUZZY_LENGTH_WINDOW = 1
+# Matches scoring below this are not worth returning
+MIN_MATCH_SCORE = 0.3
+
+# companyResearch answers with a single company only for a confident match
+CONFIDENT_MATCH_SCORE = 0.8
+CONFIDENT_MATCH_MARGIN = 0.1
+
+NameMatch = namedtuple('NameMatch', ['row_id', 'companyName', 'score', 'match'])
+
+
+def company_name_tokens(name):
+    """Lowercase words of a company name without corporate suffixes or a leading 'the'."""
+    tokens = _NAME_TOKEN.findall(name.lower())
+    while len(tokens) > 1 and tokens[-1] in CORPORATE_SUFFIXES:
+        tokens.pop()
+    if len(tokens) > 1 and tokens[0] == "the":
+        tokens.pop(0)
+    return tokens
+
+
+def normalize_company_name(name):
+    """Returns the compact lookup key for a company name, e.g. 'TechStash Nova Inc.' -> 'techstashnova'."""
+    return "".join(company_name_tokens(name))
+
+
+def name_trigrams(key):
+    padded = f"  {key} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def bounded_edit_distance(a, b, max_distance):
+    """
+    Levenshtein distance between a and b, or max_distance + 1 if it is larger.
+    A common prefix and suffix are skipped, and only the diagonal band of
+    width 2 * max_distance + 1 of what is left is computed.
+    """
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    end_a, end_b = len(a), len(b)
+    while end_a > start and end_b > start and a[end_a - 1] == b[end_b - 1]:
+        end_a -= 1
+        end_b -= 1
+    a, b = a[start:end_a], b[start:end_b]
+    too_far = max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        low = max(1, i - max_distance)
+        high = min(len(b), i + max_distance)
+        current = [too_far] * (len(b) + 1)
+        current[0] = i if i <= max_distance else too_far
+        char_a = a[i - 1]
+        row_min = current[0]
+        for j in range(low, high + 1):
+            cost = previous[j - 1] + (char_a != b[j - 1])
+            if previous[j] + 1 < cost:
+                cost = previous[j] + 1
+            if current[j - 1] + 1 < cost:
+                cost = current[j - 1] + 1
+            current[j] = cost
+            if cost < row_min:
+                row_min = cost
+        if row_min > max_distance:
+            return too_far
+        previous = current
+    return min(previous[-1], too_far)
+
+
+class CompanyNameIndex:
+    """
+    Normalized-key, prefix and fuzzy (trigram + edit distance) lookup over
+    company names. Built once; each search touches only the rows that share
+    rare trigrams or the key prefix with the query, never the whole table.
+
+    Fuzzy search runs over terms: each key, and its base (the key without
+    the last word) so "TechStash Nvoa" still finds "TechStashNova Systems".
+    Terms are numbered shortest first, so every trigram posting list is
+    ordered by term length and the terms of a length range are a slice of
+    it: candidates are only read from terms of about the query's length.
+    """
+
+    def __init__(self, names):
+        self.names = names
+        self.keys = []
+        self.key_rows = []
+        # Length of each key without its last word (of the whole key for one word)
+        self.prefix_lengths = array('H')
+        key_ids = {}
+        # Key without the last word -> key ids, e.g. 'cybercipher' for 'CyberCipher Systems'
+        base_key_ids = {}
+        terms = []
+        for row_id, name in enumerate(names):
+            tokens = company_name_tokens(name)
+            key = "".join(tokens)
+            key_id = key_ids.get(key)
+            if key_id is None:
+                key_id = key_ids[key] = len(self.keys)
+                self.keys.append(key)
+                self.key_rows.append([])
+                terms.append((key, key_id))
+                if len(tokens) > 1:
+                    base = "".join(tokens[:-1])
+                    base_key_ids.setdefault(base, []).append(key_id)
+                    terms.append((base, key_id))
+                    self.prefix_lengths.append(len(base))
+                else:
+                    self.prefix_lengths.append(len(key))
+            self.key_rows[key_id].append(row_id)
+        self.key_ids = key_ids
+        self.base_key_ids = base_key_ids
+
+        self.sorted_keys = sorted(key_ids)
+        self.sorted_key_ids = array('I', (key_ids[key] for key in self.sorted_keys))
+
+        # sorted() is stable: terms of the same length stay in input order
+        terms.sort(key=lambda term: len(term[0]))
+        self.terms = [term for term, _ in terms]
+        self.term_key_ids = array('I', (key_id for _, key_id in terms))
+        # length_starts[n] is the first term id of a term at least n long
+        self.length_starts = array('I')
+        for term_id, term in enumerate(self.terms):
+            while len(self.length_starts) <= len(term):
+                self.length_starts.append(term_id)
+        self.length_starts.append(len(self.terms))
+
+        postings = {}
+        for term_id, term in enumerate(self.terms):
+            for gram in name_trigrams(term):
+                postings.setdefault(gram, []).append(term_id)
+        self.postings = {gram: array('I', term_id_list) for gram, term_id_list in postings.items()}
+
+    def search(self, name, limit=5):
+        """
+        Returns up to limit NameMatch tuples ranked by score (1.0 = same
+        normalized name). match is 'exact', 'base' (same name but for the
+        last word), 'prefix' or 'fuzzy'; exact and base matches are returned
+        without fuzzy scoring.
+        """
+        query = normalize_company_name(name)
+        if not query:
+            return []
+
+        query_lower = name.lower()
+        key_id = self.key_ids.get(query)
+        if key_id is not None:
+            # Same normalized name: a row whose full name matches the query
+            # exactly (ignoring case) is ranked ahead of the others
+            row_ids = sorted(self.key_rows[key_id], key=lambda row_id: self.names[row_id].lower() != query_lower)
+            return [NameMatch(row_id, self.names[row_id], 1.0, 'exact') for row_id in row_ids[:limit]]
+        base_key_ids = self.base_key_ids.get(query)
+        if base_key_ids is not None:
+            row_ids = [row_id for key_id in base_key_ids for row_id in self.key_rows[key_id]]
+            return [NameMatch(row_id, self.names[row_id], BASE_MATCH_SCORE, 'base') for row_id in row_ids[:limit]]
+
+        scores = {}
+
+        def add(key_id, score, match):
+            if key_id not in scores or scores[key_id][0] < score:
+                scores[key_id] = (score, match)
+
+        if len(query) >= 3:
+            # A query covering most of the key's base is scored against the
+            # base, so 'TechStash N' ranks 'TechStash Nova Systems' well
+            for key_id in self._prefix_ids(query, limit):
+                length = self.prefix_lengths[key_id]
+                if len(query) > length:
+                    length = len(self.keys[key_id])
+                add(key_id, 0.6 + 0.39 * len(query) / length, 'prefix')
+
+        # Candidates come back ordered by how many rare trigrams they share.
+        # Trigram similarity (cheap set operations) narrows them down and the
+        # edit distance check only runs on the best few
+        query_grams = name_trigrams(query)
+        similar = []
+        for term_id in self._candidate_ids(query_grams, limit * FUZZY_CANDIDATES_PER_RESULT, *self._length_window(query)):
+            grams = name_trigrams(self.terms[term_id])
+            similar.append((2 * len(query_grams & grams) / (len(query_grams) + len(grams)), term_id))
+        similar.sort(reverse=True)
+
+        max_distance = max(1, len(query) // 4)
+        for dice, term_id in similar[:limit]:
+            term = self.terms[term_id]
+            key_id = self.term_key_ids[term_id]
+            distance = bounded_edit_distance(query, term, max_distance)
+            if distance <= max_distance:
+                score = max(dice, 1 - distance / max(len(query), len(term)))
+            else:
+                score = dice * 0.9
+            if term != self.keys[key_id]:
+                # Near the base only: weaker than being near the whole name
+                score *= BASE_MATCH_SCORE
+            add(key_id, min(score, 0.99), 'fuzzy')
+
+        ranked = sorted(scores.items(), key=lambda item: -item[1][0])
+        matches = []
+        for key_id, (score, match) in ranked:
+            if score < MIN_MATCH_SCORE:
+                break
+            for row_id in self.key_rows[key_id]:
+                matches.append(NameMatch(row_id, self.names[row_id], round(score, 3), match))
+            if len(matches) >= limit:
+                break
+        return matches[:limit]
+
+    def _prefix_ids(self, query, limit):
+        position = bisect_left(self.sorted_keys, query)
+        key_ids = []
+        while position < len(self.sorted_keys) and len(key_ids) < limit:
+            if not self.sorted_keys[position].startswith(query):
+                break
+            key_ids.append(self.sorted_key_ids[position])
+            position += 1
+        return key_ids
+
+    def _length_window(self, query):
+        """(min_length, max_length) of the terms fuzzy candidates are read from."""
+        window = FUZZY_LENGTH_WINDOW * max(1, len(query) // 4)
+        return len(query) - window, len(query) + window
+
+    def _candidate_ids(self, query_grams, count, min_length=0, max_length=None):
+        """
+        Prefix filtering: a term sharing at least min_shared of the n query
+        trigrams must appear in one of the n - min_shared + 1 rarest posting
+        lists, so only those lists are read, and only their slice of terms
+        min_length to max_length long. Very common trigrams are skipped.
+        Returns up to count term ids, most shared trigrams first.
+        """
+        starts = self.length_starts
+        low = starts[min(max(min_length, 0), len(starts) - 1)]
+        high = len(self.terms) if max_length is None else starts[min(max(max_length + 1, 0), len(starts) - 1)]
+        lists = []
+        for gram in query_grams:
+            posting = self.postings.get(gram)
+            if posting is not None:
+                posting = posting[bisect_left(posting, low):bisect_left(posting, high)]
+                if 0 < len(posting) <= MAX_POSTING_LENGTH:
+                    lists.append(posting)
+        if not lists:
+            return []
+        lists.sort(key=len)
+        min_shared = max(1, int(len(query_grams) * MIN_TRIGRAM_OVERLAP))
+        counts = Counter()
+        for posting in lists[:max(1, len(query_grams) - min_shared + 1)]:
+            counts.update(posting)
+        ranked = sorted(counts.items(), key=itemgetter(1), reverse=True)
+        return [term_id for term_id, _ in ranked[:count]]
+
+
+class CompanyStore:
+    """
+    Columnar, indexed view of the company data.
+
+    Numeric columns are packed into typed arrays, industries are stored once
+    and referenced by code, and three indexes are built up front:
+      - a case-insensitive company name -> row hash index
+      - a CompanyNameIndex for normalized, prefix and fuzzy name lookup
+      - per-industry row lists pre-sorted by profit (highest first), so a
+        top-N portfolio is a slice of an existing list
+    """
+
+    def __init__(self, rows):
+        self.size = len(rows)
+        self.names = [row["companyName"] for row in rows]
+
+        self.industries = []
+        industry_codes = {}
+        self.industry_codes = array('I')
+        for row in rows:
+            industry = row["industrySector"]
+            code = industry_codes.get(industry)
+            if code is None:
+                code = industry_codes[industry] = len(self.industries)
+                self.industries.append(industry)
+            self.industry_codes.append(code)
+
+        self.columns = {}
+        for column in NUMERIC_COLUMNS:
+            values = [row[column] for row in rows]
+            # Keep whole numbers as integers so responses look like the source data
+            typecode = 'q' if all(isinstance(value, int) for value in values) else 'd'
+            self.columns[column] = array(typecode, values)
+
+        # First occurrence wins, matching the original linear scan
+        self.name_index = {}
+        for row_id, name in enumerate(self.names):
+            self.name_index.setdefault(name.lower(), row_id)
+        self.name_lookup = CompanyNameIndex(self.names)
+        self._query_engine = None
+
+        profit = self.columns["profit"]
+        buckets = {}
+        for row_id, code in enumerate(self.industry_codes):
+            buckets.setdefault(self.industries[code].lower(), []).append(row_id)
+        # sorted() is stable, so companies with equal profit keep their input order
+        self.industry_index = {
+            industry: array('I', sorted(row_ids, key=lambda row_id: -profit[row_id]))
+            for industry, row_ids in buckets.items()
+        }
+
+    def row(self, row_id):
+        """Returns the company at row_id as a dict in the original field order."""
+        columns = self.columns
+        return {
+            "companyId": columns["companyId"][row_id],
+            "companyName": self.names[row_id],
+            "industrySector": self.industries[self.industry_codes[row_id]],
+            "revenue": columns["revenue"][row_id],
+            "expenses": columns["expenses"][row_id],
+            "profit": columns["profit"][row_id],
+            "employees": columns["employees"][row_id],
+        }
+
+    def find_by_name(self, name):
+        """Case-insensitive exact name lookup. Returns a company dict or None."""
+        row_id = self.name_index.get(name.lower())
+        if row_id is None:
+            return None
+        return self.row(row_id)
+
+    def search_names(self, name, limit=5):
+        """Ranked NameMatch candidates for a possibly inexact company name."""
+        return self.name_lookup.search(name, limit)
+
+    def top_by_profit(self, industry, numCompanies):
+        """Returns the numCompanies most profitable companies in an industry."""
+        row_ids = self.industry_index.get(industry.lower(), ())
+        return [self.row(row_id) for row_id in row_ids[:numCompanies]]
+
+    def query(self, portfolio_query):
+        """Runs a PortfolioQuery and returns the matching companies as dicts."""
+        return [self.row(row_id) for row_id in self._run_query(portfolio_query)]
+
+    def query_table(self, portfolio_query):
+        """Runs a PortfolioQuery and returns the matching companies as a table envelope."""
+        return self.table(self._run_query(portfolio_query))
+
+    def table(self, row_ids):
+        """Returns the companies at row_ids as a table envelope, columns in COMPANY_COLUMNS order."""
+        industries = self.industries
+        codes = self.industry_codes
+        columns = {
+            "companyName": [self.names[row_id] for row_id in row_ids],
+            "industrySector": [industries[codes[row_id]] for row_id in row_ids],
+        }
+        schema = []
+        for name in COMPANY_COLUMNS:
+            values = self.columns.get(name)
+            if values is None:
+                schema.append((name, "string"))
+                continue
+            columns[name] = [values[row_id] for row_id in row_ids]
+            schema.append((name, "integer" if values.typecode == 'q' else "number"))
+        return table_result(schema, columns)
+
+    def _run_query(self, portfolio_query):
+        if self._query_engine is None:
+            self._query_engine = CompanyQueryEngine(self)
+        return self._query_engine.run(portfolio_query)
+
+
+# ---------------------------------------------------------------------
+# PORTFOLIO QUERIES
+#
+# createPortfolio takes a declarative spec from the action group
+# parameters: rank by one field or a weighted combination of fields, filter
+# on any numeric field, and page through the result. Columns (including
+# derived ones like margin) are materialized once as NumPy arrays and the
+# top-k rows are picked with a partial sort instead of sorting everything.
+# ---------------------------------------------------------------------
+QUERY_FIELDS = ["revenue", "expenses", "profit", "employees", "margin", "profitPerEmployee"]
+_FILTER_CLAUSE = re.compile(r"^\s*([A-Za-z]+)\s*(>=|<=|>|<|=)\s*(-?[0-9]*\.?[0-9]+(?:[eE][-+]?[0-9]+)?)\s*$")
+_FILTER_OPERATORS = {
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+    "=": lambda a, b: a == b,
+}
+
+PortfolioQuery = namedtuple('PortfolioQuery', ['industry', 'sort_keys', 'descending', 'filters', 'offset', 'limit'])
+
+
+def parse_sort_spec(text):
+    """
+    Parses 'margin' or 'revenue:0.7,profitPerEmployee:0.3' into a list of
+    (field, weight) pairs. Defaults to [('profit', 1.0)].
+    """
+    if not text or not text.strip():
+        return [("profit", 1.0)]
+    sort_keys = []
+    for part in text.split(","):
+        field, _, weight = part.strip().partition(":")
+        if field not in QUERY_FIELDS:
+            raise ValueError(f"Unknown sort field '{field}'. Valid fields: {', '.join(QUERY_FIELDS)}")
+        try:
+            sort_keys.append((field, float(weight) if weight else 1.0))
+        except ValueError:
+            raise ValueError(f"Invalid weight for sort field '{field}': {weight}")
+    return sort_keys
+
+
+def parse_filter_spec(text):
+    """Parses 'revenue>=50000,margin<0.8' into a list of (field, operator, value)."""
+    filters = []
+    if not text or not text.strip():
+        return filters
+    for clause in text.split(","):
+        match = _FILTER_CLAUSE.match(clause)
+        if not match:
+            raise ValueError(f"Invalid filter '{clause.strip()}'. Use e.g. 'revenue>=50000,margin<0.8'")
+        field, operator, value = match.groups()
+        if field not in QUERY_FIELDS:
+            raise ValueError(f"Unknown filter field '{field}'. Valid fields: {', '.join(QUERY_FIELDS)}")
+        filters.append((field, operator, float(value)))
+    return filters
+
+
+def build_portfolio_query(industry, numCompanies, sortBy=None, order=None, filters=None, offset=0):
+    """Validates createPortfolio parameters and returns a PortfolioQuery."""
+    if numCompanies < 0:
+        raise ValueError("numCompanies must not be negative")
+    if offset < 0:
+        raise ValueError("offset must not be negative")
+    order = (order or "desc").strip().lower()
+    if order not in ("asc", "desc"):
+        raise ValueError("order must be 'asc' or 'desc'")
+    industry = industry.strip().lower() if industry and industry.strip() else None
+    return PortfolioQuery(industry, parse_sort_spec(sortBy), order == "desc", parse_filter_spec(filters), offset, numCompanies)
+
+
+class CompanyQueryEngine:
+    """
+    Runs PortfolioQuery objects against a CompanyStore. Column arrays and
+    per-industry row sets are built on first use and cached.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._columns = {}
+        self._industry_rows = {}
+
+    def run(self, query):
+        """Returns the row ids for one page of the query, best first."""
+        store = self.store
+        end = query.offset + query.limit
+
+        # The original "top N by profit in an industry" is a slice of the
+        # pre-sorted industry bucket
+        if query.industry and not query.filters and query.sort_keys == [("profit", 1.0)] and query.descending:
+            return list(store.industry_index.get(query.industry, ())[query.offset:end])
+
+        if load_numpy() is None:
+            return self._run_python(query)
+
+        row_ids = self._rows_for(query.industry)
+        if query.filters:
+            mask = np.ones(len(row_ids), dtype=bool)
+            for field, operator, value in query.filters:
+                mask &= _FILTER_OPERATORS[operator](self.column(field)[row_ids], value)
+            row_ids = row_ids[mask]
 
+        count = len(row_ids)
+        k = min(end, count)
+        if k <= 0 or query.offset >= count:
+            return []
+
+        # Smaller key = better, so the same partial sort serves asc and desc.
+        # Rows with no value (e.g. margin without revenue) always go last.
+        key = self._scores(query.sort_keys, row_ids)
+        if query.descending:
+            key = -key
+        key[np.isnan(key)] = np.inf
+
+        if k < count:
+            kth = np.partition(key, k - 1)[k - 1]
+            better = np.flatnonzero(key < kth)
+            # Ties at the boundary are resolved in input order, like a stable sort
+            ties = np.flatnonzero(key == kth)[:k - len(better)]
+            chosen = np.concatenate([better, ties])
+        else:
+            chosen = np.arange(count)
+        order = np.lexsort((row_ids[chosen], key[chosen]))
+        return row_ids[chosen][order][query.offset:end].tolist()
+
+    def column(self, field):
+        """Returns a float64 NumPy array for a stored or derived field."""
+        values = self._columns.get(field)
+        if values is None:
+            load_numpy()
+            columns = self.store.columns
+            if field == "margin":
+                values = self._ratio(self.column("profit"), self.column("revenue"))
+            elif field == "profitPerEmployee":
+                values = self._ratio(self.column("profit"), self.column("employees"))
+            else:
+                values = np.asarray(columns[field], dtype=np.float64)
+            self._columns[field] = values
+        return values
+
+    def _rows_for(self, industry):
+        row_ids = self._industry_rows.get(industry)
+        if row_ids is None:
+            if industry is None:
+                row_ids = np.arange(self.store.size, dtype=np.int64)
+            else:
+                row_ids = np.sort(np.asarray(self.store.industry_index.get(industry, ()), dtype=np.int64))
+            self._industry_rows[industry] = row_ids
+        return row_ids
+
+    def _scores(self, sort_keys, row_ids):
+        if len(sort_keys) == 1:
+            field, weight = sort_keys[0]
+            return self.column(field)[row_ids] * (1.0 if weight >= 0 else -1.0)
+        # Weighted combinations use min-max scaled values so fields with
+        # different units contribute in proportion to their weights
+        total = np.zeros(len(row_ids))
+        for field, weight in sort_keys:
+            values = self.column(field)[row_ids]
+            low, high = np.nanmin(values), np.nanmax(values)
+            if high > low:
+                total += weight * (values - low) / (high - low)
+        return total
+
+    @staticmethod
+    def _ratio(numerator, denominator):
+        result = np.full(len(numerator), np.nan)
+        np.divide(numerator, denominator, out=result, where=denominator != 0)
+        return result
+
+    def _run_python(self, query):
+        store = self.store
+        columns = store.columns
+
+        def value(field, row_id):
+            if field == "margin":
+                revenue = columns["revenue"][row_id]
+                return columns["profit"][row_id] / revenue if revenue else None
+            if field == "profitPerEmployee":
+                employees = columns["employees"][row_id]
+                return columns["profit"][row_id] / employees if employees else None
+            return columns[field][row_id]
+
+        if query.industry is None:
+            row_ids = range(store.size)
+        else:
+            row_ids = sorted(store.industry_index.get(query.industry, ()))
+        row_ids = [
+            row_id for row_id in row_ids
+            if all(
+                value(field, row_id) is not None and _FILTER_OPERATORS[operator](value(field, row_id), threshold)
+                for field, operator, threshold in query.filters
+            )
+        ]
+
+        ranges = {}
+        if len(query.sort_keys) > 1:
+            for field, _ in query.sort_keys:
+                present = [v for v in (value(field, row_id) for row_id in row_ids) if v is not None]
+                ranges[field] = (min(present), max(present)) if present else (0, 0)
+
+        def score(row_id):
+            if len(query.sort_keys) == 1:
+                field, weight = query.sort_keys[0]
+                v = value(field, row_id)
+                return None if v is None else v * (1.0 if weight >= 0 else -1.0)
+            # A missing value makes the whole score missing (NaN in the
+            # NumPy path), so the row goes last rather than counting as 0
+            total = 0.0
+            for field, weight in query.sort_keys:
+                low, high = ranges[field]
+                if high > low:
+                    v = value(field, row_id)
+                    if v is None:
+                        return None
+                    total += weight * (v - low) / (high - low)
+            return total
+
+        sign = -1 if query.descending else 1
+        scored = [(score(row_id), row_id) for row_id in row_ids]
+        scored = [(float("inf") if s is None else sign * s, row_id) for s, row_id in scored]
+        top = heapq.nsmallest(query.offset + query.limit, scored)
+        return [row_id for _, row_id in top[query.offset:]]
+
+
+def load_company_rows(path):
+    """
+    Reads company rows from a .json (list of objects), .csv or .parquet file.
+    Parquet support requires pyarrow.
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".json":
+        with open(path) as f:
+            return json.load(f)
+    if extension == ".csv":
+        with open(path, newline="") as f:
+            rows = list(csv.DictReader(f))
+        for row in rows:
+            for column in NUMERIC_COLUMNS:
+                value = row[column]
+                row[column] = int(value) if value.lstrip("-").isdigit() else float(value)
+        return rows
+    if extension == ".parquet":
+        import pyarrow.parquet as pq
+        return pq.read_table(path, columns=COMPANY_COLUMNS).to_pylist()
+    raise ValueError(f"Unsupported company data file: {path}")
+
+
+def load_company_store():
+    """Builds the CompanyStore from COMPANY_DATA_PATH, or the built-in mock data."""
+    path = os.environ.get("COMPANY_DATA_PATH")
+    rows = load_company_rows(path) if path else COMPANY_DATA
+    return CompanyStore(rows)
+
+
+# Built by init()
+company_store = None
+
+
+# ---------------------------------------------------------------------
+# ACTION ROUTER
+#
+# Actions register themselves per (apiPath, httpMethod) with @action.
+# Parameters (query parameters and application/json request body
+# properties) are parsed once per event into a dict, checked for required
+# names and coerced to the types declared in the OpenAPI schema the agent
+# uses (ActionSchema.json, or the file named by ACTION_SCHEMA_PATH).
+# EMBEDDED_PARAMETER_SPECS is the same compiled schema, used when the file
+# is not deployed with the function; benchmarks/bench_portfolio_query.py
+# checks the two agree.
+# ---------------------------------------------------------------------
+ACTION_ROUTES = {}
+ACTION_SCHEMA_PATH = os.environ.get(
+    "ACTION_SCHEMA_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "ActionSchema.json")
+)
+
+ParameterSpec = namedtuple('ParameterSpec', ['name', 'type', 'required'])
+
+EMBEDDED_PARAMETER_SPECS = {
+    ("/companyResearch", "POST"): [
+        ParameterSpec("name", "string", True),
+    ],
+    ("/createPortfolio", "POST"): [
+        ParameterSpec("numCompanies", "integer", True),
+        ParameterSpec("industry", "string", False),
+        ParameterSpec("sortBy", "string", False),
+        ParameterSpec("order", "string", False),
+        ParameterSpec("filters", "string", False),
+        ParameterSpec("offset", "integer", False),
+    ],
+    ("/sendEmail", "POST"): [
+        ParameterSpec("emailAddress", "string", True),
+        ParameterSpec("fomcSummary", "string", True),
+        ParameterSpec("portfolio", "string", True),
+    ],
+}
+
+
+class BadRequest(ValueError):
+    """A missing or invalid action parameter; answered with HTTP 400."""
+
+
+def action(api_path, http_method='POST'):
+    """Decorator registering an action handler. The handler receives the parsed parameters dict."""
+    def register(handler):
+        ACTION_ROUTES[(api_path, http_method.upper())] = handler
+        return handler
+    return register
+
+
+def load_parameter_specs(path=ACTION_SCHEMA_PATH):
+    """
+    Compiles the OpenAPI schema into {(apiPath, METHOD): [ParameterSpec, ...]}.
+    Returns EMBEDDED_PARAMETER_SPECS when the schema file is not deployed
+    with the function.
+    """
+    try:
+        with open(path) as f:
+            schema = json.load(f)
+    except FileNotFoundError:
+        return dict(EMBEDDED_PARAMETER_SPECS)
+
+    specs = {}
+    for api_path, methods in schema.get("paths", {}).items():
+        for method, operation in methods.items():
+            parameters = [
+                ParameterSpec(p["name"], p.get("schema", {}).get("type", "string"), p.get("required", False))
+                for p in operation.get("parameters", [])
+            ]
+            body_schema = (
+                operation.get("requestBody", {}).get("content", {}).get("application/json", {}).get("schema", {})
+            )
+            required = set(body_schema.get("required", []))
+            for name, prop in body_schema.get("properties", {}).items():
+                parameters.append(ParameterSpec(name, prop.get("type", "string"), name in required))
+            specs[(api_path, method.upper())] = parameters
+    return specs
+
+
+def coerce_parameter(spec, value):
+    """Converts a parameter value sent by the agent (usually a string) to its schema type."""
+    try:
+        if spec.type == "integer":
+            number = float(value)
+            if not number.is_integer():
+                raise ValueError
+            return int(number)
+        if spec.type == "number":
+            return float(value)
+        if spec.type == "boolean":
+            if isinstance(value, bool):
+                return value
+            lowered = str(value).strip().lower()
+            if lowered not in ("true", "false"):
+                raise ValueError
+            return lowered == "true"
+    except (TypeError, ValueError):
+        raise BadRequest(f"Parameter '{spec.name}' must be of type {spec.type}, got '{value}'")
+    return value
+
+
+def parse_parameters(event, specs):
+    """Builds the name -> value dict for an event, validated against specs."""
+    params = {item['name']: item['value'] for item in event.get('parameters') or []}
+    body = (event.get('requestBody') or {}).get('content', {}).get('application/json', {})
+    for item in body.get('properties') or []:
+        params.setdefault(item['name'], item['value'])
+
+    for spec in specs:
+        value = params.get(spec.name)
+        if value is None or value == "":
+            if spec.required:
+                raise BadRequest(f"Missing required parameter '{spec.name}'")
+            params.pop(spec.name, None)
+            continue
+        params[spec.name] = coerce_parameter(spec, value)
+    return params
+
+
+def require(params, name):
+    """Returns a parameter the handler cannot work without, or raises BadRequest."""
+    value = params.get(name)
+    if value is None or value == "":
+        raise BadRequest(f"Missing required parameter '{name}'")
+    return value
+
+
+# ---------------------------------------------------------------------
+# ACTIONS
+# ---------------------------------------------------------------------
+@action('/companyResearch')
+def companyResearch(params):
+    companyName = str(require(params, 'name'))
+    log("NAME PRINTED: ", companyName)
+
+    company = company_store.find_by_name(companyName)
+    if company is not None:
+        return company
+
+    # No exact match: accept a clear best fuzzy match, otherwise hand the
+    # ranked candidates back to the agent instead of a bare "not found"
+    matches = company_store.search_names(companyName)
+    if not matches:
         return None
-    
-    def createPortfolio(event, company_data):
-        numCompanies = int(get_named_parameter(event, 'numCompanies'))
-        industry = get_named_parameter(event, 'industry').lower()
+    best = matches[0]
+    runner_up = matches[1].score if len(matches) > 1 else 0
+    if best.score >= CONFIDENT_MATCH_SCORE and best.score - runner_up >= CONFIDENT_MATCH_MARGIN:
+        return company_store.row(best.row_id)
+    return {
+        "message": f"No exact match for company name '{companyName}'",
+        "candidates": [{"companyName": match.companyName, "score": match.score} for match in matches]
+    }
 
-        industry_filtered_companies = [company for company in company_data
-                                       if company['industrySector'].lower() == industry]
+@action('/createPortfolio')
+def createPortfolio(params):
+    numCompanies = coerce_parameter(ParameterSpec('numCompanies', 'integer', True), require(params, 'numCompanies'))
+    offset = coerce_parameter(ParameterSpec('offset', 'integer', False), params.get('offset', 0))
+    query = build_portfolio_query(
+        params.get('industry'),
+        numCompanies,
+        sortBy=params.get('sortBy'),
+        order=params.get('order'),
+        filters=params.get('filters'),
+        offset=offset
+    )
+    return company_store.query_table(query)
 
-        sorted_companies = sorted(industry_filtered_companies, key=lambda x: x['profit'], reverse=True)
 
-        top_companies = sorted_companies[:numCompanies]
-        return top_companies
+@action('/sendEmail')
+def sendEmail(params):
+    emailAddress = require(params, 'emailAddress')
+    fomcSummary = require(params, 'fomcSummary')
 
- 
-    def sendEmail(event, company_data):
-        emailAddress = get_named_parameter(event, 'emailAddress')
-        fomcSummary = get_named_parameter(event, 'fomcSummary')
-    
-        # Retrieve the portfolio data as a string
-        portfolioDataString = get_named_parameter(event, 'portfolio')
-    
+    # Retrieve the portfolio data as a string
+    portfolioDataString = require(params, 'portfolio')
+
+
+    # Prepare the email content
+    email_subject = "Portfolio Creation Summary and FOMC Search Results"
+    #email_body = f"FOMC Search Summary:\n{fomcSummary}\n\nPortfolio Details:\n{json.dumps(portfolioData, indent=4)}"
+
+    # Email sending code here (commented out for now)
+
+    return "Email sent successfully to {}".format(emailAddress)
+
+
+# Built by init()
+PARAMETER_SPECS = None
+
+
+# ---------------------------------------------------------------------
+# METRICS
+#
+# Per-invocation timings (parameter parsing, the action itself, total),
+# printed as one log line when TELEMETRY_EXPORT is set: "emf" for CloudWatch
+# Embedded Metric Format, "json" for a plain structured log record, "otel"
+# for an OTLP/JSON traces request (service.name from OTEL_SERVICE_NAME).
+# Unset, timing costs two clock reads and nothing is printed.
+# ---------------------------------------------------------------------
+METRICS_EXPORT = os.environ.get("TELEMETRY_EXPORT", "").lower()
+METRICS_NAMESPACE = os.environ.get("TELEMETRY_NAMESPACE", "BedrockAgentActions")
+OTEL_SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "bedrock-agent-actions")
+# Timings that ran back to back from the start of an invocation, as child spans
+OTEL_CHILD_SPANS = [("ParseTime", "action.parse"), ("ActionTime", "action.run")]
+
+
+def emit_timings(api_path, status_code, timings):
+    """Prints the timings (milliseconds) of one invocation per METRICS_EXPORT."""
+    if METRICS_EXPORT == "emf":
+        record = {
+            "_aws": {
+                "Timestamp": int(time.time() * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": METRICS_NAMESPACE,
+                    "Dimensions": [["ApiPath"]],
+                    "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in timings],
+                }],
+            },
+            "ApiPath": api_path,
+            "statusCode": status_code,
+        }
+        record.update(timings)
+        print(json.dumps(record))
+    elif METRICS_EXPORT == "json":
+        print(json.dumps({"apiPath": api_path, "statusCode": status_code, **timings}))
+    elif METRICS_EXPORT == "otel":
+        print(json.dumps(otel_traces(api_path, status_code, timings)))
+
+
+def otel_traces(api_path, status_code, timings):
+    """
+    One invocation as an OTLP/JSON traces request: an "action" span for the
+    whole call (timings["Duration"], ending now) with a child span for each
+    of OTEL_CHILD_SPANS that was timed.
+    """
+    end = time.time_ns()
+    start = end - int(timings["Duration"] * 1e6)
+    trace_id = os.urandom(16).hex()
+    root_id = os.urandom(8).hex()
+
+    def attributes(values):
+        return [{"key": key, "value": {"stringValue": str(value)}} for key, value in values.items()]
+
+    spans = [{
+        "traceId": trace_id,
+        "spanId": root_id,
+        "name": "action",
+        "kind": 2,
+        "startTimeUnixNano": str(start),
+        "endTimeUnixNano": str(end),
+        "attributes": attributes({"apiPath": api_path, "statusCode": status_code}),
+    }]
+    span_start = start
+    for timing, name in OTEL_CHILD_SPANS:
+        if timing in timings:
+            span_end = span_start + int(timings[timing] * 1e6)
+            spans.append({
+                "traceId": trace_id,
+                "spanId": os.urandom(8).hex(),
+                "parentSpanId": root_id,
+                "name": name,
+                "kind": 1,
+                "startTimeUnixNano": str(span_start),
+                "endTimeUnixNano": str(span_end),
+                "attributes": [],
+            })
+            span_start = span_end
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": attributes({"service.name": OTEL_SERVICE_NAME})},
+            "scopeSpans": [{"scope": {"name": "ActionLambda"}, "spans": spans}],
+        }]
+    }
+
+
+# ---------------------------------------------------------------------
+# INIT
+#
+# Everything that does not depend on the event is built once per execution
+# environment by init(): the company store and its indexes, and the compiled
+# parameter specs. It runs at import, i.e. in the Lambda init phase, unless
+# ACTION_LAMBDA_LAZY_INIT=true defers it to the first invocation (for tools
+# that import this module without invoking it).
+#
+# With SnapStart, before_snapshot() also imports NumPy and materializes the
+# query columns, so a restored environment starts fully warm. The hooks are
+# registered with snapshot_restore_py when the runtime provides it.
+# ---------------------------------------------------------------------
+LAZY_INIT = os.environ.get("ACTION_LAMBDA_LAZY_INIT", "false").lower() == "true"
+LOG_EVENTS = os.environ.get("ACTION_LOG_EVENTS", "false").lower() == "true"
+LOG_MAX_CHARS = int(os.environ.get("ACTION_LOG_MAX_CHARS", "1000"))
+
+# Milliseconds spent in each init step, for the cold start harness
+INIT_TIMINGS = {}
+
+
+def init():
+    """Builds the per-environment state once. Safe to call again; later calls return at once."""
+    global company_store, PARAMETER_SPECS
+    if company_store is None:
+        started = time.perf_counter()
+        company_store = load_company_store()
+        INIT_TIMINGS["CompanyStore"] = (time.perf_counter() - started) * 1000
+    if PARAMETER_SPECS is None:
+        started = time.perf_counter()
+        PARAMETER_SPECS = load_parameter_specs()
+        INIT_TIMINGS["ParameterSpecs"] = (time.perf_counter() - started) * 1000
+
+
+def before_snapshot():
+    """SnapStart hook: finishes all lazy work so it is captured in the snapshot."""
+    init()
+    started = time.perf_counter()
+    if load_numpy() is not None:
+        # Runs a full engine query, materializing the base columns
+        company_store.query(build_portfolio_query(None, 1, sortBy="revenue:0.5,profit:0.5"))
+    INIT_TIMINGS["Warmup"] = (time.perf_counter() - started) * 1000
+
+
+def after_restore():
+    """SnapStart hook: re-reads settings that may differ in the restored environment."""
+    global LOG_EVENTS, LOG_MAX_CHARS, METRICS_EXPORT
+    LOG_EVENTS = os.environ.get("ACTION_LOG_EVENTS", "false").lower() == "true"
+    LOG_MAX_CHARS = int(os.environ.get("ACTION_LOG_MAX_CHARS", "1000"))
+    METRICS_EXPORT = os.environ.get("TELEMETRY_EXPORT", "").lower()
+
+
+def log(*values):
+    """Prints a debug line, truncated to LOG_MAX_CHARS, when ACTION_LOG_EVENTS=true."""
+    if LOG_EVENTS:
+        line = " ".join(str(value) for value in values)
+        if len(line) > LOG_MAX_CHARS:
+            line = f"{line[:LOG_MAX_CHARS]}... ({len(line)} chars)"
+        print(line)
+
+
+try:
+    from snapshot_restore_py import register_after_restore, register_before_snapshot
+except ImportError:  # Only present in Lambda runtimes that support SnapStart
+    pass
+else:
+    register_before_snapshot(before_snapshot)
+    register_after_restore(after_restore)
+
+if not LAZY_INIT:
+    init()
+
+
+# ---------------------------------------------------------------------
+# LAMBDA HANDLER
+# ---------------------------------------------------------------------
+def lambda_handler(event, context):
+    started = time.perf_counter()
+    if company_store is None or PARAMETER_SPECS is None:
+        init()
+    log(event)
 
-        # Prepare the email content
-        email_subject = "Portfolio Creation Summary and FOMC Search Results"
-        #email_body = f"FOMC Search Summary:\n{fomcSummary}\n\nPortfolio Details:\n{json.dumps(portfolioData, indent=4)}"
-    
-        # Email sending code here (commented out for now)
-    
-        return "Email sent successfully to {}".format(emailAddress)   
-      
-      
     result = ''
     response_code = 200
     action_group = event['actionGroup']
     api_path = event['apiPath']
+    route = (api_path, event['httpMethod'].upper())
+    timings = {}
     
-    print("api_path: ", api_path )
+    log("api_path: ", api_path)
     
-    if api_path == '/companyResearch':
-        result = companyResearch(event)
-    elif api_path == '/createPortfolio':
-        result = createPortfolio(event, company_data)
-    elif api_path == '/sendEmail':
-        result = sendEmail(event, company_data)
-    else:
+    handler = ACTION_ROUTES.get(route)
+    if handler is None:
         response_code = 404
         result = f"Unrecognized api path: {action_group}::{api_path}"
+    else:
+        try:
+            params = parse_parameters(event, PARAMETER_SPECS.get(route, ()))
+            parsed = time.perf_counter()
+            timings["ParseTime"] = (parsed - started) * 1000
+            result = handler(params)
+            timings["ActionTime"] = (time.perf_counter() - parsed) * 1000
+        except ValueError as e:
+            # BadRequest, and invalid query specs from build_portfolio_query
+            response_code = 400
+            result = str(e)
         
+    # The action group contract takes the body as a string
     response_body = {
         'application/json': {
-            'body': result
+            'body': result if isinstance(result, str) else json.dumps(result)
         }
     }
         
@@ -110,4 +1154,8 @@ def lambda_handler(event, context):
     }
 
     api_response = {'messageVersion': '1.0', 'response': action_response}
+
+    if METRICS_EXPORT:
+        timings["Duration"] = (time.perf_counter() - started) * 1000
+        emit_timings(api_path, response_code, timings)
     return api_response
@@ -0,0 +1,313 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import tempfile
+import zipfile
+import urllib.request
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import boto3
+from boto3.s3.transfer import TransferConfig
+from botocore.config import Config
+from botocore.exceptions import ClientError
+
+# ---------------------------------------------------------------------
+# KNOWLEDGE BASE INGESTION
+#
+# Loads the knowledge base documents (S3docs/ in this repository) from the
+# GitHub archive into the knowledge base bucket. This file is also the
+# inline code of GitHubToS3Lambda in cfn/1-s3-dataload-template.yaml; keep
+# the two identical (benchmarks/bench_kb_ingestion.py checks).
+#
+# The archive is streamed to disk in chunks, and only members under
+# source_prefix are read, each straight from the archive into a temporary
+# file while it is hashed. Files are uploaded by a bounded thread pool,
+# large ones as multipart uploads. A manifest in the bucket records the
+# hash and ETag of every uploaded file, so a rerun skips files whose
+# content and object are unchanged, and only starts a knowledge base sync
+# when something changed.
+# ---------------------------------------------------------------------
+MiB = 1024 * 1024
+DEFAULT_SOURCE_URL = "https://github.com/build-on-aws/bedrock-agents-streamlit/archive/refs/heads/main.zip"
+DEFAULT_SOURCE_PREFIX = "bedrock-agents-streamlit-main/S3docs/"
+# JSON is not a document type the knowledge base ingests
+DEFAULT_MANIFEST_KEY = ".ingestion-manifest.json"
+MANIFEST_VERSION = 1
+
+LoaderConfig = namedtuple('LoaderConfig', [
+    'bucket',
+    'source_url',           # zip archive (https:// or file://)
+    'source_prefix',        # archive member prefix to load, e.g. "repo-main/S3docs/"
+    'key_prefix',           # prepended to the member path below source_prefix
+    'workers',              # files uploaded in parallel
+    'part_concurrency',     # parts uploaded in parallel per multipart upload
+    'multipart_threshold',  # bytes; larger files use multipart uploads
+    'multipart_chunksize',  # bytes per part
+    'read_chunk_size',      # bytes per read when downloading and extracting
+    'manifest_key',
+    'prune',                # delete objects of files no longer in the archive
+    'knowledge_base_id',    # with data_source_id: start an ingestion job after changes
+    'data_source_id',
+    'endpoint_url',         # S3 endpoint override, e.g. a local stand-in
+], defaults=[DEFAULT_SOURCE_URL, DEFAULT_SOURCE_PREFIX, "", 8, 4, 8 * MiB, 8 * MiB, MiB,
+             DEFAULT_MANIFEST_KEY, False, None, None, None])
+
+# Result of one ingest() run. timings are in milliseconds.
+IngestStats = namedtuple('IngestStats', [
+    'archive_bytes', 'files', 'uploaded', 'skipped', 'deleted', 'uploaded_bytes', 'ingestion_job_id', 'timings'
+])
+
+# What the manifest records per object key
+ManifestEntry = namedtuple('ManifestEntry', ['sha256', 'crc32', 'size', 'etag'])
+
+
+def config_from_env(event=None):
+    """
+    Builds a LoaderConfig from environment variables:
+
+        BUCKET_NAME             target bucket (required)
+        SOURCE_URL              archive URL (default: this repository on GitHub)
+        SOURCE_PREFIX           archive member prefix to load
+        KEY_PREFIX              object key prefix (default none)
+        UPLOAD_WORKERS          files uploaded in parallel (default 8)
+        MULTIPART_THRESHOLD_MB  multipart upload above this size (default 8)
+        PRUNE_REMOVED           "true" deletes objects of removed files
+        KNOWLEDGE_BASE_ID       with DATA_SOURCE_ID, sync the knowledge base
+        DATA_SOURCE_ID          after a run that changed the bucket
+        S3_ENDPOINT_URL         S3 endpoint override (e.g. MinIO)
+
+    Keys of event named like LoaderConfig fields override them.
+    """
+    defaults = LoaderConfig(bucket=None)
+    threshold = int(float(os.environ.get("MULTIPART_THRESHOLD_MB", defaults.multipart_threshold / MiB)) * MiB)
+    config = LoaderConfig(
+        bucket=os.environ.get("BUCKET_NAME"),
+        source_url=os.environ.get("SOURCE_URL") or defaults.source_url,
+        source_prefix=os.environ.get("SOURCE_PREFIX") or defaults.source_prefix,
+        key_prefix=os.environ.get("KEY_PREFIX", defaults.key_prefix),
+        workers=int(os.environ.get("UPLOAD_WORKERS", defaults.workers)),
+        multipart_threshold=threshold,
+        multipart_chunksize=threshold,
+        manifest_key=os.environ.get("MANIFEST_KEY") or defaults.manifest_key,
+        prune=os.environ.get("PRUNE_REMOVED", "false").lower() == "true",
+        knowledge_base_id=os.environ.get("KNOWLEDGE_BASE_ID") or None,
+        data_source_id=os.environ.get("DATA_SOURCE_ID") or None,
+        endpoint_url=os.environ.get("S3_ENDPOINT_URL") or None,
+    )
+    overrides = {name: value for name, value in (event or {}).items() if name in LoaderConfig._fields}
+    return config._replace(**overrides)
+
+
+def s3_client(config):
+    """An S3 client with a connection pool sized for config.workers parallel uploads."""
+    return boto3.client("s3", endpoint_url=config.endpoint_url, config=Config(
+        max_pool_connections=config.workers * config.part_concurrency + 2,
+        retries={"mode": "adaptive", "max_attempts": 10},
+        s3={"addressing_style": "path"} if config.endpoint_url else None,
+    ))
+
+
+def download_archive(url, path, chunk_size=MiB):
+    """Streams url to path in chunk_size reads. Returns the number of bytes written."""
+    with urllib.request.urlopen(url, timeout=60) as response, open(path, "wb") as out_file:
+        shutil.copyfileobj(response, out_file, chunk_size)
+        return out_file.tell()
+
+
+def select_members(archive, source_prefix, key_prefix=""):
+    """Returns (ZipInfo, object key) for the files under source_prefix, skipping directories."""
+    members = []
+    for info in archive.infolist():
+        if info.is_dir() or not info.filename.startswith(source_prefix):
+            continue
+        relative = info.filename[len(source_prefix):]
+        if relative:
+            members.append((info, key_prefix + relative))
+    return members
+
+
+def s3_etag(md5_digest, part_digests):
+    """
+    The ETag S3 gives an object uploaded in one PUT (md5_digest), or in
+    parts (the MD5 of the part MD5s, then "-" and the part count).
+    """
+    if not part_digests:
+        return md5_digest.hex()
+    return f"{hashlib.md5(b''.join(part_digests)).hexdigest()}-{len(part_digests)}"
+
+
+def extract_member(archive, info, path, config):
+    """
+    Copies one archive member to path, hashing it on the way. Returns
+    (sha256 hex, expected ETag) for an upload with config's part size.
+    """
+    sha256 = hashlib.sha256()
+    md5 = hashlib.md5()
+    multipart = info.file_size >= config.multipart_threshold
+    part_digests = []
+    part = hashlib.md5()
+    part_bytes = 0
+    with archive.open(info) as source, open(path, "wb") as out_file:
+        while True:
+            data = source.read(config.read_chunk_size)
+            if not data:
+                break
+            out_file.write(data)
+            sha256.update(data)
+            if not multipart:
+                md5.update(data)
+                continue
+            view = memoryview(data)
+            while view:
+                take = min(len(view), config.multipart_chunksize - part_bytes)
+                part.update(view[:take])
+                part_bytes += take
+                view = view[take:]
+                if part_bytes == config.multipart_chunksize:
+                    part_digests.append(part.digest())
+                    part, part_bytes = hashlib.md5(), 0
+    if multipart and part_bytes:
+        part_digests.append(part.digest())
+    return sha256.hexdigest(), s3_etag(md5.digest(), part_digests)
+
+
+def list_etags(s3, bucket, prefix=""):
+    """Returns {key: ETag} for the objects under prefix."""
+    etags = {}
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket, Prefix=prefix):
+        for item in page.get("Contents", ()):
+            etags[item["Key"]] = item["ETag"].strip('"')
+    return etags
+
+
+def read_manifest(s3, config):
+    """Returns {key: ManifestEntry} from the bucket's manifest, or {} if there is none."""
+    try:
+        body = s3.get_object(Bucket=config.bucket, Key=config.manifest_key)["Body"].read()
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return {}
+        raise
+    manifest = json.loads(body)
+    if manifest.get("version") != MANIFEST_VERSION or manifest.get("source_prefix") != config.source_prefix:
+        return {}
+    return {key: ManifestEntry(**entry) for key, entry in manifest.get("files", {}).items()}
+
+
+def write_manifest(s3, config, entries):
+    body = json.dumps({
+        "version": MANIFEST_VERSION,
+        "source_prefix": config.source_prefix,
+        "files": {key: entry._asdict() for key, entry in sorted(entries.items())},
+    })
+    s3.put_object(Bucket=config.bucket, Key=config.manifest_key, Body=body.encode("utf-8"),
+                  ContentType="application/json")
+
+
+def sync_member(s3, archive, info, key, path, config, transfer, listed_etag, entry):
+    """
+    Uploads one archive member unless the object already holds it. Returns
+    (ManifestEntry, uploaded).
+    """
+    # Same archive entry as last time and the object is untouched: no need
+    # to read the member at all
+    if entry is not None and listed_etag == entry.etag and entry.crc32 == info.CRC and entry.size == info.file_size:
+        return entry, False
+    try:
+        sha256, etag = extract_member(archive, info, path, config)
+        if listed_etag is not None and (
+            listed_etag == etag or (entry is not None and entry.sha256 == sha256 and entry.etag == listed_etag)
+        ):
+            return ManifestEntry(sha256, info.CRC, info.file_size, listed_etag), False
+        s3.upload_file(path, config.bucket, key, Config=transfer)
+        return ManifestEntry(sha256, info.CRC, info.file_size, etag), True
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def delete_objects(s3, bucket, keys):
+    keys = sorted(keys)
+    for start in range(0, len(keys), 1000):
+        batch = keys[start:start + 1000]
+        s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True})
+    return len(keys)
+
+
+def start_knowledge_base_sync(config, bedrock_agent=None):
+    """Starts an ingestion job for the configured data source; returns its ID."""
+    bedrock_agent = bedrock_agent or boto3.client("bedrock-agent")
+    response = bedrock_agent.start_ingestion_job(
+        knowledgeBaseId=config.knowledge_base_id, dataSourceId=config.data_source_id
+    )
+    return response["ingestionJob"]["ingestionJobId"]
+
+
+def ingest(config, s3=None, bedrock_agent=None):
+    """Loads config.source_prefix of the archive into config.bucket. Returns IngestStats."""
+    s3 = s3 or s3_client(config)
+    timings = {}
+    transfer = TransferConfig(
+        multipart_threshold=config.multipart_threshold,
+        multipart_chunksize=config.multipart_chunksize,
+        max_concurrency=config.part_concurrency,
+    )
+    with tempfile.TemporaryDirectory() as tmpdir:
+        started = time.perf_counter()
+        archive_path = os.path.join(tmpdir, "source.zip")
+        archive_bytes = download_archive(config.source_url, archive_path, config.read_chunk_size)
+        timings["download"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        manifest = read_manifest(s3, config)
+        listed = list_etags(s3, config.bucket, config.key_prefix)
+        timings["list"] = (time.perf_counter() - started) * 1000
+
+        started = time.perf_counter()
+        with zipfile.ZipFile(archive_path) as archive:
+            members = select_members(archive, config.source_prefix, config.key_prefix)
+
+            def sync(index):
+                info, key = members[index]
+                # Temporary files are numbered: member names never become local paths
+                path = os.path.join(tmpdir, str(index))
+                return sync_member(s3, archive, info, key, path, config, transfer, listed.get(key), manifest.get(key))
+
+            with ThreadPoolExecutor(max_workers=config.workers) as pool:
+                results = list(pool.map(sync, range(len(members))))
+        timings["upload"] = (time.perf_counter() - started) * 1000
+
+    entries = {key: entry for (_, key), (entry, _) in zip(members, results)}
+    uploaded = [key for (_, key), (_, changed) in zip(members, results) if changed]
+    uploaded_bytes = sum(info.file_size for (info, _), (_, changed) in zip(members, results) if changed)
+
+    deleted = 0
+    if config.prune:
+        deleted = delete_objects(s3, config.bucket, [key for key in manifest if key not in entries and key in listed])
+
+    if uploaded:
+        # Record the ETags S3 actually assigned (they differ from the MD5s
+        # with SSE-KMS, for example)
+        current = list_etags(s3, config.bucket, config.key_prefix)
+        for key in uploaded:
+            if key in current:
+                entries[key] = entries[key]._replace(etag=current[key])
+    if entries != manifest:
+        write_manifest(s3, config, entries)
+
+    ingestion_job_id = None
+    if (uploaded or deleted) and config.knowledge_base_id and config.data_source_id:
+        ingestion_job_id = start_knowledge_base_sync(config, bedrock_agent)
+
+    return IngestStats(archive_bytes, len(members), len(uploaded), len(members) - len(uploaded), deleted,
+                       uploaded_bytes, ingestion_job_id, timings)
+
+
+def handler(event, context):
+    config = config_from_env(event)
+    stats = ingest(config)
+    print(json.dumps(stats._asdict()))
+    return stats._asdict()
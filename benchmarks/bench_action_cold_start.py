@@ -0,0 +1,205 @@
+"""
+Cold start harness for the action group Lambda.
+
+Each run is a fresh Python process, like a new Lambda execution
+environment. It times, separately:
+
+  * init: importing the handler module, which builds everything that does
+    not depend on the event (ActionLambda.init() at import),
+  * snapshot: ActionLambda.before_snapshot(), the extra work SnapStart
+    captures (NumPy import and a warm-up query); only with --snapshot,
+  * first: the first invocation of each action, which pays any lazy work
+    left (e.g. the NumPy import for a weighted sort),
+  * warm: the median of --calls further invocations.
+
+Targets are ActionLambda.py, as the ActionCodeS3Bucket package deploys it,
+and the inline demo code of the ActionCall function in
+cfn/2-bedrock-agent-lambda-template.yaml, run as index.py. --rows N loads N
+synthetic companies through COMPANY_DATA_PATH (ActionLambda only). Reports
+the median over --runs processes.
+
+Also checks that the template fits the CloudFormation TemplateBody limit
+and that the sha256 prefix in the ActionCallVersion description is that of
+the inline code, so a change to it publishes a new version. Exits non-zero
+if a check fails or
+--max-init-ms or --max-first-ms is exceeded, so it can guard against cold
+start regressions.
+
+Usage:
+    python benchmarks/bench_action_cold_start.py
+    python benchmarks/bench_action_cold_start.py --rows 100000 --snapshot --runs 5
+    python benchmarks/bench_action_cold_start.py --max-init-ms 100 --max-first-ms 300
+"""
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+TEMPLATE = os.path.join(ROOT, 'cfn', '2-bedrock-agent-lambda-template.yaml')
+# Largest template accepted as TemplateBody (CLI, console upload)
+MAX_TEMPLATE_BODY_BYTES = 51200
+
+EVENTS = {
+    "portfolio": {"apiPath": "/createPortfolio", "parameters": {"numCompanies": "3", "industry": "Technology"}},
+    "weighted": {"apiPath": "/createPortfolio", "parameters": {
+        "numCompanies": "3", "industry": "Technology", "sortBy": "revenue:0.5,profit:0.5"}},
+    "research": {"apiPath": "/companyResearch", "parameters": {"name": "TechStashNova Inc."}},
+}
+
+# Runs in the fresh process: argv is module, path, snapshot, calls
+CHILD = '''
+import sys, json, time, contextlib, io
+module, path, snapshot, calls = sys.argv[1], sys.argv[2], sys.argv[3] == "1", int(sys.argv[4])
+events = json.loads(sys.stdin.read())
+sys.path.insert(0, path)
+timings = {}
+start = time.perf_counter()
+handler_module = __import__(module)
+timings["init"] = (time.perf_counter() - start) * 1000
+if snapshot:
+    start = time.perf_counter()
+    handler_module.before_snapshot()
+    timings["snapshot"] = (time.perf_counter() - start) * 1000
+with contextlib.redirect_stdout(io.StringIO()):
+    for name, event in events.items():
+        start = time.perf_counter()
+        response = handler_module.lambda_handler(event, None)
+        timings["first " + name] = (time.perf_counter() - start) * 1000
+        if response["response"]["httpStatusCode"] != 200:
+            raise SystemExit(f"{name}: HTTP {response['response']['httpStatusCode']}")
+    warm = []
+    for _ in range(calls):
+        for event in events.values():
+            start = time.perf_counter()
+            handler_module.lambda_handler(event, None)
+            warm.append((time.perf_counter() - start) * 1000)
+warm.sort()
+timings["warm"] = warm[len(warm) // 2] if warm else 0.0
+timings["numpy loaded"] = float("numpy" in sys.modules)
+print(json.dumps(timings))
+'''
+
+
+def lambda_event(name, spec):
+    return {
+        "messageVersion": "1.0",
+        "actionGroup": "PortfolioCreator-actions",
+        "apiPath": spec["apiPath"],
+        "httpMethod": "POST",
+        "sessionId": f"cold-start-{name}",
+        "parameters": [{"name": key, "type": "string", "value": value} for key, value in spec["parameters"].items()],
+    }
+
+
+def inline_handler_source(path=TEMPLATE):
+    """The ZipFile code of the ActionCall function, read without a YAML parser."""
+    lines = open(path).read().splitlines()
+    start = next(i for i, line in enumerate(lines) if line.strip().startswith("- ZipFile: |") or
+                 line.strip().startswith("ZipFile: |"))
+    body = []
+    indent = None
+    for line in lines[start + 1:]:
+        if line.strip():
+            current = len(line) - len(line.lstrip())
+            if indent is None:
+                indent = current
+            elif current < indent:
+                break
+        body.append(line[indent:] if indent is not None else line)
+    return "\n".join(body).rstrip("\n") + "\n"
+
+
+def version_code_digest(path=TEMPLATE):
+    """The inline code sha256 prefix named in the ActionCallVersion description."""
+    match = re.search(r"inline sha256:([0-9a-f]+)", open(path).read())
+    return match.group(1) if match else None
+
+
+def run_process(module, path, env, snapshot, calls):
+    events = {name: lambda_event(name, spec) for name, spec in EVENTS.items()}
+    result = subprocess.run(
+        [sys.executable, "-c", CHILD, module, path, "1" if snapshot else "0", str(calls)],
+        input=json.dumps(events), capture_output=True, text=True, env=env, check=False
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"{module}: {result.stderr.strip() or result.stdout.strip()}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def median_timings(module, path, env, snapshot, calls, runs):
+    samples = [run_process(module, path, env, snapshot, calls) for _ in range(runs)]
+    return {key: statistics.median(sample[key] for sample in samples) for key in samples[0]}
+
+
+def write_rows(directory, count):
+    sys.path.insert(0, HERE)
+    sys.path.insert(0, ROOT)
+    from bench_company_store import make_rows
+    path = os.path.join(directory, "companies.json")
+    with open(path, "w") as f:
+        json.dump(make_rows(count), f)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--calls", type=int, default=50)
+    parser.add_argument("--rows", type=int, default=0, help="synthetic companies for ActionLambda (0: mock data)")
+    parser.add_argument("--snapshot", action="store_true", help="run before_snapshot() after import")
+    parser.add_argument("--max-init-ms", type=float, default=None)
+    parser.add_argument("--max-first-ms", type=float, default=None)
+    args = parser.parse_args()
+
+    failures = []
+    template_bytes = os.path.getsize(TEMPLATE)
+    if template_bytes > MAX_TEMPLATE_BODY_BYTES:
+        failures.append(f"cfn/2 is {template_bytes} bytes, over the {MAX_TEMPLATE_BODY_BYTES} byte TemplateBody limit")
+    source_digest = hashlib.sha256(inline_handler_source().encode("utf-8")).hexdigest()
+    digest = version_code_digest()
+    if digest is None or not source_digest.startswith(digest):
+        failures.append(f"ActionCallVersion description names sha256:{digest}, not that of the inline code "
+                        f"({source_digest[:16]})")
+
+    with tempfile.TemporaryDirectory() as directory:
+        env = {key: value for key, value in os.environ.items() if not key.startswith("ACTION_LOG")}
+        env.pop("TELEMETRY_EXPORT", None)
+        action_env = dict(env)
+        if args.rows:
+            action_env["COMPANY_DATA_PATH"] = write_rows(directory, args.rows)
+        with open(os.path.join(directory, "index.py"), "w") as f:
+            f.write(inline_handler_source())
+
+        targets = [("ActionLambda", ROOT, action_env, args.snapshot)]
+        if not args.rows:
+            targets.append(("index", directory, env, False))
+        results = [(module, median_timings(module, path, target_env, snapshot, args.calls, args.runs))
+                   for module, path, target_env, snapshot in targets]
+
+    columns = ["init", "snapshot"] + [f"first {name}" for name in EVENTS] + ["warm"]
+    print(f"median ms over {args.runs} processes" + (f", {args.rows} companies" if args.rows else ""))
+    print(f"{'target':<14}" + "".join(f"{column:>18}" for column in columns) + f"{'numpy loaded':>14}")
+    for module, timings in results:
+        name = "inline (cfn/2)" if module == "index" else module
+        cells = "".join(f"{timings[column]:>18.2f}" if column in timings else f"{'-':>18}" for column in columns)
+        print(f"{name:<14}{cells}{'yes' if timings['numpy loaded'] else 'no':>14}")
+        first = max(timings[f"first {event}"] for event in EVENTS)
+        if args.max_init_ms is not None and timings["init"] > args.max_init_ms:
+            failures.append(f"{name}: init {timings['init']:.1f} ms > {args.max_init_ms} ms")
+        if args.max_first_ms is not None and first > args.max_first_ms:
+            failures.append(f"{name}: first invocation {first:.1f} ms > {args.max_first_ms} ms")
+
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
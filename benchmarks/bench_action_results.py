@@ -0,0 +1,167 @@
+"""
+Fidelity and timing check for structured action results (action_results.py).
+
+createPortfolio now returns a tagged, columnar table envelope that the
+client reads from the action group observation in the trace and turns
+straight into a DataFrame. This builds a CompanyStore of --rows synthetic
+companies, asks for portfolios of --portfolio companies and checks that:
+
+  * the DataFrame built from the envelope matches the rows the store
+    returns, value for value, with the dtypes declared in the schema,
+  * it survives the Parquet round trip used by the conversation history,
+  * end to end through the fake agent runtime (HTTP, event-stream framing,
+    TraceCollector), the same table comes out of askQuestion's trace.
+
+It times the new path (JSON decode of the observation + DataFrame from
+columns) against the old one: the row-dict JSON run through the quote
+stripping decode_response used to do and format_response's json.loads,
+which fails on it, plus the best case of parsing the row dicts untouched.
+Exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/bench_action_results.py
+    python benchmarks/bench_action_results.py --rows 50000 --portfolio 10000 --repeat 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'streamlit_app'))
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIDBENCHMARK")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark-secret")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ["AGENT_CACHE_BACKEND"] = "off"
+
+import pandas as pd  # noqa: E402
+
+import ActionLambda  # noqa: E402
+from action_results import TABLE_CONTENT_TYPE, action_results_from_traces, to_dataframe  # noqa: E402
+from bench_company_store import make_rows  # noqa: E402
+from fake_agent_runtime import FakeAgentRuntime, RuntimeConfig  # noqa: E402
+from history import decode_table, encode_table  # noqa: E402
+
+
+def action_event(num_companies):
+    return {
+        "actionGroup": "PortfolioCreator-actions",
+        "apiPath": "/createPortfolio",
+        "httpMethod": "POST",
+        "parameters": [{"name": "numCompanies", "type": "string", "value": str(num_companies)}],
+        "messageVersion": "1.0",
+    }
+
+
+def observation_traces(output):
+    """The invocationInput / observation trace pair the agent emits around an action call."""
+    def trace(orchestration):
+        return {"trace": {"orchestrationTrace": orchestration}}
+    return [
+        trace({"invocationInput": {"invocationType": "ACTION_GROUP", "actionGroupInvocationInput": {
+            "actionGroupName": "PortfolioCreator-actions", "apiPath": "/createPortfolio", "verb": "post"}}}),
+        trace({"observation": {"type": "ACTION_GROUP", "actionGroupInvocationOutput": {"text": output}}}),
+    ]
+
+
+def new_path(output):
+    results = action_results_from_traces(observation_traces(output))
+    return to_dataframe(results[0])
+
+
+def legacy_path(text):
+    # decode_response's cleanup, then format_response's json.loads
+    text = text.replace("\"", "")
+    text = text.replace("{input:{value:", "")
+    text = text.replace(",source:null}}", "")
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return None
+    return pd.DataFrame(data) if isinstance(data, list) else None
+
+
+def legacy_best_case(text):
+    return pd.DataFrame(json.loads(text))
+
+
+def median_ms(fn, arg, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(arg)
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def check(name, condition, failures):
+    print(f"  {'ok  ' if condition else 'FAIL'} {name}")
+    if not condition:
+        failures.append(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=20000)
+    parser.add_argument("--portfolio", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=10)
+    args = parser.parse_args()
+
+    ActionLambda.company_store = store = ActionLambda.CompanyStore(make_rows(args.rows))
+    query = ActionLambda.build_portfolio_query(None, args.portfolio)
+    expected = pd.DataFrame(store.query(query), columns=ActionLambda.COMPANY_COLUMNS)
+
+    body = ActionLambda.lambda_handler(action_event(args.portfolio), None)["response"]["responseBody"]
+    output = body["application/json"]["body"]
+    legacy_text = json.dumps(store.query(query))
+    failures = []
+
+    print(f"{len(expected)} row portfolio from {args.rows} companies")
+    frame = new_path(output)
+    check("body is a string", isinstance(output, str), failures)
+    check("envelope is tagged as a table", json.loads(output)["contentType"] == TABLE_CONTENT_TYPE, failures)
+    check("values match the store rows", frame.astype(object).equals(expected.astype(object)), failures)
+    check("dtypes follow the schema", [str(dtype) for dtype in frame.dtypes] ==
+          ["Int64", "string", "string", "Int64", "Int64", "Int64", "Int64"], failures)
+    restored = decode_table(encode_table(frame))
+    check("Parquet round trip keeps values and dtypes", restored.equals(frame) and list(restored.dtypes) == list(frame.dtypes), failures)
+    check("legacy cleanup + format_response yields no table", legacy_path(legacy_text) is None, failures)
+
+    runtime = FakeAgentRuntime(RuntimeConfig(first_byte_delay=0, step_delay=0, chunk_delay=0, trace_events=1))
+    os.environ["AGENT_RUNTIME_ENDPOINT"] = runtime.start()
+    import invoke_agent
+    start = time.perf_counter()
+    collector, _ = invoke_agent.askQuestion(
+        f"Create a portfolio of {args.portfolio} companies", invoke_agent.agent_url("bench-session"), False
+    )
+    end_to_end = (time.perf_counter() - start) * 1000
+    runtime.stop()
+    results = action_results_from_traces(collector.traces())
+    check("end to end: one table result from the trace",
+          len(results) == 1 and results[0].content_type == TABLE_CONTENT_TYPE, failures)
+    check("end to end: table matches",
+          bool(results) and to_dataframe(results[0]).astype(object).equals(expected.astype(object)), failures)
+
+    print(f"\n{'payload':<36} {'bytes':>10}")
+    print(f"{'table envelope (columnar)':<36} {len(output):>10}")
+    print(f"{'row dicts (previous body)':<36} {len(legacy_text):>10}")
+
+    print(f"\n{'path':<36} {'median ms':>10}")
+    print(f"{'trace -> DataFrame (new)':<36} {median_ms(new_path, output, args.repeat):>10.1f}")
+    print(f"{'cleanup + json.loads (old, fails)':<36} {median_ms(legacy_path, legacy_text, args.repeat):>10.1f}")
+    print(f"{'row dicts -> DataFrame (old, best)':<36} {median_ms(legacy_best_case, legacy_text, args.repeat):>10.1f}")
+    print(f"{'Parquet encode + decode (history)':<36} "
+          f"{median_ms(lambda f: decode_table(encode_table(f)), frame, args.repeat):>10.1f}")
+    print(f"{'askQuestion end to end (fake runtime)':<36} {end_to_end:>10.1f}")
+
+    print("OK" if not failures else "FAILED")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
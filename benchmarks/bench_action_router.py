@@ -0,0 +1,105 @@
+"""
+Throughput benchmark for the ActionLambda action router.
+
+Replays agent action-group events through lambda_handler and reports
+events/s and per-route latency, plus the cost of routing and parameter
+parsing alone. Pass --events with a JSONL file of captured Lambda events
+(one event per line, e.g. copied from the function's CloudWatch logs) to
+replay real traffic; otherwise a mix shaped like the agent's events for
+the sample prompts is used, including some invalid ones.
+
+Usage:
+    python benchmarks/bench_action_router.py
+    python benchmarks/bench_action_router.py --events captured_events.jsonl --repeat 20
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+from collections import defaultdict
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ActionLambda  # noqa: E402
+
+
+def agent_event(api_path, **params):
+    return {
+        "messageVersion": "1.0",
+        "agent": {"name": "PortfolioCreator", "id": "AGENT", "alias": "ALIAS", "version": "DRAFT"},
+        "sessionId": "bench-session",
+        "sessionAttributes": {},
+        "promptSessionAttributes": {},
+        "inputText": "benchmark",
+        "actionGroup": "PortfolioCreator-actions",
+        "apiPath": api_path,
+        "httpMethod": "POST",
+        "parameters": [{"name": name, "type": "string", "value": value} for name, value in params.items()],
+    }
+
+
+def sample_events():
+    return [
+        agent_event("/createPortfolio", numCompanies="3", industry="Real Estate"),
+        agent_event("/createPortfolio", numCompanies="4", industry="technology"),
+        agent_event("/createPortfolio", numCompanies="5", sortBy="margin", filters="revenue>=50000"),
+        agent_event("/companyResearch", name="TechStashNova Inc."),
+        agent_event("/companyResearch", name="techstash nova"),
+        agent_event("/sendEmail", emailAddress="test@example.com", fomcSummary="Summary", portfolio="[...]"),
+        agent_event("/createPortfolio", industry="technology"),
+        agent_event("/unknownAction"),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", help="JSONL file of captured action group events")
+    parser.add_argument("--repeat", type=int, default=2000, help="Times to replay the event list")
+    args = parser.parse_args()
+
+    if args.events:
+        with open(args.events) as f:
+            events = [json.loads(line) for line in f if line.strip()]
+    else:
+        events = sample_events()
+
+    latencies = defaultdict(float)
+    calls = defaultdict(int)
+    statuses = defaultdict(int)
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()) as sink:
+        for _ in range(args.repeat):
+            for event in events:
+                call_start = time.perf_counter()
+                response = ActionLambda.lambda_handler(event, None)
+                latencies[event["apiPath"]] += time.perf_counter() - call_start
+                calls[event["apiPath"]] += 1
+                statuses[response["response"]["httpStatusCode"]] += 1
+            sink.seek(0)
+            sink.truncate()
+    elapsed = time.perf_counter() - start
+    total = args.repeat * len(events)
+
+    route_start = time.perf_counter()
+    for _ in range(args.repeat):
+        for event in events:
+            route = (event["apiPath"], event["httpMethod"].upper())
+            if route in ActionLambda.ACTION_ROUTES:
+                try:
+                    ActionLambda.parse_parameters(event, ActionLambda.PARAMETER_SPECS.get(route, ()))
+                except ValueError:
+                    pass
+    route_us = (time.perf_counter() - route_start) / total * 1e6
+
+    print(f"events: {total}  throughput: {total / elapsed:,.0f} events/s  routing+parsing: {route_us:.2f} us/event")
+    print(f"status codes: {dict(statuses)}")
+    print(f"{'apiPath':>20} {'calls':>8} {'mean us':>9}")
+    for api_path in sorted(calls):
+        print(f"{api_path:>20} {calls[api_path]:>8} {latencies[api_path] / calls[api_path] * 1e6:9.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Cold vs warm rerun benchmark for streamlit_app/app.py.
+
+Drives the real script with streamlit.testing.v1.AppTest (no browser or
+server) and times:
+
+  * cold: the first run in the process (imports, st.cache_resource fills),
+  * cache cleared: a run right after st.cache_resource.clear(),
+  * warm: reruns of a page that already ran, with --history past turns in
+    st.session_state['history'].
+
+Only the newest APP_HISTORY_WINDOW turns are drawn on a rerun, so rerun time
+and element count should stay flat as the history grows. Every tenth seeded
+turn has a table answer, to include the Parquet round trip. The history
+memory column is what the ConversationHistory counts against its cap.
+
+For comparison it also times the per-rerun image work the app used to do
+(opening both avatar files and cropping them into circles at full size).
+
+Usage:
+    python benchmarks/bench_app_rerun.py
+    python benchmarks/bench_app_rerun.py --history 0 10 100 1000 --reruns 10
+    python benchmarks/bench_app_rerun.py --history 10 100 1000 --show-earlier
+"""
+import os
+import sys
+import time
+import logging
+import argparse
+import statistics
+
+APP_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit_app')
+sys.path.insert(0, APP_DIR)
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+import pandas as pd  # noqa: E402
+import streamlit as st  # noqa: E402
+from streamlit.testing.v1 import AppTest  # noqa: E402
+from history import ConversationHistory  # noqa: E402
+
+APP_PATH = os.path.join(APP_DIR, "app.py")
+
+# Setting session_state from outside a script run logs a harmless warning.
+# A filter, because Streamlit resets logger levels when it loads its config.
+logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").addFilter(
+    lambda record: "missing ScriptRunContext" not in record.getMessage()
+)
+
+
+def make_history(turns):
+    # Uncapped, so every seeded turn is kept
+    history = ConversationHistory(max_bytes=float("inf"), max_turns=turns + 1)
+    table = pd.DataFrame({
+        "companyName": [f"Company {i}" for i in range(20)],
+        "industry": ["Technology"] * 20,
+        "profit": [1000.0 * i for i in range(20)],
+    })
+    for i in range(turns):
+        question = f"Question {i}: create a portfolio of 3 companies in the technology industry"
+        if i % 10 == 9:
+            history.append(question, table)
+        else:
+            history.append(question, f"Answer {i}: " + "The portfolio includes TechStashNova Inc. and others. " * 8)
+    return history
+
+
+def timed_run(app):
+    start = time.perf_counter()
+    app.run(timeout=120)
+    elapsed = time.perf_counter() - start
+    if app.exception:
+        raise RuntimeError(app.exception[0].message)
+    return elapsed
+
+
+def legacy_image_work():
+    from PIL import Image, ImageDraw, ImageOps
+
+    def crop_to_circle(image):
+        mask = Image.new('L', image.size, 0)
+        ImageDraw.Draw(mask).ellipse((0, 0) + image.size, fill=255)
+        result = ImageOps.fit(image, mask.size, centering=(0.5, 0.5))
+        result.putalpha(mask)
+        return result
+
+    start = time.perf_counter()
+    crop_to_circle(Image.open(os.path.join(APP_DIR, 'human_face.png')))
+    crop_to_circle(Image.open(os.path.join(APP_DIR, 'robot_face.jpg')))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, nargs="+", default=[0, 10, 100])
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--show-earlier", action="store_true",
+                        help="Also turn on 'Show earlier turns', drawing one page of older turns")
+    args = parser.parse_args()
+
+    app = AppTest.from_file(APP_PATH, default_timeout=120)
+    print(f"cold first run:        {timed_run(app) * 1000:8.1f} ms")
+    st.cache_resource.clear()
+    print(f"after cache clear:     {timed_run(app) * 1000:8.1f} ms")
+    print(f"warm rerun:            {statistics.median(timed_run(app) for _ in range(args.reruns)) * 1000:8.1f} ms")
+    print(f"legacy image work:     {statistics.median(legacy_image_work() for _ in range(args.reruns)) * 1000:8.1f} ms"
+          " per rerun (no longer done)")
+
+    print(f"\n{'history turns':>13} {'median rerun ms':>16} {'max ms':>8} {'elements':>9} {'history KiB':>12}")
+    for turns in args.history:
+        app = AppTest.from_file(APP_PATH, default_timeout=120)
+        app.run(timeout=120)
+        history = make_history(turns)
+        app.session_state['history'] = history
+        timed_run(app)
+        if args.show_earlier and len(app.toggle):
+            app.toggle(key="show_earlier_turns").set_value(True)
+        times = [timed_run(app) for _ in range(args.reruns)]
+        elements = sum(1 for _ in app.main)
+        print(f"{turns:>13} {statistics.median(times) * 1000:>16.1f} {max(times) * 1000:>8.1f} "
+              f"{elements:>9} {history.size_bytes / 1024:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Benchmark for AsyncAgentClient in streamlit_app/async_invoke_agent.py.
+
+Starts a local fake agent runtime (aiohttp) that answers
+POST /agents/{id}/agentAliases/{alias}/sessions/{sid}/text with event-stream
+frames: a few trace events spaced out by --step-delay seconds, then the
+answer chunk. Questions containing "fail" get an exception frame and
+questions containing "slow" never finish, to exercise error reporting and
+per-call timeouts. The same batch is then run at several concurrency
+limits with invoke_many.
+
+Afterwards it checks that a call whose first connection is dropped before
+any response (questions containing "drop") is retried and answered. Exits
+non-zero if it is not.
+
+Usage:
+    python benchmarks/bench_async_invoke.py --questions 64 --concurrency 1 8 32
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit_app'))
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIDBENCHMARK")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark-secret")
+
+from aiohttp import web  # noqa: E402
+
+from async_invoke_agent import AsyncAgentClient  # noqa: E402
+from event_stream import encode_agent_event, encode_chunk_event, encode_error_event  # noqa: E402
+
+
+def make_fake_runtime(steps, step_delay):
+    dropped = set()
+
+    async def invoke_agent(request):
+        body = await request.json()
+        if "authorization" not in request.headers:
+            return web.Response(status=403, text="Missing Authentication Token")
+        if "drop" in body["inputText"] and request.match_info["sid"] not in dropped:
+            # Close the connection without answering, once per session
+            dropped.add(request.match_info["sid"])
+            request.transport.close()
+            return web.Response(status=500)
+
+        response = web.StreamResponse(headers={"content-type": "application/vnd.amazon.eventstream"})
+        await response.prepare(request)
+        question = body["inputText"]
+        try:
+            if "slow" in question:
+                await asyncio.sleep(3600)
+            for step in range(steps):
+                await asyncio.sleep(step_delay)
+                trace = {"sessionId": request.match_info["sid"], "trace": {"orchestrationTrace": {"rationale": {"text": f"step {step}"}}}}
+                await response.write(encode_agent_event("trace", trace))
+            if "fail" in question:
+                await response.write(encode_error_event("throttlingException", "Rate exceeded"))
+            else:
+                await response.write(encode_chunk_event(f"Answer to: {question}"))
+            await response.write_eof()
+        except ConnectionResetError:
+            # The client gave up (timeout or cancellation).
+            pass
+        return response
+
+    app = web.Application()
+    app.router.add_post("/agents/{agent}/agentAliases/{alias}/sessions/{sid}/text", invoke_agent)
+    return app
+
+
+async def run_batch(endpoint, questions, concurrency, timeout):
+    latencies = []
+    errors = 0
+    start = time.perf_counter()
+    async with AsyncAgentClient("FAKEAGENT", "FAKEALIAS", endpoint_url=endpoint, max_concurrency=concurrency) as client:
+        session_ids = [f"bench-{i}" for i in range(len(questions))]
+        async for result in client.invoke_many(questions, session_ids, timeout=timeout):
+            latencies.append(result.latency)
+            if result.error:
+                errors += 1
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p95 = latencies[max(int(len(latencies) * 0.95) - 1, 0)]
+    print(f"{concurrency:>11} {elapsed:9.2f} {len(questions) / elapsed:9.1f} {p50 * 1000:9.1f} {p95 * 1000:9.1f} {errors:>7}")
+
+
+async def main(args):
+    runner = web.AppRunner(make_fake_runtime(args.steps, args.step_delay))
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    endpoint = f"http://127.0.0.1:{port}"
+
+    questions = [f"Create a portfolio with {i % 5 + 1} companies in the technology industry" for i in range(args.questions)]
+    questions[1] = "please fail this one"
+    questions[2] = "this one is slow"
+
+    print(f"{'concurrency':>11} {'total s':>9} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'errors':>7}")
+    try:
+        for concurrency in args.concurrency:
+            await run_batch(endpoint, questions, concurrency, args.timeout)
+        async with AsyncAgentClient("FAKEAGENT", "FAKEALIAS", endpoint_url=endpoint, backoff_factor=0.01) as client:
+            try:
+                answer, _ = await client.ask_question("drop the connection once", "drop-session", timeout=args.timeout)
+            except Exception as e:
+                answer = repr(e)
+    finally:
+        await runner.cleanup()
+    ok = answer == "Answer to: drop the connection once"
+    print(f"dropped connection retried: {'ok' if ok else 'FAILED (' + answer + ')'}")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--steps", type=int, default=4, help="Trace events per answer")
+    parser.add_argument("--step-delay", type=float, default=0.05, help="Seconds between trace events")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Per-call timeout in seconds")
+    sys.exit(0 if asyncio.run(main(parser.parse_args())) else 1)
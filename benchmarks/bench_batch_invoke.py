@@ -0,0 +1,217 @@
+"""
+Batch question runs (streamlit_app/batch_invoke.py) against the fake agent
+runtime, compared with one lambda_handler invocation per question.
+
+The previous way to run an evaluation set was one invoke_agent.lambda_handler
+call per question, one after another; --invoke-overhead adds the cost of a
+Lambda invocation to each. The batch runs the same --items questions at
+each --concurrency level into a JSONL sink. The runtime throttles a
+--throttle-rate share of requests (HTTP 429).
+
+Checks:
+  * every batch item ends with an ok result,
+  * a run stopped halfway (stop_at) and resumed writes each item exactly
+    once and only asks the remaining items again,
+  * S3 parts (via benchmarks/fake_s3.py) resume the same way,
+  * the turns of a session are asked in input order, one at a time, even
+    with the sessions interleaved in the input,
+  * items that always hit 429 fail after max_attempts, and a too short
+    item timeout ends in "timeout" results,
+  * an item whose stream broke after the turn started is not asked again,
+  * lambda_handler with an "items" event returns the batch results,
+  * the process-wide client used by single questions is left as it was,
+  * exception frames are classified by their error type.
+
+Exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/bench_batch_invoke.py
+    python benchmarks/bench_batch_invoke.py --items 500 --concurrency 1 16 64 --throttle-rate 0.1
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import contextlib
+from collections import Counter
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'streamlit_app'))
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIDBENCHMARK")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark-secret")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ["AGENT_CACHE_BACKEND"] = "off"
+
+import boto3  # noqa: E402
+from botocore.config import Config  # noqa: E402
+
+import batch_invoke  # noqa: E402
+import invoke_agent  # noqa: E402
+from event_stream import AgentStreamError  # noqa: E402
+from fake_agent_runtime import FakeAgentRuntime, RuntimeConfig  # noqa: E402
+from fake_s3 import FakeS3  # noqa: E402
+from load_test import QUESTIONS  # noqa: E402
+
+
+def make_entries(count, tag):
+    return [{"id": f"{tag}-{index}", "sessionId": f"{tag}-session-{index}", "question": QUESTIONS[index % len(QUESTIONS)]}
+            for index in range(count)]
+
+
+def run_single_invocations(entries, overhead):
+    """One lambda_handler call per question, like one Lambda invocation each."""
+    errors = 0
+    latencies = []
+    start = time.perf_counter()
+    for entry in entries:
+        item_start = time.perf_counter()
+        time.sleep(overhead)
+        # lambda_handler prints every question
+        with contextlib.redirect_stdout(None):
+            response = invoke_agent.lambda_handler(entry, None)
+        latencies.append((time.perf_counter() - item_start) * 1000)
+        errors += response["status_code"] != 200
+    wall = time.perf_counter() - start
+    latencies.sort()
+    return wall, len(entries) / wall, batch_invoke.percentile(latencies, 0.5), batch_invoke.percentile(latencies, 0.95), errors
+
+
+def sink_lines(path):
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def check(name, condition, failures):
+    print(f"  {'ok  ' if condition else 'FAIL'} {name}")
+    if not condition:
+        failures.append(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--single", type=int, default=40, help="questions run as single invocations")
+    parser.add_argument("--invoke-overhead", type=float, default=0.03)
+    parser.add_argument("--throttle-rate", type=float, default=0.05)
+    parser.add_argument("--step-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    config = RuntimeConfig(first_byte_delay=args.step_delay, step_delay=args.step_delay, chunk_delay=0.002,
+                           trace_events=2, throttle_rate=args.throttle_rate, seed=1)
+    failures = []
+    rows = []
+    with FakeAgentRuntime(config) as runtime, tempfile.TemporaryDirectory() as directory:
+        invoke_agent.agentRuntimeEndpoint = runtime.endpoint
+        shared_client = invoke_agent.get_client()
+        shared_settings = (shared_client.timeout, shared_client.http.get_adapter(runtime.endpoint).max_retries.total)
+
+        wall, rate, p50, p95, errors = run_single_invocations(make_entries(args.single, "single"), args.invoke_overhead)
+        rows.append(("single invocations", 1, args.single, wall, rate, p50, p95, 0, errors))
+
+        for concurrency in args.concurrency:
+            path = os.path.join(directory, f"results-{concurrency}.jsonl")
+            stats = batch_invoke.run_batch(
+                batch_invoke.batch_items(make_entries(args.items, f"c{concurrency}")),
+                batch_invoke.JsonlSink(path), max_concurrency=concurrency, backoff_base=0.05
+            )
+            rows.append(("batch", concurrency, args.items, stats.wall_seconds, stats.items_per_second,
+                         stats.latency_p50_ms, stats.latency_p95_ms, stats.retries, stats.failed + stats.timed_out))
+            lines = sink_lines(path)
+            check(f"batch x{concurrency}: {args.items} ok results",
+                  stats.succeeded == args.items and len(lines) == args.items
+                  and all(line["status"] == "ok" and line["response"] for line in lines), failures)
+
+        print("\nresume")
+        items = batch_invoke.batch_items(make_entries(args.items, "resume"))
+        path = os.path.join(directory, "resume.jsonl")
+        concurrency = max(args.concurrency)
+        first = batch_invoke.run_batch(items, batch_invoke.JsonlSink(path), max_concurrency=concurrency,
+                                       backoff_base=0.05, stop_at=time.monotonic() + rows[-1][3] / 2)
+        before = runtime.requests
+        second = batch_invoke.run_batch(items, batch_invoke.JsonlSink(path), max_concurrency=concurrency,
+                                        backoff_base=0.05)
+        counts = Counter(line["item_id"] for line in sink_lines(path) if line["status"] == "ok")
+        print(f"  first run: {first.succeeded} ok, {first.pending} pending; second run: {second.skipped} skipped, "
+              f"{second.succeeded} ok, {runtime.requests - before} requests")
+        check("stopped run leaves items pending", first.pending > 0, failures)
+        check("resume asks only the remaining items",
+              second.skipped == first.succeeded and second.succeeded == args.items - first.succeeded, failures)
+        check("every item answered exactly once", len(counts) == args.items and set(counts.values()) == {1}, failures)
+
+        with FakeS3() as fake_s3:
+            fake_s3.create_bucket("results")
+            s3 = boto3.client("s3", endpoint_url=fake_s3.endpoint, config=Config(s3={"addressing_style": "path"}))
+            items = batch_invoke.batch_items(make_entries(50, "s3"))
+            first = batch_invoke.run_batch(items[:30], batch_invoke.S3Sink("results", "nightly/", 8, s3),
+                                           max_concurrency=8, backoff_base=0.05)
+            second = batch_invoke.run_batch(items, batch_invoke.S3Sink("results", "nightly/", 8, s3),
+                                            max_concurrency=8, backoff_base=0.05)
+            parts = fake_s3.objects("results")
+            lines = [json.loads(line) for stored in parts.values() for line in stored.data.decode().splitlines()]
+            check("S3 sink: resume skips answered items and writes parts",
+                  first.succeeded == 30 and second.skipped == 30 and second.succeeded == 20
+                  and len(lines) == 50 and len(parts) == 4 + 3, failures)
+
+        # Turn-major order: every session's first turn, then every second turn, ...
+        entries = [{"id": f"turns-{session}-{turn}", "sessionId": f"turns-{session}", "question": f"turn {turn}"}
+                   for turn in range(5) for session in range(12)]
+        stats = batch_invoke.run_batch(batch_invoke.batch_items(entries), batch_invoke.ListSink(),
+                                       max_concurrency=32, backoff_base=0.01)
+        check("multi-turn sessions: turns asked in order, one at a time",
+              stats.succeeded == len(entries) and runtime.overlapping_turns == 0
+              and all(runtime.questions[f"turns-{session}"] == [f"turn {turn}" for turn in range(5)]
+                      for session in range(12)), failures)
+
+        stats = batch_invoke.run_batch(
+            batch_invoke.batch_items([{"sessionId": "t", "question": "please throttle"}]),
+            batch_invoke.ListSink(), max_attempts=3, backoff_base=0.01
+        )
+        check("always throttled: failed after 3 attempts with retries counted",
+              stats.failed == 1 and stats.retries == 2 and stats.throttled == 3, failures)
+
+        sink = batch_invoke.ListSink()
+        stats = batch_invoke.run_batch(batch_invoke.batch_items(make_entries(4, "timeout")), sink,
+                                       item_timeout=args.step_delay, max_attempts=2, backoff_base=0.01)
+        check("short item timeout: timeout results after 2 attempts",
+              stats.timed_out == 4 and all(result.attempts == 2 for result in sink.results), failures)
+
+        sink = batch_invoke.ListSink()
+        stats = batch_invoke.run_batch(batch_invoke.batch_items([{"sessionId": "p", "question": "please fail"}]), sink,
+                                       max_attempts=3, backoff_base=0.01)
+        check("stream broken mid-turn: failed without asking again",
+              stats.failed == 1 and runtime.questions["p"] == ["please fail"], failures)
+
+        response = invoke_agent.lambda_handler({"items": make_entries(3, "lambda"), "maxConcurrency": 3}, None)
+        body = json.loads(response["body"])
+        check("lambda_handler batch event returns results and stats",
+              response["status_code"] == 200 and body["stats"]["succeeded"] == 3
+              and len(body["results"]) == 3 and all(r["status"] == "ok" for r in body["results"]), failures)
+
+        client = invoke_agent.get_client()
+        check("single questions keep the shared client and its retries and timeout",
+              client is shared_client
+              and (client.timeout, client.http.get_adapter(runtime.endpoint).max_retries.total) == shared_settings,
+              failures)
+
+    check("exception frames are classified by error type",
+          batch_invoke.is_retryable(AgentStreamError("throttlingException", "Rate exceeded")) == (True, True)
+          and batch_invoke.is_retryable(AgentStreamError("validationException", "throttlingException: no")) == (False, False),
+          failures)
+
+    print(f"\n{'mode':<20} {'conc':>5} {'items':>6} {'seconds':>8} {'items/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+          f"{'retries':>8} {'errors':>7}")
+    for mode, concurrency, count, wall, rate, p50, p95, retries, errors in rows:
+        print(f"{mode:<20} {concurrency:>5} {count:>6} {wall:>8.2f} {rate:>8.1f} {p50:>8.1f} {p95:>8.1f} "
+              f"{retries:>8} {errors:>7}")
+    print("OK" if not failures else "FAILED")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
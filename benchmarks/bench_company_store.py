@@ -0,0 +1,114 @@
+"""
+Benchmark for the CompanyStore in ActionLambda.py.
+
+For each data set size, measures the one-off build cost (time and memory
+held by the store) and the per-invocation latency of /companyResearch and
+/createPortfolio through lambda_handler. The same calls are also timed
+against the previous per-invocation list scan + full sort for comparison.
+
+Usage:
+    python benchmarks/bench_company_store.py
+    python benchmarks/bench_company_store.py --rows 20 10000 1000000 --calls 200
+"""
+import os
+import io
+import sys
+import time
+import random
+import argparse
+import tracemalloc
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ActionLambda  # noqa: E402
+
+INDUSTRIES = ["Technology", "Real Estate", "Healthcare", "Energy", "Finance", "Retail", "Transportation", "Utilities"]
+
+
+def make_rows(count):
+    if count <= len(ActionLambda.COMPANY_DATA):
+        return [dict(row) for row in ActionLambda.COMPANY_DATA[:count]]
+    rng = random.Random(42)
+    rows = []
+    for company_id in range(1, count + 1):
+        revenue = rng.randrange(10_000, 10_000_000)
+        expenses = rng.randrange(1_000, revenue)
+        rows.append({
+            "companyId": company_id,
+            "companyName": f"Company{company_id} Holdings",
+            "industrySector": INDUSTRIES[company_id % len(INDUSTRIES)],
+            "revenue": revenue,
+            "expenses": expenses,
+            "profit": revenue - expenses,
+            "employees": rng.randrange(5, 50_000),
+        })
+    return rows
+
+
+def legacy_company_research(company_data, name):
+    for company_info in company_data:
+        if company_info["companyName"].lower() == name:
+            return company_info
+    return None
+
+
+def legacy_create_portfolio(company_data, industry, num_companies):
+    filtered = [company for company in company_data if company['industrySector'].lower() == industry]
+    return sorted(filtered, key=lambda x: x['profit'], reverse=True)[:num_companies]
+
+
+def event(api_path, **params):
+    return {
+        "actionGroup": "PortfolioCreator-actions",
+        "apiPath": api_path,
+        "httpMethod": "POST",
+        "parameters": [{"name": name, "type": "string", "value": value} for name, value in params.items()],
+    }
+
+
+def per_call_us(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[20, 10_000, 1_000_000])
+    parser.add_argument("--calls", type=int, default=100)
+    args = parser.parse_args()
+
+    print(f"{'rows':>9} {'build ms':>9} {'store MiB':>10} {'research us':>12} {'portfolio us':>13} {'legacy research us':>19} {'legacy portfolio us':>20}")
+    for count in args.rows:
+        rows = make_rows(count)
+        name = rows[-1]["companyName"]
+
+        start = time.perf_counter()
+        store = ActionLambda.CompanyStore(rows)
+        build_ms = (time.perf_counter() - start) * 1000
+
+        # Second build under tracemalloc, which is too slow to time
+        del store
+        tracemalloc.start()
+        store = ActionLambda.CompanyStore(rows)
+        store_mib = tracemalloc.get_traced_memory()[0] / (1024 * 1024)
+        tracemalloc.stop()
+        ActionLambda.company_store = store
+
+        research = event("/companyResearch", name=name)
+        portfolio = event("/createPortfolio", numCompanies="5", industry="technology")
+        with contextlib.redirect_stdout(io.StringIO()):
+            research_us = per_call_us(lambda: ActionLambda.lambda_handler(research, None), args.calls)
+            portfolio_us = per_call_us(lambda: ActionLambda.lambda_handler(portfolio, None), args.calls)
+
+        legacy_calls = max(1, args.calls // 10) if count > 100_000 else args.calls
+        legacy_research_us = per_call_us(lambda: legacy_company_research(rows, name.lower()), legacy_calls)
+        legacy_portfolio_us = per_call_us(lambda: legacy_create_portfolio(rows, "technology", 5), legacy_calls)
+
+        print(f"{count:>9} {build_ms:9.1f} {store_mib:10.2f} {research_us:12.1f} {portfolio_us:13.1f} {legacy_research_us:19.1f} {legacy_portfolio_us:20.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Benchmark for the incremental event-stream decoder in streamlit_app/event_stream.py.
+
+Builds trace-heavy Bedrock Agent response streams of increasing size (or
+replays a recorded raw response body with --recording) and decodes them in
+network-sized reads. Decode time should grow linearly with stream size and
+peak memory should stay close to the size of the largest single frame.
+
+Usage:
+    python benchmarks/bench_event_stream.py
+    python benchmarks/bench_event_stream.py --sizes 1 4 16 --read-size 16384
+    python benchmarks/bench_event_stream.py --recording response.bin
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit_app'))
+
+from event_stream import (  # noqa: E402
+    ChunkEvent,
+    encode_agent_event,
+    encode_chunk_event,
+    iter_agent_events,
+)
+
+
+def make_trace(step, rationale_size):
+    """Returns a trace body shaped like an orchestrationTrace from the agent runtime."""
+    return {
+        "agentId": "BENCHAGENT",
+        "agentAliasId": "BENCHALIAS",
+        "sessionId": "bench-session",
+        "trace": {
+            "orchestrationTrace": {
+                "modelInvocationInput": {
+                    "traceId": f"trace-{step}",
+                    "text": ("You are an investment analyst. \"Quoted\" context. " * (rationale_size // 50))[:rationale_size],
+                    "type": "ORCHESTRATION",
+                },
+                "rationale": {"traceId": f"trace-{step}", "text": "Thinking about step %d" % step},
+            }
+        },
+    }
+
+
+def build_stream(target_bytes, rationale_size=8 * 1024):
+    """Builds a raw event-stream body of roughly target_bytes with a short answer at the end."""
+    frames = []
+    size = 0
+    step = 0
+    while size < target_bytes:
+        frame = encode_agent_event("trace", make_trace(step, rationale_size))
+        frames.append(frame)
+        size += len(frame)
+        step += 1
+    frames.append(encode_chunk_event("Here is your portfolio: ünïcode ✓ \"quoted\""))
+    return b"".join(frames), step
+
+
+def read_chunks(data, read_size):
+    view = memoryview(data)
+    for offset in range(0, len(data), read_size):
+        yield view[offset:offset + read_size]
+
+
+def decode(data, read_size):
+    answer = []
+    traces = 0
+    for event in iter_agent_events(read_chunks(data, read_size)):
+        if isinstance(event, ChunkEvent):
+            answer.append(event.bytes)
+        else:
+            traces += 1
+    return b"".join(answer).decode("utf-8"), traces
+
+
+def run(label, data, read_size):
+    start = time.perf_counter()
+    decode(data, read_size)
+    elapsed = time.perf_counter() - start
+
+    tracemalloc.start()
+    decode(data, read_size)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    mb = len(data) / (1024 * 1024)
+    print(f"{label:>12} {mb:9.2f} {elapsed * 1000:10.1f} {mb / elapsed:10.1f} {peak / 1024:12.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=float, nargs="+", default=[1, 2, 4, 8, 16], help="Stream sizes in MiB")
+    parser.add_argument("--read-size", type=int, default=64 * 1024, help="Bytes per simulated network read")
+    parser.add_argument("--recording", help="Path to a recorded raw response body to replay instead")
+    args = parser.parse_args()
+
+    print(f"{'stream':>12} {'MiB':>9} {'ms':>10} {'MiB/s':>10} {'peak KiB':>12}")
+    if args.recording:
+        with open(args.recording, "rb") as f:
+            run(os.path.basename(args.recording)[:12], f.read(), args.read_size)
+        return
+
+    for size in args.sizes:
+        data, steps = build_stream(int(size * 1024 * 1024))
+        run(f"{steps} traces", data, args.read_size)
+
+
+if __name__ == "__main__":
+    main()
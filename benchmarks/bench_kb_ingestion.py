@@ -0,0 +1,248 @@
+"""
+Knowledge base ingestion benchmark: DataLoadLambda.py vs the previous
+serial GitHubToS3Lambda code.
+
+Builds a repository archive with --files FOMC-sized documents (--size-kb
+each, plus --large documents of --large-mb that take multipart uploads)
+under S3docs/, and --other-mb of other repository files. The archive is
+served over HTTP and loaded into a fake S3 (benchmarks/fake_s3.py, run in a
+separate process, with --latency per request and --throughput bytes/s per
+connection), or into a real S3-compatible endpoint such as MinIO with
+--endpoint-url. Peak memory is what the loader itself allocates (tracemalloc).
+
+Runs:
+  * previous: read the whole archive, extractall, upload_file one by one,
+  * ingest: DataLoadLambda.ingest into an empty bucket,
+  * rerun: the same archive again (everything skipped),
+  * changed: an archive with --changed documents modified,
+  * no manifest: the manifest deleted, files matched by ETag alone.
+
+Checks that the bucket holds exactly the source documents after each run,
+that reruns upload only what changed, and that the inline code of
+GitHubToS3Lambda in cfn/1-s3-dataload-template.yaml is DataLoadLambda.py.
+Exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/bench_kb_ingestion.py
+    python benchmarks/bench_kb_ingestion.py --files 500 --latency 0.03 --workers 32
+    python benchmarks/bench_kb_ingestion.py --endpoint-url http://127.0.0.1:9000
+"""
+import os
+import sys
+import json
+import time
+import random
+import hashlib
+import zipfile
+import argparse
+import tempfile
+import subprocess
+import tracemalloc
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, HERE)
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIDBENCHMARK")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark-secret")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+import boto3  # noqa: E402
+from botocore.config import Config  # noqa: E402
+
+import DataLoadLambda  # noqa: E402
+
+ARCHIVE_ROOT = "bedrock-agents-streamlit-main/"
+SOURCE_PREFIX = ARCHIVE_ROOT + "S3docs/"
+TEMPLATE = os.path.join(ROOT, "cfn", "1-s3-dataload-template.yaml")
+
+
+def document(rng, size):
+    """PDF-like bytes: a short text header, then incompressible streams."""
+    header = b"%PDF-1.7\n% FOMC minutes\n"
+    return header + rng.randbytes(max(0, size - len(header)))
+
+
+def make_documents(args, seed=7):
+    rng = random.Random(seed)
+    documents = {f"fomcminutes{index:04d}.pdf": document(rng, args.size_kb * 1024) for index in range(args.files)}
+    for index in range(args.large):
+        documents[f"large/fomc-annual-{index}.pdf"] = document(rng, args.large_mb * 1024 * 1024)
+    return documents
+
+
+def write_archive(path, documents, other_mb):
+    rng = random.Random(1)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name in ("README.md", "ActionLambda.py", "cfn/1-s3-dataload-template.yaml"):
+            archive.writestr(ARCHIVE_ROOT + name, "text " * 2000)
+        if other_mb:
+            archive.writestr(ARCHIVE_ROOT + "images/screenshots.bin", rng.randbytes(int(other_mb * 1024 * 1024)))
+        for name, data in documents.items():
+            archive.writestr(SOURCE_PREFIX + name, data)
+
+
+def legacy_load(url, bucket, s3):
+    """The previous GitHubToS3Lambda handler, with the URL, bucket and client passed in."""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        local_zip_path = os.path.join(tmpdir, 'main.zip')
+        with urllib.request.urlopen(url) as response:
+            with open(local_zip_path, 'wb') as out_file:
+                out_file.write(response.read())
+        with zipfile.ZipFile(local_zip_path, 'r') as zip_ref:
+            zip_ref.extractall(tmpdir)
+        s3docs_path = os.path.join(tmpdir, 'bedrock-agents-streamlit-main', 'S3docs')
+        for root, dirs, files in os.walk(s3docs_path):
+            for file in files:
+                file_path = os.path.join(root, file)
+                s3_key = os.path.relpath(file_path, s3docs_path)
+                s3.upload_file(file_path, bucket, s3_key)
+
+
+def timed(fn, *args):
+    """Returns (result, seconds, peak traced MiB)."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn(*args)
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / (1024 * 1024)
+    tracemalloc.stop()
+    return result, seconds, peak
+
+
+def bucket_digests(s3, bucket, manifest_key):
+    digests = {}
+    for page in s3.get_paginator("list_objects_v2").paginate(Bucket=bucket):
+        for item in page.get("Contents", ()):
+            if item["Key"] != manifest_key:
+                body = s3.get_object(Bucket=bucket, Key=item["Key"])["Body"].read()
+                digests[item["Key"]] = hashlib.md5(body).hexdigest()
+    return digests
+
+
+def inline_loader_source(path=TEMPLATE):
+    """The ZipFile code of GitHubToS3Lambda, read without a YAML parser."""
+    lines = open(path).read().splitlines()
+    start = next(i for i, line in enumerate(lines) if line.strip() == "ZipFile: |")
+    indent = len(lines[start + 1]) - len(lines[start + 1].lstrip())
+    body = []
+    for line in lines[start + 1:]:
+        if line.strip() and len(line) - len(line.lstrip()) < indent:
+            break
+        body.append(line[indent:])
+    return "\n".join(body).rstrip("\n") + "\n"
+
+
+def start_fake_s3(args, files_dir):
+    """Runs fake_s3.py in a subprocess, so its buffers do not count as loader memory. Returns (process, endpoint)."""
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(HERE, "fake_s3.py"), "--port", "0", "--latency", str(args.latency),
+         "--throughput", str(args.throughput), "--files-dir", files_dir],
+        stdout=subprocess.PIPE, text=True
+    )
+    return process, process.stdout.readline().split()[-1]
+
+
+def fake_requests(endpoint):
+    with urllib.request.urlopen(f"{endpoint}/_stats") as response:
+        return json.loads(response.read())["requests"]
+
+
+def check(name, condition, failures):
+    print(f"  {'ok  ' if condition else 'FAIL'} {name}")
+    if not condition:
+        failures.append(name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--files", type=int, default=300)
+    parser.add_argument("--size-kb", type=int, default=250, help="size of each document (FOMC minutes are ~200-400 KB)")
+    parser.add_argument("--large", type=int, default=2)
+    parser.add_argument("--large-mb", type=int, default=24)
+    parser.add_argument("--other-mb", type=float, default=20, help="repository files outside S3docs/")
+    parser.add_argument("--changed", type=int, default=10)
+    parser.add_argument("--workers", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--throughput", type=float, default=100e6)
+    parser.add_argument("--endpoint-url", default=None, help="real S3-compatible endpoint instead of the fake")
+    parser.add_argument("--skip-previous", action="store_true")
+    args = parser.parse_args()
+
+    failures = []
+    check("cfn/1 inline code is DataLoadLambda.py",
+          inline_loader_source() == open(os.path.join(ROOT, "DataLoadLambda.py")).read(), failures)
+
+    documents = make_documents(args)
+    changed = dict(documents)
+    rng = random.Random(99)
+    for name in sorted(documents)[:args.changed]:
+        changed[name] = document(rng, len(documents[name]))
+    expected = {name: hashlib.md5(data).hexdigest() for name, data in documents.items()}
+    expected_changed = {name: hashlib.md5(data).hexdigest() for name, data in changed.items()}
+
+    with tempfile.TemporaryDirectory() as directory:
+        paths = {"original": os.path.join(directory, "main.zip"), "changed": os.path.join(directory, "changed.zip")}
+        write_archive(paths["original"], documents, args.other_mb)
+        write_archive(paths["changed"], changed, args.other_mb)
+        fake = None
+        if args.endpoint_url:
+            endpoint = args.endpoint_url
+            urls = {name: "file://" + path for name, path in paths.items()}
+        else:
+            fake, endpoint = start_fake_s3(args, directory)
+            urls = {name: f"{endpoint}/files/{os.path.basename(path)}" for name, path in paths.items()}
+        config = DataLoadLambda.LoaderConfig(
+            bucket="kb-ingest", source_prefix=SOURCE_PREFIX, workers=args.workers, endpoint_url=endpoint
+        )
+        s3 = DataLoadLambda.s3_client(config)
+        legacy_s3 = boto3.client("s3", endpoint_url=endpoint, config=Config(s3={"addressing_style": "path"}))
+        total_mb = sum(len(data) for data in documents.values()) / (1024 * 1024)
+        print(f"{len(documents)} documents, {total_mb:.0f} MiB, archive {os.path.getsize(paths['original']) / (1024 * 1024):.0f} MiB")
+
+        for bucket in ("kb-previous", config.bucket):
+            s3.create_bucket(Bucket=bucket)
+
+        rows = []
+
+        def requests():
+            return fake_requests(endpoint) if fake else 0
+
+        if not args.skip_previous:
+            before = requests()
+            _, seconds, peak = timed(legacy_load, urls["original"], "kb-previous", legacy_s3)
+            rows.append(("previous (serial)", seconds, len(documents), 0, requests() - before, peak))
+            check("previous: bucket matches source",
+                  bucket_digests(s3, "kb-previous", config.manifest_key) == expected, failures)
+
+        runs = [
+            ("ingest", config._replace(source_url=urls["original"]), expected, len(documents)),
+            ("rerun", config._replace(source_url=urls["original"]), expected, 0),
+            ("changed", config._replace(source_url=urls["changed"]), expected_changed, args.changed),
+            ("no manifest", config._replace(source_url=urls["changed"]), expected_changed, 0),
+        ]
+        for name, run_config, run_expected, expected_uploads in runs:
+            if name == "no manifest":
+                s3.delete_object(Bucket=config.bucket, Key=config.manifest_key)
+            before = requests()
+            stats, seconds, peak = timed(DataLoadLambda.ingest, run_config, s3)
+            rows.append((name, seconds, stats.uploaded, stats.skipped, requests() - before, peak))
+            check(f"{name}: bucket matches source",
+                  bucket_digests(s3, config.bucket, config.manifest_key) == run_expected, failures)
+            check(f"{name}: {expected_uploads} uploads", stats.uploaded == expected_uploads, failures)
+
+        if fake:
+            fake.terminate()
+            fake.wait()
+
+    print(f"\n{'run':<20} {'seconds':>8} {'uploaded':>9} {'skipped':>8} {'requests':>9} {'peak MiB':>9}")
+    for name, seconds, uploaded, skipped, request_count, peak in rows:
+        print(f"{name:<20} {seconds:>8.2f} {uploaded:>9} {skipped:>8} {request_count or '-':>9} {peak:>9.1f}")
+    print("OK" if not failures else "FAILED")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
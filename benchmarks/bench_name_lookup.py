@@ -0,0 +1,106 @@
+"""
+Benchmark for the company name lookup index in ActionLambda.py.
+
+Builds a CompanyNameIndex over synthetic company names ("TechStashNova
+Inc." style) and times exact, normalized, prefix, typo and miss queries.
+Alongside latency it reports how many names each fuzzy query pulled from
+the trigram posting lists ("read"), to show the index reads a small
+candidate set instead of falling back to a full scan as the table grows.
+
+With --max-p99-us it exits non-zero if the p99 latency of normalized or
+typo queries is above that at any size.
+
+Usage:
+    python benchmarks/bench_name_lookup.py
+    python benchmarks/bench_name_lookup.py --rows 1000 100000 500000 --queries 2000
+    python benchmarks/bench_name_lookup.py --rows 100000 --max-p99-us 1000
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ActionLambda  # noqa: E402
+
+WORDS = [
+    "Tech", "Stash", "Nova", "Quantum", "Pirate", "Leap", "Cyber", "Cipher", "Secure", "Digital", "Dream",
+    "Robo", "Future", "Net", "Creative", "Eco", "Wealth", "Health", "Luxury", "Living", "Urban", "Sky", "Green",
+    "Space", "Modern", "Home", "City", "Coastal", "Global", "Regional", "Next", "Gen", "Prime", "Summit", "Atlas",
+]
+SUFFIXES = ["Inc.", "Corp", "Ltd.", "Group", "Holdings", "Technologies", "Systems", "Solutions", "Partners", "Labs"]
+CONSONANTS = "bcdfghjklmnprstvwz"
+VOWELS = "aeiou"
+
+
+def syllable(rng):
+    return rng.choice(CONSONANTS).upper() + rng.choice(VOWELS) + rng.choice(CONSONANTS) + rng.choice(VOWELS)
+
+
+def make_names(count, rng):
+    """Invented words plus common business words, e.g. 'KaroTech Vesu Holdings'."""
+    names = set()
+    while len(names) < count:
+        parts = [syllable(rng) + rng.choice(WORDS), syllable(rng)]
+        names.add(" ".join(parts) + " " + rng.choice(SUFFIXES))
+    return sorted(names)
+
+
+def typo(name, rng):
+    position = rng.randrange(1, len(name) - 1)
+    return name[:position] + name[position + 1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000, 10_000, 100_000, 300_000])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--max-p99-us", type=float, help="Fail if normalized or typo p99 is above this")
+    args = parser.parse_args()
+
+    slow = []
+
+    print(f"{'rows':>8} {'build s':>8} {'kind':>10} {'mean us':>9} {'p99 us':>9} {'read':>8} {'top-1 hit':>10}")
+    for count in args.rows:
+        rng = random.Random(7)
+        names = make_names(count, rng)
+        start = time.perf_counter()
+        index = ActionLambda.CompanyNameIndex(names)
+        build_s = time.perf_counter() - start
+
+        targets = [rng.randrange(count) for _ in range(args.queries)]
+        kinds = {
+            "exact": [names[t] for t in targets],
+            "normalized": [names[t].rsplit(" ", 1)[0].lower() for t in targets],
+            "prefix": [names[t][:max(6, len(names[t]) // 2)] for t in targets],
+            "typo": [typo(names[t].rsplit(" ", 1)[0], rng) for t in targets],
+            "miss": ["Zyxwvut Qqq " + str(t) for t in targets],
+        }
+        for kind, queries in kinds.items():
+            samples = []
+            scored = 0
+            hits = 0
+            for target, query in zip(targets, queries):
+                key = ActionLambda.normalize_company_name(query)
+                scored += len(index._candidate_ids(ActionLambda.name_trigrams(key), 10**9, *index._length_window(key)))
+                start = time.perf_counter()
+                matches = index.search(query)
+                samples.append((time.perf_counter() - start) * 1e6)
+                if matches and matches[0].row_id == target:
+                    hits += 1
+            samples.sort()
+            mean = sum(samples) / len(samples)
+            p99 = samples[int(len(samples) * 0.99) - 1]
+            print(f"{count:>8} {build_s:8.2f} {kind:>10} {mean:9.1f} {p99:9.1f} {scored / len(queries):8.1f} {hits / len(queries):10.1%}")
+            if args.max_p99_us is not None and kind in ("normalized", "typo") and p99 > args.max_p99_us:
+                slow.append(f"{kind} at {count} rows: p99 {p99:.0f} us")
+
+    if slow:
+        print("FAILED: " + "; ".join(slow))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+"""
+Benchmark for the createPortfolio query engine in ActionLambda.py.
+
+Compares the engine (NumPy columns, cached derived columns, partial sort
+for top-k) with the previous approach of filtering the list of dicts and
+sorting all of it on every call, for several query shapes and row counts.
+The engine is timed warm: the one-off column materialization on the first
+query is reported separately.
+
+First checks that the API schema the agent gets from
+cfn/2-bedrock-agent-lambda-template.yaml is ActionSchema.json, asks only for
+actions the handler has, and describes the createPortfolio table envelope
+the handler returns, that the parameter
+specs embedded in ActionLambda.py (used without ActionSchema.json) match
+it, and that each createPortfolio parameter it advertises works through
+lambda_handler with those embedded specs, and that the NumPy engine and
+its pure Python fallback rank rows with missing margin/profitPerEmployee
+(zero revenue or employees) the same way. Exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/bench_portfolio_query.py
+    python benchmarks/bench_portfolio_query.py --rows 100000 1000000 --calls 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import ActionLambda  # noqa: E402
+from bench_company_store import make_rows  # noqa: E402
+
+TEMPLATE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'cfn', '2-bedrock-agent-lambda-template.yaml')
+
+QUERIES = {
+    "profit top 10": dict(industry="technology", numCompanies=10),
+    "margin top 10": dict(industry="technology", numCompanies=10, sortBy="margin"),
+    "weighted+filter": dict(industry=None, numCompanies=25, sortBy="revenue:0.7,profitPerEmployee:0.3", filters="employees>=100,margin>0.2"),
+    "page 5 by revenue": dict(industry="real estate", numCompanies=20, sortBy="revenue", offset=80),
+}
+
+# Queries whose sort fields are missing on some rows, for the NumPy / Python comparison
+MISSING_VALUE_QUERIES = [
+    dict(numCompanies=40, sortBy="revenue:0.7,profitPerEmployee:0.3"),
+    dict(numCompanies=40, sortBy="margin:1,profit:1", order="asc"),
+    dict(numCompanies=40, sortBy="margin", order="asc", offset=150),
+    dict(industry="technology", numCompanies=20, sortBy="profitPerEmployee:-1,revenue:0.5", filters="profit>100000"),
+]
+
+
+def field_value(company, field):
+    if field == "margin":
+        return company["profit"] / company["revenue"] if company["revenue"] else float("-inf")
+    if field == "profitPerEmployee":
+        return company["profit"] / company["employees"] if company["employees"] else float("-inf")
+    return company[field]
+
+
+def legacy_query(rows, spec):
+    """Filter the dicts, score, sort everything, slice - the old createPortfolio shape."""
+    industry = spec.get("industry")
+    filtered = [c for c in rows if industry is None or c["industrySector"].lower() == industry]
+    for field, operator, value in ActionLambda.parse_filter_spec(spec.get("filters")):
+        test = ActionLambda._FILTER_OPERATORS[operator]
+        filtered = [c for c in filtered if test(field_value(c, field), value)]
+    sort_keys = ActionLambda.parse_sort_spec(spec.get("sortBy"))
+    if len(sort_keys) == 1:
+        key = lambda c: field_value(c, sort_keys[0][0])  # noqa: E731
+    else:
+        ranges = {}
+        for field, _ in sort_keys:
+            values = [field_value(c, field) for c in filtered]
+            ranges[field] = (min(values), max(values)) if values else (0, 0)
+        key = lambda c: sum(  # noqa: E731
+            weight * (field_value(c, field) - ranges[field][0]) / ((ranges[field][1] - ranges[field][0]) or 1)
+            for field, weight in sort_keys
+        )
+    ranked = sorted(filtered, key=key, reverse=True)
+    offset = spec.get("offset", 0)
+    return ranked[offset:offset + spec["numCompanies"]]
+
+
+def template_schema(path=TEMPLATE):
+    """The ApiSchema payload of the agent in cfn/2, read without a YAML parser."""
+    lines = open(path).read().splitlines()
+    start = next(i for i, line in enumerate(lines) if line.strip() == "Payload: |")
+    indent = len(lines[start + 1]) - len(lines[start + 1].lstrip())
+    body = []
+    for line in lines[start + 1:]:
+        if line.strip() and len(line) - len(line.lstrip()) < indent:
+            break
+        body.append(line[indent:])
+    return json.loads("\n".join(body))
+
+
+def portfolio_event(**parameters):
+    return {
+        "actionGroup": "PortfolioCreator-actions",
+        "apiPath": "/createPortfolio",
+        "httpMethod": "POST",
+        "parameters": [{"name": name, "type": "string", "value": value} for name, value in parameters.items()],
+    }
+
+
+def check_deployed_schema():
+    """Returns the names of the failed schema/handler checks."""
+    failures = []
+
+    def check(name, condition):
+        print(f"  {'ok  ' if condition else 'FAIL'} {name}")
+        if not condition:
+            failures.append(name)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False) as f:
+        json.dump(template_schema(), f)
+    try:
+        deployed = ActionLambda.load_parameter_specs(f.name)
+    finally:
+        os.unlink(f.name)
+    check("cfn/2 schema asks for the same parameters as ActionSchema.json",
+          deployed == ActionLambda.load_parameter_specs())
+    check("cfn/2 schema is ActionSchema.json", template_schema() == json.load(open(ActionLambda.ACTION_SCHEMA_PATH)))
+    check("cfn/2 schema routes are the handler's routes", set(deployed) == set(ActionLambda.ACTION_ROUTES))
+    embedded = ActionLambda.load_parameter_specs(os.path.join(tempfile.gettempdir(), "no-ActionSchema.json"))
+    check("embedded parameter specs match ActionSchema.json",
+          embedded == ActionLambda.EMBEDDED_PARAMETER_SPECS == ActionLambda.load_parameter_specs())
+
+    advertised = {spec.name for spec in deployed[("/createPortfolio", "POST")]}
+    events = {
+        "industry left out": portfolio_event(numCompanies="3"),
+        "sortBy margin": portfolio_event(numCompanies="5", industry="Technology", sortBy="margin"),
+        "order asc, offset": portfolio_event(numCompanies="2", sortBy="profit", order="asc", offset="1"),
+        "filters": portfolio_event(numCompanies="5", filters="revenue>=100000"),
+    }
+    ActionLambda.init()
+    specs, ActionLambda.PARAMETER_SPECS = ActionLambda.PARAMETER_SPECS, embedded
+    try:
+        responses = {name: ActionLambda.lambda_handler(event, None)["response"] for name, event in events.items()}
+    finally:
+        ActionLambda.PARAMETER_SPECS = specs
+    check("every advertised createPortfolio parameter is exercised",
+          advertised == {"numCompanies", "industry", "sortBy", "order", "filters", "offset"})
+    tables = {}
+    for name, response in responses.items():
+        body = response["responseBody"]["application/json"]["body"]
+        ok = response["httpStatusCode"] == 200 and isinstance(body, str)
+        if ok:
+            tables[name] = json.loads(body)
+            ok = tables[name].get("contentType") == ActionLambda.TABLE_CONTENT_TYPE
+        check(f"createPortfolio, {name}: table result", ok)
+    schema = template_schema()
+    response_schema = schema["paths"]["/createPortfolio"]["post"]["responses"]["200"]["content"]["application/json"]
+    table_schema = schema["components"]["schemas"][response_schema["schema"]["$ref"].rsplit("/", 1)[-1]]
+    table = tables.get("sortBy margin", {})
+    check("createPortfolio response schema describes the table envelope",
+          set(table_schema["required"]) <= set(table) <= set(table_schema["properties"])
+          and table_schema["properties"]["contentType"]["enum"] == [ActionLambda.TABLE_CONTENT_TYPE]
+          and [(column["name"], column["type"]) for column in table.get("schema", [])]
+          == [(name, prop["items"]["type"]) for name, prop in table_schema["properties"]["columns"]["properties"].items()])
+    columns = tables.get("sortBy margin", {}).get("columns", {})
+    margins = [profit / revenue for profit, revenue in zip(columns.get("profit", []), columns.get("revenue", []))]
+    check("sortBy margin ranks by margin", len(margins) == 5 and margins == sorted(margins, reverse=True))
+    columns = tables.get("order asc, offset", {}).get("columns", {})
+    check("order asc with offset skips the lowest profit", columns.get("profit") == [16000, 25000])
+    columns = tables.get("filters", {}).get("columns", {})
+    check("filters apply", bool(columns.get("revenue")) and min(columns["revenue"]) >= 100000)
+
+    rows = make_rows(200)
+    for row in rows[::7]:
+        row["revenue"] = 0
+    for row in rows[::5]:
+        row["employees"] = 0
+    engine = ActionLambda.CompanyQueryEngine(ActionLambda.CompanyStore(rows))
+    for spec in MISSING_VALUE_QUERIES:
+        query = ActionLambda.build_portfolio_query(
+            spec.get("industry"), spec["numCompanies"], spec.get("sortBy"), spec.get("order"), spec.get("filters"), spec.get("offset", 0)
+        )
+        check(f"NumPy and Python rank alike with missing values: {spec['sortBy']} {spec.get('order', 'desc')}",
+              engine.run(query) == engine._run_python(query))
+    return failures
+
+
+def per_call_ms(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--calls", type=int, default=20)
+    args = parser.parse_args()
+    print("checks")
+    failures = check_deployed_schema()
+    if failures:
+        print("FAILED")
+        sys.exit(1)
+    if ActionLambda.load_numpy() is None:
+        print("NumPy is not installed; the engine runs its pure Python fallback")
+
+    print(f"{'rows':>9} {'query':>18} {'first ms':>9} {'engine ms':>10} {'legacy ms':>10} {'speedup':>8}")
+    for count in args.rows:
+        rows = make_rows(count)
+        store = ActionLambda.CompanyStore(rows)
+        for label, spec in QUERIES.items():
+            query = ActionLambda.build_portfolio_query(
+                spec.get("industry"), spec["numCompanies"], spec.get("sortBy"), None, spec.get("filters"), spec.get("offset", 0)
+            )
+            start = time.perf_counter()
+            store.query(query)
+            first_ms = (time.perf_counter() - start) * 1000
+
+            engine_ms = per_call_ms(lambda: store.query(query), args.calls)
+            legacy_calls = max(1, args.calls // 5) if count >= 1_000_000 else args.calls
+            legacy_ms = per_call_ms(lambda: legacy_query(rows, spec), legacy_calls)
+            print(f"{count:>9} {label:>18} {first_ms:9.2f} {engine_ms:10.3f} {legacy_ms:10.2f} {legacy_ms / engine_ms:7.0f}x")
+
+
+if __name__ == "__main__":
+    main()
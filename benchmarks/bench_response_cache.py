@@ -0,0 +1,173 @@
+"""
+Benchmark for the agent response cache in streamlit_app/response_cache.py.
+
+Replays a workload where a share of the questions repeat (the sample prompts
+from the app, with varied case/whitespace/punctuation) against a stand-in
+agent that sleeps for --agent-latency seconds, once per backend. Reports the
+hit rate, the mean time per question with the cache, and the lookup cost of
+hits and misses on their own, including with the cache full and evicting.
+Each question opens its own session, with answers shared across sessions.
+
+Also checks that the cache is off unless configured, that a follow-up only
+hits after the same earlier turns, that a hit does not count as a turn the
+agent saw, and that turns which called a side-effecting action are not
+stored while read-only action turns are. Exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/bench_response_cache.py
+    python benchmarks/bench_response_cache.py --questions 2000 --repeat-share 0.8 --agent-latency 0.01
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit_app'))
+
+from response_cache import MemoryCache, ResponseCache, SQLiteCache, response_cache_from_env  # noqa: E402
+
+SAMPLE_PROMPTS = [
+    "Give me a summary of financial market developments and open market operations in January 2023",
+    "Tell me the participants view on economic conditions and economic outlook",
+    "Provide any important information I should know about consumer inflation, or rising prices",
+    "Create a portfolio with 3 companies in the real estate industry",
+    "Create a portfolio of 4 companies that are in the technology industry",
+    "Return me information on the company on TechStashNova Inc.",
+]
+
+
+def variant(prompt, rng):
+    """Same question as a user might retype it."""
+    text = prompt.lower() if rng.random() < 0.3 else prompt
+    if rng.random() < 0.3:
+        text = "  " + text.replace(" ", "  ", 1)
+    return text + rng.choice(["", "?", ".", " "])
+
+
+def make_workload(count, repeat_share, rng):
+    questions = []
+    for i in range(count):
+        if rng.random() < repeat_share:
+            questions.append(variant(rng.choice(SAMPLE_PROMPTS), rng))
+        else:
+            questions.append(f"One-off question number {i} about company {rng.randrange(10**6)}")
+    return questions
+
+
+def fake_answer(question, answer_bytes, trace_events):
+    answer = ("Answer to " + question + " ") * (answer_bytes // (len(question) + 11) + 1)
+    traces = [{"trace": {"orchestrationTrace": {"rationale": {"text": "step %d" % i}}}} for i in range(trace_events)]
+    return answer[:answer_bytes], traces
+
+
+def run_workload(cache, questions, args):
+    start = time.perf_counter()
+    for index, question in enumerate(questions):
+        session_id = f"SESSION-{index}"
+        cached = cache.get(question, "AGENT", "ALIAS", session_id)
+        if cached is None:
+            time.sleep(args.agent_latency)
+            answer, traces = fake_answer(question, args.answer_bytes, args.trace_events)
+            cache.put(question, "AGENT", "ALIAS", session_id, answer, [["trace", trace] for trace in traces])
+    return time.perf_counter() - start
+
+
+def time_lookups(cache, questions):
+    start = time.perf_counter()
+    for index, question in enumerate(questions):
+        cache.get(question, "AGENT", "ALIAS", f"LOOKUP-{index}")
+    return (time.perf_counter() - start) / len(questions)
+
+
+def check_semantics():
+    """Returns the names of the failed correctness checks."""
+    failures = []
+
+    def check(name, condition):
+        print(f"  {'ok  ' if condition else 'FAIL'} {name}")
+        if not condition:
+            failures.append(name)
+
+    saved = os.environ.pop("AGENT_CACHE_BACKEND", None)
+    check("cache is off unless AGENT_CACHE_BACKEND is set", response_cache_from_env() is None)
+    if saved is not None:
+        os.environ["AGENT_CACHE_BACKEND"] = saved
+
+    cache = ResponseCache(MemoryCache())
+    cache.put(SAMPLE_PROMPTS[4], "AGENT", "ALIAS", "A", "Here are 4 technology companies.", [])
+    cache.put("yes", "AGENT", "ALIAS", "A", "Portfolio emailed.", [])
+    cache.put(SAMPLE_PROMPTS[5], "AGENT", "ALIAS", "A", "TechStashNova Inc. ...", [])
+    check("follow-up after different turns is not answered from the cache",
+          cache.get("yes", "AGENT", "ALIAS", "A") is None)
+
+    shared = ResponseCache(MemoryCache(), session_independent=True)
+    for session_id in ("B", "C"):
+        if shared.get(SAMPLE_PROMPTS[4], "AGENT", "ALIAS", session_id) is None:
+            shared.put(SAMPLE_PROMPTS[4], "AGENT", "ALIAS", session_id, "Here are 4 technology companies.", [])
+    check("the same conversation in another session is answered from the cache",
+          shared.stats.hits == 1 and shared.get("why?", "AGENT", "ALIAS", "C") is None)
+    check("a cache hit does not advance the session's context", shared.context("C") == "")
+
+    def action(api_path):
+        return ["trace", {"trace": {"orchestrationTrace": {"invocationInput": {
+            "actionGroupInvocationInput": {"actionGroupName": "PortfolioCreator-actions", "apiPath": api_path}
+        }}}}]
+
+    shared.put("Send the portfolio to me@example.com", "AGENT", "ALIAS", "D", "Email sent.", [action("/sendEmail")])
+    shared.put("Email it to me", "AGENT", "ALIAS", "E", "Sent.",
+               [["returnControl", [{"apiInvocationInput": {"apiPath": "/sendEmail"}}]]])
+    check("turns that called a side-effecting action are not stored",
+          shared.get("Send the portfolio to me@example.com", "AGENT", "ALIAS", "F") is None
+          and shared.get("Email it to me", "AGENT", "ALIAS", "G") is None)
+    shared.put("Research Acme", "AGENT", "ALIAS", "H", "Acme makes anvils.", [action("/companyResearch")])
+    shared.put(SAMPLE_PROMPTS[4], "AGENT", "ALIAS", "I", "Here are 4 companies.",
+               [["returnControl", [{"apiInvocationInput": {"apiPath": "/createPortfolio"}}]]])
+    check("turns that only ran read-only actions are stored",
+          shared.get("Research Acme", "AGENT", "ALIAS", "J") is not None
+          and shared.get(SAMPLE_PROMPTS[4], "AGENT", "ALIAS", "K") is not None)
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--questions", type=int, default=1000)
+    parser.add_argument("--repeat-share", type=float, default=0.7)
+    parser.add_argument("--agent-latency", type=float, default=0.005, help="Seconds per uncached agent call")
+    parser.add_argument("--answer-bytes", type=int, default=4096)
+    parser.add_argument("--trace-events", type=int, default=10)
+    parser.add_argument("--max-bytes", type=int, default=1024 * 1024, help="Cache size limit (forces eviction)")
+    args = parser.parse_args()
+
+    rng = random.Random(7)
+    questions = make_workload(args.questions, args.repeat_share, rng)
+    uncached = args.questions * args.agent_latency
+    print(f"{args.questions} questions, {args.repeat_share:.0%} repeats, "
+          f"{args.agent_latency * 1000:.1f} ms per agent call ({uncached:.2f} s without a cache)")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = {
+            "memory": MemoryCache(max_bytes=args.max_bytes),
+            "sqlite": SQLiteCache(os.path.join(tmp, "cache.sqlite3"), max_bytes=args.max_bytes),
+        }
+        print(f"{'backend':>8} {'total s':>8} {'hit rate':>9} {'evictions':>10} {'size KiB':>9} "
+              f"{'hit us':>8} {'miss us':>8}")
+        for name, backend in backends.items():
+            cache = ResponseCache(backend, session_independent=True)
+            elapsed = run_workload(cache, questions, args)
+            stats = cache.stats.as_dict()
+            hit_cost = time_lookups(cache, SAMPLE_PROMPTS * 50)
+            miss_cost = time_lookups(cache, [f"never asked {i}" for i in range(300)])
+            print(f"{name:>8} {elapsed:>8.2f} {stats['hit_rate']:>9.1%} {stats['evictions']:>10} "
+                  f"{backend.size_bytes / 1024:>9.0f} {hit_cost * 1e6:>8.1f} {miss_cost * 1e6:>8.1f}")
+        backends["sqlite"].close()
+
+    print("\nchecks")
+    failures = check_semantics()
+    print("OK" if not failures else "FAILED")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+End-to-end turn latency: action group Lambda vs return of control.
+
+Runs the same questions against two fake agent runtimes:
+
+  * lambda: the agent calls the action group Lambda for each action, one
+    after another. Each call costs --lambda-delay (the invoke; use a large
+    value to model cold starts) plus --action-time.
+  * return control: the agent hands all actions of the step back in one
+    returnControl event. invoke_agent runs them in-process with
+    ActionLambda.lambda_handler, in parallel, each taking --action-time,
+    and continues the turn with a second request.
+
+Questions ask for 1 and --actions actions (";"-separated parts). Every turn
+is checked for a complete answer and the expected number of action
+results. Reports the median and p95 turn time over --turns turns.
+
+Usage:
+    python benchmarks/bench_return_control.py
+    python benchmarks/bench_return_control.py --lambda-delay 0.03 0.8 --action-time 0.05 --actions 4
+"""
+import os
+import sys
+import time
+import argparse
+import contextlib
+import statistics
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..'))
+sys.path.insert(0, os.path.join(HERE, '..', 'streamlit_app'))
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIDBENCHMARK")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark-secret")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ["AGENT_CACHE_BACKEND"] = "off"
+
+import ActionLambda  # noqa: E402
+import invoke_agent  # noqa: E402
+import return_control  # noqa: E402
+from action_results import action_results_from_events  # noqa: E402
+from fake_agent_runtime import FakeAgentRuntime, RuntimeConfig  # noqa: E402
+
+ACTION_QUESTIONS = [
+    "Create a portfolio of 3 companies in the technology industry",
+    "Create a portfolio of 3 companies in the real estate industry",
+    "Return me information on the company on TechStashNova Inc.",
+    "Create a portfolio of 5 companies in the technology industry",
+]
+
+
+def question_with(actions):
+    return "; ".join(ACTION_QUESTIONS[i % len(ACTION_QUESTIONS)] for i in range(actions))
+
+
+def run_turns(runtime, question, actions, turns):
+    invoke_agent.agentRuntimeEndpoint = runtime.endpoint
+    times = []
+    for turn in range(turns):
+        session_id = f"bench-{actions}-{turn}"
+        start = time.perf_counter()
+        collector, answer = invoke_agent.askQuestion(question, invoke_agent.agent_url(session_id))
+        times.append(time.perf_counter() - start)
+        results = action_results_from_events(collector.events())
+        if not answer or len(results) != actions:
+            raise RuntimeError(f"Turn {turn}: {len(results)} action results for {actions} actions")
+    return times
+
+
+def describe(times):
+    times = sorted(times)
+    p95 = times[min(len(times) - 1, int(len(times) * 0.95))]
+    return statistics.median(times) * 1000, p95 * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lambda-delay", type=float, nargs="+", default=[0.03, 0.5])
+    parser.add_argument("--action-time", type=float, default=0.02)
+    parser.add_argument("--actions", type=int, default=3)
+    parser.add_argument("--turns", type=int, default=10)
+    parser.add_argument("--step-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    handler = ActionLambda.lambda_handler
+
+    def slow_handler(event, context):
+        time.sleep(args.action_time)
+        return handler(event, context)
+
+    return_control.configure_action_handler(slow_handler)
+    base = RuntimeConfig(first_byte_delay=args.step_delay, step_delay=args.step_delay, chunk_delay=0.002, trace_events=1)
+
+    print(f"{'mode':<16} {'lambda delay s':>14} {'actions':>8} {'median ms':>10} {'p95 ms':>8} {'requests':>9}")
+    # ActionLambda and the fake runtime log every call to stdout
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        for actions in sorted({1, args.actions}):
+            question = question_with(actions)
+            with FakeAgentRuntime(base._replace(return_control=True)) as runtime:
+                median, p95 = describe(run_turns(runtime, question, actions, args.turns))
+                row = f"{'return control':<16} {'-':>14} {actions:>8} {median:>10.1f} {p95:>8.1f} {runtime.requests:>9}"
+            print(row, file=sys.__stdout__)
+            for delay in args.lambda_delay:
+                with FakeAgentRuntime(base._replace(lambda_delay=delay + args.action_time)) as runtime:
+                    median, p95 = describe(run_turns(runtime, question, actions, args.turns))
+                    row = f"{'lambda':<16} {delay:>14.2f} {actions:>8} {median:>10.1f} {p95:>8.1f} {runtime.requests:>9}"
+                print(row, file=sys.__stdout__)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Many-users check for streamlit_app/session_manager.py against the fake runtime.
+
+Simulates --users browser sessions, each in its own thread with its own agent
+session from a SessionManager, asking --turns questions through
+invoke_agent.askQuestion_stream while holding a manager slot, as app.py does.
+Afterwards it checks that:
+
+  * the fake runtime saw exactly --turns turns for every session (no
+    conversation was shared or lost),
+  * no more than --max-in-flight calls ever ran at once,
+  * an on_wait callback that raises (as a Streamlit rerun does) gives up
+    its place in the queue instead of leaking the session's slot,
+  * a session touched on each rerun (as app.py does) outlives the idle
+    timeout, while an untouched one is swept and touch() reports it gone,
+  * ending all sessions through the background batches ends them on the
+    runtime side too.
+
+It reports throughput and how long users waited for a slot. Exits non-zero if
+a check fails.
+
+Usage:
+    python benchmarks/bench_session_manager.py --users 200 --turns 3 --max-in-flight 32
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.join(HERE, '..', 'streamlit_app'))
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIDBENCHMARK")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark-secret")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+os.environ["AGENT_CACHE_BACKEND"] = "off"
+
+from fake_agent_runtime import FakeAgentRuntime, RuntimeConfig  # noqa: E402
+
+QUESTION = "Tell me the participants view on economic conditions and economic outlook"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=3)
+    parser.add_argument("--max-in-flight", type=int, default=32)
+    parser.add_argument("--step-delay", type=float, default=0.01)
+    args = parser.parse_args()
+
+    runtime = FakeAgentRuntime(RuntimeConfig(first_byte_delay=0.02, step_delay=args.step_delay, chunk_delay=0.002))
+    os.environ["AGENT_RUNTIME_ENDPOINT"] = runtime.start()
+
+    import invoke_agent
+    from session_manager import SessionManager
+
+    invoke_agent.configure_client(pool_maxsize=args.max_in_flight)
+    manager = SessionManager(
+        invoke_agent.end_session,
+        max_in_flight=args.max_in_flight,
+        max_queue=args.users,
+        queue_timeout=300
+    )
+
+    peak = [0]
+    running = [0]
+    waits = []
+    errors = []
+    lock = threading.Lock()
+
+    def user():
+        session_id = manager.new_session()
+        for _ in range(args.turns):
+            queued = time.monotonic()
+            try:
+                with manager.slot(session_id):
+                    with lock:
+                        waits.append(time.monotonic() - queued)
+                        running[0] += 1
+                        peak[0] = max(peak[0], running[0])
+                    try:
+                        for _ in invoke_agent.askQuestion_stream(QUESTION, invoke_agent.agent_url(session_id)):
+                            pass
+                    finally:
+                        with lock:
+                            running[0] -= 1
+            except Exception as e:
+                with lock:
+                    errors.append(repr(e))
+        return session_id
+
+    threads = [threading.Thread(target=user) for _ in range(args.users)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    turns = dict(runtime.sessions)
+    waits.sort()
+    print(f"{args.users} users x {args.turns} turns in {elapsed:.2f} s "
+          f"({args.users * args.turns / elapsed:.1f} turns/s), peak in flight {peak[0]}/{args.max_in_flight}")
+    print(f"slot wait p50 {waits[len(waits) // 2] * 1000:.0f} ms, max {waits[-1] * 1000:.0f} ms, errors {len(errors)}")
+
+    ok = True
+    if errors:
+        print("errors:", errors[:5])
+        ok = False
+    wrong = {sid: count for sid, count in turns.items() if count != args.turns}
+    if len(turns) != args.users or wrong:
+        print(f"session isolation: {len(turns)} sessions seen, {len(wrong)} with the wrong number of turns")
+        ok = False
+    if peak[0] > args.max_in_flight:
+        print("in-flight cap exceeded")
+        ok = False
+
+    def interrupted(position):
+        raise KeyboardInterrupt("rerun")
+
+    held = [manager.new_session() for _ in range(args.max_in_flight)]
+    for session_id in held:
+        manager.acquire(session_id)
+    queued = manager.new_session()
+    try:
+        manager.acquire(queued, on_wait=interrupted)
+    except KeyboardInterrupt:
+        pass
+    for session_id in held:
+        manager.release(session_id)
+    try:
+        manager.acquire(queued, timeout=1)
+        manager.release(queued)
+    except Exception as e:
+        print(f"slot leaked by a raising on_wait: {e!r}")
+        ok = False
+    if manager.stats()["in_flight"] or manager.stats()["waiting"]:
+        print(f"slots left after a raising on_wait: {manager.stats()}")
+        ok = False
+
+    swept = []
+    idle_manager = SessionManager(swept.append, idle_timeout=0.2)
+    kept, dropped = idle_manager.new_session(), idle_manager.new_session()
+    for _ in range(3):
+        time.sleep(0.1)
+        idle_manager.touch(kept)
+    idle_manager._queue_idle_sessions()
+    queued_to_end = list(idle_manager._to_end)
+    if queued_to_end != [dropped] or not idle_manager.touch(kept) or idle_manager.touch(dropped):
+        print(f"idle sweep: queued {queued_to_end}, expected only the untouched session")
+        ok = False
+    idle_manager.close(end_sessions=False)
+
+    start = time.perf_counter()
+    manager.close(end_sessions=True)
+    print(f"ended {manager.ended} sessions in batches in {time.perf_counter() - start:.2f} s, "
+          f"{len(runtime.sessions)} left on the runtime, {manager.end_errors} end errors")
+    if runtime.sessions or manager.end_errors:
+        ok = False
+
+    runtime.stop()
+    print("OK" if ok else "FAILED")
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Micro-benchmark for the pooled SigV4Client in streamlit_app/sigv4_client.py.
+
+Starts a local keep-alive HTTP (or HTTPS, with --certfile/--keyfile) stub
+that answers like the agent runtime, then compares:
+
+    cold: the old path - resolve the credential chain, build a SigV4Auth and
+          open a new connection with requests.request for every call
+    warm: one SigV4Client reused across calls (pooled connection, cached
+          credentials and signer)
+
+Fake credentials are used; nothing is sent to AWS.
+
+Usage:
+    python benchmarks/bench_sigv4_client.py --requests 500
+    python benchmarks/bench_sigv4_client.py --certfile cert.pem --keyfile key.pem
+"""
+import os
+import sys
+import ssl
+import time
+import argparse
+import threading
+import statistics
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit_app'))
+
+os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIDBENCHMARK")
+os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "benchmark-secret")
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+
+import requests  # noqa: E402
+import urllib3  # noqa: E402
+from boto3.session import Session  # noqa: E402
+from botocore.auth import SigV4Auth  # noqa: E402
+from botocore.awsrequest import AWSRequest  # noqa: E402
+
+from event_stream import encode_chunk_event  # noqa: E402
+from sigv4_client import SigV4Client  # noqa: E402
+
+RESPONSE_BODY = encode_chunk_event("ok")
+REQUEST_BODY = b'{"inputText": "Create a portfolio with 3 companies in the real estate industry", "enableTrace": true}'
+HEADERS = {'content-type': 'application/json', 'accept': 'application/json'}
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("content-length", 0)))
+        self.send_response(200)
+        self.send_header("content-type", "application/vnd.amazon.eventstream")
+        self.send_header("content-length", str(len(RESPONSE_BODY)))
+        self.end_headers()
+        self.wfile.write(RESPONSE_BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_server(certfile=None, keyfile=None):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    scheme = "http"
+    if certfile:
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(certfile, keyfile)
+        server.socket = context.wrap_socket(server.socket, server_side=True)
+        scheme = "https"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address
+    return server, f"{scheme}://{host}:{port}/agents/A/agentAliases/B/sessions/bench/text"
+
+
+def cold_request(url, verify):
+    credentials = Session().get_credentials().get_frozen_credentials()
+    req = AWSRequest(method="POST", url=url, data=REQUEST_BODY, headers=HEADERS)
+    SigV4Auth(credentials, "bedrock", "us-west-2").add_auth(req)
+    prepared = req.prepare()
+    response = requests.request(prepared.method, prepared.url, headers=prepared.headers, data=prepared.body, verify=verify)
+    response.content
+    response.close()
+
+
+def make_warm_request(verify):
+    client = SigV4Client()
+    client.http.verify = verify
+    client.http.trust_env = False
+
+    def warm_request(url, _verify):
+        response = client.request(url, method="POST", body=REQUEST_BODY, headers=HEADERS, service="bedrock", region="us-west-2")
+        response.content
+    return warm_request
+
+
+def measure(label, fn, url, verify, count):
+    fn(url, verify)  # first call pays imports / pool creation
+    samples = []
+    for _ in range(count):
+        start = time.perf_counter()
+        fn(url, verify)
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:>6} {statistics.mean(samples):9.3f} {statistics.median(samples):9.3f} {p95:9.3f} {count / (sum(samples) / 1000):10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--certfile")
+    parser.add_argument("--keyfile")
+    args = parser.parse_args()
+
+    server, url = start_server(args.certfile, args.keyfile)
+    verify = not args.certfile
+    if args.certfile:
+        urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+    try:
+        print(f"{'path':>6} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'req/s':>10}")
+        measure("cold", cold_request, url, verify, args.requests)
+        measure("warm", make_warm_request(verify), url, verify, args.requests)
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Overhead benchmark for streamlit_app/telemetry.py.
+
+Times an empty block wrapped in telemetry.span() with telemetry disabled
+(AGENT_TELEMETRY=off), enabled without a current turn (histograms only) and
+enabled inside a turn (histograms plus per-turn spans), against the bare
+block. Then exports one sample turn as JSON, EMF and OTLP span objects to show
+the size of each record.
+
+Finally it checks that TELEMETRY_EXPORT=otel prints an OTLP/JSON traces
+request whose spans all hang off the turn (or, for ActionLambda.py, the
+invocation) span. Exits non-zero if a check fails.
+
+Usage:
+    python benchmarks/bench_telemetry.py
+    python benchmarks/bench_telemetry.py --iterations 1000000
+"""
+import os
+import sys
+import io
+import json
+import time
+import argparse
+import contextlib
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit_app'))
+
+import telemetry  # noqa: E402
+import ActionLambda  # noqa: E402
+
+
+def time_loop(iterations, body):
+    start = time.perf_counter()
+    body(iterations)
+    return (time.perf_counter() - start) / iterations * 1e9
+
+
+def bare(iterations):
+    for _ in range(iterations):
+        pass
+
+
+def spans(iterations):
+    span = telemetry.span
+    for _ in range(iterations):
+        with span("bench.block"):
+            pass
+
+
+def check(name, condition, failures):
+    print(f"  {'ok  ' if condition else 'FAIL'} {name}")
+    if not condition:
+        failures.append(name)
+
+
+def printed_json(fn):
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        fn()
+    return json.loads(output.getvalue())
+
+
+def otlp_spans(request):
+    """The spans of a one-resource, one-scope OTLP traces request, and whether they form one tree."""
+    spans = request["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    ids = {span["spanId"] for span in spans}
+    roots = [span for span in spans if "parentSpanId" not in span]
+    linked = len(roots) == 1 and all(span.get("parentSpanId", roots[0]["spanId"]) in ids for span in spans)
+    return spans, linked and len({span["traceId"] for span in spans}) == 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200_000)
+    args = parser.parse_args()
+
+    baseline = time_loop(args.iterations, bare)
+    print(f"{'mode':>18} {'ns per block':>13} {'overhead ns':>12}")
+    print(f"{'bare loop':>18} {baseline:>13.0f} {0:>12.0f}")
+
+    telemetry.ENABLED = False
+    cost = time_loop(args.iterations, spans)
+    print(f"{'disabled':>18} {cost:>13.0f} {cost - baseline:>12.0f}")
+
+    telemetry.ENABLED = True
+    cost = time_loop(args.iterations, spans)
+    print(f"{'enabled, no turn':>18} {cost:>13.0f} {cost - baseline:>12.0f}")
+
+    turn, token = telemetry.start_turn("bench.turn")
+    cost = time_loop(args.iterations, spans)
+    turn.spans.clear()
+    print(f"{'enabled, in turn':>18} {cost:>13.0f} {cost - baseline:>12.0f}")
+
+    with telemetry.span("sigv4.sign"):
+        pass
+    with telemetry.span("http.request", status=200):
+        time.sleep(0.001)
+    timer = telemetry.OrchestrationTimer(turn)
+    timer.observe({"trace": {"orchestrationTrace": {"modelInvocationInput": {}}}})
+    time.sleep(0.002)
+    timer.observe({"trace": {"orchestrationTrace": {"modelInvocationOutput": {}}}})
+    telemetry.end_turn(turn, token)
+
+    for name, record in [
+        ("json", turn.to_log_record()),
+        ("emf", turn.to_emf()),
+        ("otel", turn.to_otel_spans()),
+    ]:
+        print(f"{name} export: {len(json.dumps(record))} bytes")
+
+    print("checks")
+    failures = []
+    spans_out, linked = otlp_spans(printed_json(lambda: telemetry.export(turn, "otel")))
+    check("TELEMETRY_EXPORT=otel prints the turn and all its spans", len(spans_out) == len(turn.spans) + 1, failures)
+    check("exported turn spans form one trace tree", linked, failures)
+
+    export, ActionLambda.METRICS_EXPORT = ActionLambda.METRICS_EXPORT, "otel"
+    try:
+        event = {"actionGroup": "bench", "apiPath": "/companyResearch", "httpMethod": "POST",
+                 "parameters": [{"name": "name", "type": "string", "value": "TechStashNova"}]}
+        spans_out, linked = otlp_spans(printed_json(lambda: ActionLambda.lambda_handler(event, None)))
+    finally:
+        ActionLambda.METRICS_EXPORT = export
+    check("ActionLambda otel export has the invocation, parse and action spans",
+          [span["name"] for span in spans_out] == ["action", "action.parse", "action.run"], failures)
+    check("ActionLambda spans form one trace tree within the invocation", linked and all(
+        int(spans_out[0]["startTimeUnixNano"]) <= int(span["startTimeUnixNano"])
+        <= int(span["endTimeUnixNano"]) <= int(spans_out[0]["endTimeUnixNano"]) for span in spans_out), failures)
+    print("FAILED" if failures else "OK")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
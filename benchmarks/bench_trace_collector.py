@@ -0,0 +1,133 @@
+"""
+Concurrency check and benchmark for trace capture in decode_response.
+
+Runs many decode_response calls at once from a thread pool, each on a fake
+streaming response whose chunks and trace events are tagged with the
+request number, and checks that every returned TraceCollector holds only its
+own events and its own answer. The same workload is then run through the old
+approach (swapping sys.stdout for a StringIO and printing every event) to
+show the cross-talk and lost output that approach produced.
+
+Exits non-zero if any collector saw another request's events.
+
+Usage:
+    python benchmarks/bench_trace_collector.py
+    python benchmarks/bench_trace_collector.py --requests 400 --threads 32 --traces 50
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'streamlit_app'))
+
+import invoke_agent  # noqa: E402
+from event_stream import encode_agent_event, encode_chunk_event, iter_agent_events, ChunkEvent  # noqa: E402
+
+
+class FakeResponse:
+    """Stands in for a streaming requests.Response, yielding small reads."""
+
+    def __init__(self, body, read_size=512):
+        self._body = body
+        self._read_size = read_size
+
+    def iter_content(self, chunk_size=None):
+        for start in range(0, len(self._body), self._read_size):
+            # Yield to other threads between reads, like a socket would.
+            time.sleep(0)
+            yield self._body[start:start + self._read_size]
+
+    def close(self):
+        pass
+
+
+def make_body(request_id, traces):
+    frames = []
+    for step in range(traces):
+        frames.append(encode_agent_event("trace", {
+            "trace": {"orchestrationTrace": {"rationale": {"text": f"request {request_id} step {step}"}}}
+        }))
+    frames.append(encode_chunk_event(f"answer for request {request_id}"))
+    return b"".join(frames)
+
+
+def check_collector(request_id, collector, final_response):
+    tag = f"request {request_id} "
+    expected = f"answer for request {request_id}"
+    ok = final_response == expected
+    for kind, data in collector.to_records():
+        text = data if kind == "chunk" else json.dumps(data)
+        ok = ok and (tag in text + " ")
+    return ok
+
+
+# What legacy_decode restores stdout to. The old code used sys.__stdout__;
+# a StringIO here keeps output leaked by other threads off the terminal.
+legacy_restore_target = io.StringIO()
+
+
+def legacy_decode(response):
+    """The old decode_response capture: global stdout swap plus print."""
+    captured_output = io.StringIO()
+    sys.stdout = captured_output
+    answer = []
+    for event in iter_agent_events(response.iter_content()):
+        if isinstance(event, ChunkEvent):
+            answer.append(event.bytes)
+            print(f"Chunk: {event.bytes.decode('utf-8')}")
+        else:
+            print(f"Trace: {json.dumps(event.trace)}")
+    sys.stdout = legacy_restore_target
+    return captured_output.getvalue(), b"".join(answer).decode("utf-8")
+
+
+def run(decode, bodies, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        results = list(pool.map(lambda body: decode(FakeResponse(body)), bodies))
+    return results, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--traces", type=int, default=30, help="Trace events per request")
+    args = parser.parse_args()
+
+    bodies = [make_body(i, args.traces) for i in range(args.requests)]
+
+    results, elapsed = run(invoke_agent.decode_response, bodies, args.threads)
+    failures = sum(
+        not check_collector(i, collector, final_response)
+        for i, (collector, final_response) in enumerate(results)
+    )
+    complete = sum(len(collector) == args.traces + 1 for collector, _ in results)
+    print(f"TraceCollector: {args.requests} requests on {args.threads} threads in {elapsed:.2f} s, "
+          f"{complete} complete, {failures} with cross-talk")
+
+    stdout = sys.stdout
+    try:
+        legacy_results, legacy_elapsed = run(legacy_decode, bodies, args.threads)
+    finally:
+        sys.stdout = stdout
+    legacy_bad = 0
+    for i, (captured, _) in enumerate(legacy_results):
+        lines = captured.splitlines()
+        own = [line for line in lines if f"request {i} " in line + " "]
+        if len(own) != len(lines) or len(own) != args.traces + 1:
+            legacy_bad += 1
+    leaked = len(legacy_restore_target.getvalue().splitlines())
+    print(f"stdout redirect: {args.requests} requests in {legacy_elapsed:.2f} s, "
+          f"{legacy_bad} with missing or foreign output, {leaked} lines leaked to the real stdout")
+
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,428 @@
+"""
+Local stand-in for the Bedrock Agent runtime, for load tests and offline runs.
+
+Serves POST /agents/{agentId}/agentAliases/{aliasId}/sessions/{sessionId}/text
+and answers with application/vnd.amazon.eventstream frames shaped like the
+real service: orchestration trace events (model invocation input/output,
+rationale, knowledge base lookup or action group invocation, final
+response), then the answer as chunk events, sent with HTTP/1.1 chunked
+transfer encoding.
+
+Questions about portfolios, companies or emails are routed to
+ActionLambda.lambda_handler in-process, the way the agent calls the action
+group Lambda, so the answer contains real action output (--lambda-delay adds
+the cost of a Lambda invoke to each call). A question with several parts
+separated by ";" asks for several actions. Anything else gets a fake
+knowledge base lookup.
+
+With --return-control the action group behaves as if configured with
+customControl RETURN_CONTROL: the turn stops at a returnControl event
+listing every action at once, and a follow-up request carrying
+sessionState.returnControlInvocationResults with the matching invocationId
+continues it to the final answer.
+
+Behaviour is configurable (chunk count, trace volume and size, delays) and
+errors can be injected: questions containing "fail", or a --error-rate share
+of requests, get an exception frame mid-stream; questions containing
+"throttle", or a --throttle-rate share, get HTTP 429.
+
+Usage:
+    python benchmarks/fake_agent_runtime.py --port 8080
+    AGENT_RUNTIME_ENDPOINT=http://127.0.0.1:8080 streamlit run streamlit_app/app.py
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter, namedtuple
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, 'streamlit_app'))
+
+import ActionLambda  # noqa: E402
+from event_stream import encode_agent_event, encode_chunk_event, encode_error_event  # noqa: E402
+
+RuntimeConfig = namedtuple('RuntimeConfig', [
+    'chunks',            # answer chunk events per turn
+    'trace_events',      # rationale trace events per turn (besides the fixed steps)
+    'trace_bytes',       # size of the prompt text carried by modelInvocationInput
+    'first_byte_delay',  # seconds before the first frame
+    'step_delay',        # seconds between trace events
+    'chunk_delay',       # seconds between answer chunks
+    'error_rate',        # share of turns ending in an exception frame
+    'throttle_rate',     # share of requests answered with HTTP 429
+    'seed',
+    'return_control',    # hand actions back to the client instead of calling ActionLambda
+    'lambda_delay',      # seconds added to each action call on the Lambda path
+], defaults=[8, 4, 2048, 0.05, 0.02, 0.01, 0.0, 0.0, None, False, 0.0])
+
+AGENT_PATH = re.compile(r"^/agents/([^/]+)/agentAliases/([^/]+)/sessions/([^/]+)/text$")
+
+_NUM_COMPANIES = re.compile(r"(\d+)\s+compan", re.IGNORECASE)
+_INDUSTRY = re.compile(r"in the\s+([a-z ]+?)\s+industry", re.IGNORECASE)
+_COMPANY_NAME = re.compile(r"company(?:\s+on)?\s+([A-Z][\w&.\- ]+?)\.?\s*$")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+
+
+def action_request(question):
+    """Maps a question to (apiPath, parameters) for ActionLambda, or None."""
+    lowered = question.lower()
+    if "email" in lowered and _EMAIL.search(question):
+        return "/sendEmail", {
+            "emailAddress": _EMAIL.search(question).group(0),
+            "fomcSummary": "Summary of the FOMC minutes.",
+            "portfolio": "[]",
+        }
+    if "portfolio" in lowered:
+        count = _NUM_COMPANIES.search(question)
+        industry = _INDUSTRY.search(question)
+        parameters = {"numCompanies": count.group(1) if count else "3"}
+        if industry:
+            parameters["industry"] = industry.group(1).strip().title()
+        return "/createPortfolio", parameters
+    name = _COMPANY_NAME.search(question)
+    if name:
+        return "/companyResearch", {"name": name.group(1).strip()}
+    return None
+
+
+def action_requests(question):
+    """action_request for each ";"-separated part of a question that maps to an action."""
+    actions = (action_request(part.strip()) for part in question.split(";"))
+    return [action for action in actions if action is not None]
+
+
+class InvalidSessionState(ValueError):
+    """A return control follow-up that does not match the invocation the runtime is waiting for."""
+
+
+class RuntimeServer(ThreadingHTTPServer):
+    """
+    ThreadingHTTPServer with a listen backlog sized for the load tests: the
+    default of 5 resets connections when 32+ clients connect at once.
+    """
+    request_queue_size = 256
+    daemon_threads = True
+
+
+class FakeAgentRuntime:
+    """
+    Threaded HTTP server emulating InvokeAgent. Use as a context manager or
+    call start()/stop(); endpoint is the base URL to hand to the clients.
+    """
+
+    def __init__(self, config=None, host='127.0.0.1', port=0):
+        self.config = config or RuntimeConfig()
+        self.sessions = {}
+        self.requests = 0
+        # session ID -> questions of the turns answered (not throttled), in order
+        self.questions = {}
+        # Turns started while another turn of the same session was streaming
+        self.overlapping_turns = 0
+        self._streaming = Counter()
+        # session ID -> (invocationId, trace part) of a turn waiting for returned control results
+        self.pending = {}
+        self._lock = threading.Lock()
+        self._random = random.Random(self.config.seed)
+        runtime = self
+
+        class Handler(AgentRequestHandler):
+            pass
+        Handler.runtime = runtime
+
+        self.server = RuntimeServer((host, port), Handler)
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.endpoint
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def roll(self, rate):
+        with self._lock:
+            return rate > 0 and self._random.random() < rate
+
+    def start_turn(self, session_id, end_session):
+        """Tracks turns per session; endSession forgets the session."""
+        with self._lock:
+            self.requests += 1
+            self.pending.pop(session_id, None)
+            turn = self.sessions.get(session_id, 0) + 1
+            if end_session:
+                self.sessions.pop(session_id, None)
+            else:
+                self.sessions[session_id] = turn
+            return turn
+
+    def resume_turn(self, session_id, session_state):
+        """
+        Checks a return control follow-up against the waiting invocation.
+        Returns the trace part of the turn; raises InvalidSessionState.
+        """
+        with self._lock:
+            self.requests += 1
+            pending = self.pending.get(session_id)
+            if pending is None or pending[0] != session_state.get("invocationId"):
+                raise InvalidSessionState("No returned control is waiting for this invocationId")
+            del self.pending[session_id]
+            return pending[1]
+
+    def turn_frames(self, agent_id, alias_id, session_id, question):
+        """Yields (delay_before, frame) pairs for one agent turn."""
+        config = self.config
+        part = {"agentId": agent_id, "agentAliasId": alias_id, "sessionId": session_id, "agentVersion": "1"}
+        trace_id = f"{session_id}-{time.monotonic_ns()}"
+
+        def trace(orchestration):
+            return encode_agent_event("trace", dict(part, trace={"orchestrationTrace": dict(orchestration, traceId=trace_id)}))
+
+        prompt = ("Human: " + question + " ").ljust(config.trace_bytes, ".")
+        yield config.first_byte_delay, trace({"modelInvocationInput": {"text": prompt, "type": "ORCHESTRATION"}})
+        yield config.step_delay, trace({"modelInvocationOutput": {
+            "metadata": {"usage": {"inputTokens": len(prompt) // 4, "outputTokens": 64}}
+        }})
+        for step in range(config.trace_events):
+            yield config.step_delay, trace({"rationale": {"text": f"Step {step + 1}: working on '{question}'"}})
+
+        actions = action_requests(question)
+        if actions and config.return_control:
+            invocation_inputs = []
+            for api_path, parameters in actions:
+                api_input = {
+                    "actionGroup": "PortfolioCreator-actions",
+                    "apiPath": api_path,
+                    "httpMethod": "POST",
+                    "parameters": [{"name": name, "type": "string", "value": value} for name, value in parameters.items()],
+                    "actionInvocationType": "RESULT",
+                }
+                yield config.step_delay, trace({"invocationInput": {
+                    "invocationType": "ACTION_GROUP",
+                    "actionGroupInvocationInput": {
+                        "actionGroupName": api_input["actionGroup"], "apiPath": api_path, "verb": "post",
+                        "parameters": api_input["parameters"],
+                    },
+                }})
+                invocation_inputs.append({"apiInvocationInput": api_input})
+            invocation_id = f"{trace_id}-rc"
+            with self._lock:
+                self.pending[session_id] = (invocation_id, (part, trace_id))
+            yield 0, encode_agent_event("returnControl", {
+                "invocationId": invocation_id, "invocationInputs": invocation_inputs
+            })
+            return
+
+        if actions:
+            outputs = []
+            for api_path, parameters in actions:
+                event = {
+                    "actionGroup": "PortfolioCreator-actions",
+                    "apiPath": api_path,
+                    "httpMethod": "POST",
+                    "parameters": [{"name": name, "type": "string", "value": value} for name, value in parameters.items()],
+                    "messageVersion": "1.0",
+                }
+                yield config.step_delay, trace({"invocationInput": {
+                    "invocationType": "ACTION_GROUP",
+                    "actionGroupInvocationInput": {
+                        "actionGroupName": event["actionGroup"], "apiPath": api_path, "verb": "post",
+                        "parameters": event["parameters"],
+                    },
+                }})
+                output = ActionLambda.lambda_handler(event, None)["response"]["responseBody"]["application/json"]["body"]
+                yield config.lambda_delay, trace({"observation": {
+                    "type": "ACTION_GROUP", "actionGroupInvocationOutput": {"text": output}
+                }})
+                outputs.append((api_path, output))
+            answer = action_answer(outputs)
+        else:
+            yield config.step_delay, trace({"invocationInput": {
+                "invocationType": "KNOWLEDGE_BASE",
+                "knowledgeBaseLookupInput": {"text": question, "knowledgeBaseId": "FAKEKB"},
+            }})
+            references = [
+                {"content": {"text": f"Passage {i} of the FOMC minutes relevant to: {question}"},
+                 "location": {"type": "S3", "s3Location": {"uri": f"s3://fake-kb/fomcminutes{i}.pdf"}}}
+                for i in range(3)
+            ]
+            yield config.step_delay, trace({"observation": {
+                "type": "KNOWLEDGE_BASE", "knowledgeBaseLookupOutput": {"retrievedReferences": references}
+            }})
+            answer = (
+                f"Based on the FOMC minutes, here is what I found about \"{question}\". "
+                "Participants noted that inflation remained elevated and that the labor market stayed tight, "
+                "while financial conditions had tightened over the intermeeting period."
+            )
+
+        yield from self.answer_frames(trace, answer)
+
+    def resumed_frames(self, resumed, session_state):
+        """Yields (delay_before, frame) pairs that finish a turn from returned control results."""
+        part, trace_id = resumed
+
+        def trace(orchestration):
+            return encode_agent_event("trace", dict(part, trace={"orchestrationTrace": dict(orchestration, traceId=trace_id)}))
+
+        outputs = []
+        for entry in session_state.get("returnControlInvocationResults", []):
+            result = entry.get("apiResult", {})
+            body = result.get("responseBody", {}).get("application/json", {}).get("body", "")
+            outputs.append((result.get("apiPath", ""), body))
+        # The agent reads the results with another model invocation; its time
+        # is the step_delay before the final response, as on the Lambda path
+        yield 0, trace({"modelInvocationInput": {"text": "Results returned", "type": "ORCHESTRATION"}})
+        yield 0, trace({"modelInvocationOutput": {
+            "metadata": {"usage": {"inputTokens": 256, "outputTokens": 64}}
+        }})
+        yield from self.answer_frames(trace, action_answer(outputs))
+
+    def answer_frames(self, trace, answer):
+        config = self.config
+        yield config.step_delay, trace({"observation": {"type": "FINISH", "finalResponse": {"text": answer}}})
+
+        size = max(len(answer) // max(config.chunks, 1), 1)
+        pieces = [answer[i:i + size] for i in range(0, len(answer), size)]
+        for index, piece in enumerate(pieces):
+            yield (config.chunk_delay if index else 0), encode_chunk_event(piece)
+
+
+def action_answer(outputs):
+    return " ".join(f"Here is the result of {api_path[1:]}: {output}" for api_path, output in outputs)
+
+
+class AgentRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    runtime = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        match = AGENT_PATH.match(self.path.split('?', 1)[0])
+        length = int(self.headers.get('content-length', 0))
+        body = json.loads(self.rfile.read(length) or b'{}')
+        if match is None:
+            return self.send_json(404, {"message": f"No route for {self.path}"})
+        if 'authorization' not in self.headers:
+            return self.send_json(403, {"message": "Missing Authentication Token"})
+
+        runtime = self.runtime
+        agent_id, alias_id, session_id = (unquote(part) for part in match.groups())
+        question = body.get("inputText", "")
+        session_state = body.get("sessionState") or {}
+        if "returnControlInvocationResults" in session_state:
+            try:
+                frames = runtime.resumed_frames(runtime.resume_turn(session_id, session_state), session_state)
+            except InvalidSessionState as e:
+                return self.send_json(400, {"message": str(e)}, error_type="ValidationException")
+        else:
+            runtime.start_turn(session_id, bool(body.get("endSession")))
+            frames = runtime.turn_frames(agent_id, alias_id, session_id, question)
+        if "throttle" in question or runtime.roll(runtime.config.throttle_rate):
+            return self.send_json(429, {"message": "Rate exceeded"}, error_type="ThrottlingException")
+        with runtime._lock:
+            runtime.questions.setdefault(session_id, []).append(question)
+            runtime.overlapping_turns += runtime._streaming[session_id] > 0
+            runtime._streaming[session_id] += 1
+
+        self.send_response(200)
+        self.send_header('content-type', 'application/vnd.amazon.eventstream')
+        self.send_header('transfer-encoding', 'chunked')
+        self.send_header('x-amzn-bedrock-agent-session-id', session_id)
+        self.end_headers()
+
+        fail = "fail" in question or runtime.roll(runtime.config.error_rate)
+        try:
+            for index, (delay, frame) in enumerate(frames):
+                if fail and index == 2:
+                    self.write_chunk(encode_error_event("internalServerException", "Injected failure"))
+                    break
+                if delay:
+                    time.sleep(delay)
+                self.write_chunk(frame)
+            self.wfile.write(b"0\r\n\r\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            # The client went away (timeout or cancellation).
+            self.close_connection = True
+        finally:
+            with runtime._lock:
+                runtime._streaming[session_id] -= 1
+
+    def write_chunk(self, data):
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def send_json(self, status, body, error_type=None):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('content-type', 'application/json')
+        self.send_header('content-length', str(len(data)))
+        if error_type:
+            self.send_header('x-amzn-ErrorType', error_type)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def add_config_arguments(parser):
+    """Adds the RuntimeConfig options to an argparse parser."""
+    defaults = RuntimeConfig()
+    parser.add_argument("--chunks", type=int, default=defaults.chunks)
+    parser.add_argument("--trace-events", type=int, default=defaults.trace_events)
+    parser.add_argument("--trace-bytes", type=int, default=defaults.trace_bytes)
+    parser.add_argument("--first-byte-delay", type=float, default=defaults.first_byte_delay)
+    parser.add_argument("--step-delay", type=float, default=defaults.step_delay)
+    parser.add_argument("--chunk-delay", type=float, default=defaults.chunk_delay)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--throttle-rate", type=float, default=defaults.throttle_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    parser.add_argument("--return-control", action="store_true", default=defaults.return_control)
+    parser.add_argument("--lambda-delay", type=float, default=defaults.lambda_delay)
+
+
+def config_from_args(args):
+    return RuntimeConfig(*(getattr(args, field) for field in RuntimeConfig._fields))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    runtime = FakeAgentRuntime(config_from_args(args), args.host, args.port)
+    print(f"Fake agent runtime listening on {runtime.endpoint}")
+    try:
+        runtime.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        runtime.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
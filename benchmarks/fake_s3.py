@@ -0,0 +1,349 @@
+"""
+Local stand-in for S3, for ingestion benchmarks and offline runs.
+
+Serves the path-style S3 REST calls DataLoadLambda.py makes, against an
+in-memory store: ListObjectsV2, GetObject, HeadObject, PutObject,
+DeleteObject(s) and multipart uploads (create, upload part, complete,
+abort). ETags are computed the way S3 does (the MD5 of the object, or of
+the part MD5s plus "-<parts>"). Request bodies sent with aws-chunked
+content encoding (botocore's default checksums) are decoded.
+
+Every request waits --latency seconds, and bodies move at --throughput
+bytes per second per connection, to model the distance to a real bucket.
+Files added with serve_file() (or found in --files-dir) are served at
+/files/<name>, so a source archive can be downloaded over HTTP as well.
+GET /_stats returns the request count as JSON, for benchmarks that run
+the server in another process.
+
+Usage:
+    python benchmarks/fake_s3.py --port 9000 --latency 0.02
+    S3_ENDPOINT_URL=http://127.0.0.1:9000 BUCKET_NAME=kb python DataLoadLambda.py
+"""
+import os
+import json
+import time
+import hashlib
+import argparse
+import threading
+from collections import namedtuple
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+StoredObject = namedtuple('StoredObject', ['data', 'etag', 'modified'])
+
+S3_NAMESPACE = "http://s3.amazonaws.com/doc/2006-03-01/"
+
+
+def decode_aws_chunked(body):
+    """Returns the payload of an aws-chunked body ("<hex size>[;ext]\\r\\n<data>\\r\\n"..., then trailers)."""
+    payload = bytearray()
+    position = 0
+    while True:
+        line_end = body.index(b"\r\n", position)
+        size = int(body[position:line_end].split(b";", 1)[0], 16)
+        if size == 0:
+            return bytes(payload)
+        start = line_end + 2
+        payload += body[start:start + size]
+        position = start + size + 2
+
+
+class FakeS3:
+    """
+    Threaded HTTP server emulating S3. Use as a context manager or call
+    start()/stop(); endpoint is the URL to pass as endpoint_url.
+    """
+
+    def __init__(self, latency=0.0, throughput=None, host='127.0.0.1', port=0, files_dir=None):
+        self.latency = latency
+        self.throughput = throughput
+        self.buckets = {}
+        self.files = {}
+        self.files_dir = files_dir
+        self.requests = 0
+        self.put_bytes = 0
+        self._uploads = {}
+        self._lock = threading.Lock()
+        store = self
+
+        class Handler(S3RequestHandler):
+            pass
+        Handler.store = store
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def endpoint(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self.endpoint
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def create_bucket(self, name):
+        with self._lock:
+            self.buckets.setdefault(name, {})
+
+    def serve_file(self, name, path):
+        """Serves the local file path at /files/<name>; returns its URL."""
+        self.files[name] = path
+        return f"{self.endpoint}/files/{quote(name)}"
+
+    def objects(self, bucket):
+        """{key: StoredObject} snapshot of a bucket."""
+        with self._lock:
+            return dict(self.buckets[bucket])
+
+    def count(self, body_bytes=0):
+        with self._lock:
+            self.requests += 1
+            self.put_bytes += body_bytes
+
+    def put(self, bucket, key, data, etag=None):
+        etag = etag or hashlib.md5(data).hexdigest()
+        with self._lock:
+            self.buckets[bucket][key] = StoredObject(data, etag, time.time())
+        return etag
+
+    def create_upload(self, bucket, key):
+        with self._lock:
+            upload_id = f"upload-{len(self._uploads) + 1}-{time.monotonic_ns()}"
+            self._uploads[upload_id] = (bucket, key, {})
+        return upload_id
+
+    def put_part(self, upload_id, number, data):
+        with self._lock:
+            self._uploads[upload_id][2][number] = data
+        return hashlib.md5(data).hexdigest()
+
+    def complete_upload(self, upload_id, numbers):
+        with self._lock:
+            bucket, key, parts = self._uploads.pop(upload_id)
+        data = b"".join(parts[number] for number in numbers)
+        digests = b"".join(hashlib.md5(parts[number]).digest() for number in numbers)
+        return self.put(bucket, key, data, f"{hashlib.md5(digests).hexdigest()}-{len(numbers)}")
+
+    def abort_upload(self, upload_id):
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+
+
+class S3RequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    store = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def route(self):
+        """Returns (bucket, key, query) for the path-style request."""
+        url = urlsplit(self.path)
+        bucket, _, key = url.path.lstrip("/").partition("/")
+        return unquote(bucket), unquote(key), parse_qs(url.query, keep_blank_values=True)
+
+    def read_body(self):
+        body = self.rfile.read(int(self.headers.get('content-length', 0)))
+        if "aws-chunked" in self.headers.get('content-encoding', "") or \
+                self.headers.get('x-amz-content-sha256', "").startswith("STREAMING-"):
+            body = decode_aws_chunked(body)
+        self.transfer_time(len(body))
+        return body
+
+    def transfer_time(self, size):
+        store = self.store
+        delay = store.latency + (size / store.throughput if store.throughput else 0)
+        if delay:
+            time.sleep(delay)
+
+    def send_body(self, status, body=b"", content_type="application/xml", headers=None, head=False):
+        self.send_response(status)
+        self.send_header('content-type', content_type)
+        self.send_header('content-length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+    def send_xml(self, root, children):
+        parts = [f"<{root} xmlns=\"{S3_NAMESPACE}\">"]
+        parts.extend(children)
+        parts.append(f"</{root}>")
+        self.send_body(200, ('<?xml version="1.0" encoding="UTF-8"?>' + "".join(parts)).encode("utf-8"))
+
+    def send_error_code(self, status, code, message, head=False):
+        body = f"<Error><Code>{code}</Code><Message>{escape(message)}</Message></Error>".encode("utf-8")
+        self.send_body(status, b"" if head else body, head=head)
+
+    def bucket_or_error(self, bucket, head=False):
+        objects = self.store.buckets.get(bucket)
+        if objects is None:
+            self.send_error_code(404, "NoSuchBucket", f"No bucket {bucket}", head)
+        return objects
+
+    def do_GET(self, head=False):
+        if self.path.startswith("/files/"):
+            return self.send_file(unquote(urlsplit(self.path).path[len("/files/"):]), head)
+        if self.path == "/_stats":
+            body = json.dumps({"requests": self.store.requests, "put_bytes": self.store.put_bytes})
+            return self.send_body(200, body.encode("utf-8"), "application/json", head=head)
+        bucket, key, query = self.route()
+        self.store.count()
+        self.transfer_time(0)
+        objects = self.bucket_or_error(bucket, head)
+        if objects is None:
+            return
+        if not key:
+            return self.list_objects(self.store.objects(bucket), query)
+        stored = self.store.objects(bucket).get(key)
+        if stored is None:
+            return self.send_error_code(404, "NoSuchKey", f"No object {key}", head)
+        if not head:
+            self.transfer_time(len(stored.data))
+        self.send_body(200, stored.data, "application/octet-stream", {
+            "ETag": f'"{stored.etag}"',
+            "Last-Modified": formatdate(stored.modified, usegmt=True),
+        }, head=head)
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def send_file(self, name, head, chunk_size=1024 * 1024):
+        path = self.store.files.get(name)
+        if path is None and self.store.files_dir:
+            path = os.path.join(self.store.files_dir, os.path.basename(name))
+        if path is None or not os.path.isfile(path):
+            return self.send_body(404, b"", "text/plain", head=head)
+        self.send_response(200)
+        self.send_header('content-type', 'application/zip')
+        self.send_header('content-length', str(os.path.getsize(path)))
+        self.end_headers()
+        if head:
+            return
+        self.transfer_time(0)
+        with open(path, "rb") as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                if self.store.throughput:
+                    time.sleep(len(data) / self.store.throughput)
+                self.wfile.write(data)
+
+    def list_objects(self, objects, query):
+        prefix = query.get("prefix", [""])[0]
+        max_keys = int(query.get("max-keys", ["1000"])[0])
+        after = query.get("continuation-token", query.get("start-after", [""]))[0]
+        keys = sorted(key for key in objects if key.startswith(prefix) and key > after)
+        page, truncated = keys[:max_keys], len(keys) > max_keys
+        children = [f"<Prefix>{escape(prefix)}</Prefix><KeyCount>{len(page)}</KeyCount>"
+                    f"<MaxKeys>{max_keys}</MaxKeys><IsTruncated>{'true' if truncated else 'false'}</IsTruncated>"]
+        if truncated:
+            children.append(f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>")
+        for key in page:
+            stored = objects[key]
+            children.append(
+                f"<Contents><Key>{escape(key)}</Key><ETag>&quot;{stored.etag}&quot;</ETag>"
+                f"<Size>{len(stored.data)}</Size><StorageClass>STANDARD</StorageClass></Contents>"
+            )
+        self.send_xml("ListBucketResult", children)
+
+    def do_PUT(self):
+        bucket, key, query = self.route()
+        body = self.read_body()
+        self.store.count(len(body))
+        if not key:
+            self.store.create_bucket(bucket)
+            return self.send_body(200)
+        if self.bucket_or_error(bucket) is None:
+            return
+        if "uploadId" in query:
+            etag = self.store.put_part(query["uploadId"][0], int(query["partNumber"][0]), body)
+        else:
+            etag = self.store.put(bucket, key, body)
+        self.send_body(200, headers={"ETag": f'"{etag}"'})
+
+    def do_POST(self):
+        bucket, key, query = self.route()
+        body = self.read_body()
+        self.store.count()
+        if self.bucket_or_error(bucket) is None:
+            return
+        if "delete" in query:
+            root = ElementTree.fromstring(body)
+            keys = [element.text for element in root.iter() if element.tag.endswith("Key")]
+            with self.store._lock:
+                for name in keys:
+                    self.store.buckets[bucket].pop(name, None)
+            return self.send_xml("DeleteResult", [])
+        if "uploads" in query:
+            upload_id = self.store.create_upload(bucket, key)
+            return self.send_xml("InitiateMultipartUploadResult", [
+                f"<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key><UploadId>{upload_id}</UploadId>"
+            ])
+        if "uploadId" in query:
+            root = ElementTree.fromstring(body)
+            numbers = [int(element.text) for element in root.iter() if element.tag.endswith("PartNumber")]
+            etag = self.store.complete_upload(query["uploadId"][0], numbers)
+            return self.send_xml("CompleteMultipartUploadResult", [
+                f"<Bucket>{escape(bucket)}</Bucket><Key>{escape(key)}</Key><ETag>&quot;{etag}&quot;</ETag>"
+            ])
+        self.send_error_code(400, "InvalidRequest", f"Unsupported POST {self.path}")
+
+    def do_DELETE(self):
+        bucket, key, query = self.route()
+        self.store.count()
+        self.transfer_time(0)
+        if self.bucket_or_error(bucket) is None:
+            return
+        if "uploadId" in query:
+            self.store.abort_upload(query["uploadId"][0])
+        else:
+            with self.store._lock:
+                self.store.buckets[bucket].pop(key, None)
+        self.send_body(204)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every request")
+    parser.add_argument("--throughput", type=float, default=None, help="bytes per second per connection")
+    parser.add_argument("--bucket", action="append", default=[], help="bucket to create (repeatable)")
+    parser.add_argument("--files-dir", default=None, help="directory served at /files/")
+    args = parser.parse_args()
+
+    s3 = FakeS3(args.latency, args.throughput, args.host, args.port, args.files_dir)
+    for bucket in args.bucket:
+        s3.create_bucket(bucket)
+    print(f"Fake S3 listening on {s3.endpoint}", flush=True)
+    try:
+        s3.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        s3.server.server_close()
+
+
+if __name__ == "__main__":
+    main()
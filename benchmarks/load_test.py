@@ -0,0 +1,279 @@
+"""
+Load generator for the agent client, run against the local fake runtime.
+
+Starts benchmarks/fake_agent_runtime.py in its own process (or uses
+--endpoint), then for each concurrency level runs --workers worker processes.
+Each worker sends questions from threads (sync client: invoke_agent.py, the
+code path the Streamlit app uses) or from one event loop (async client:
+async_invoke_agent.py). Every worker gets its own session IDs.
+
+Reports per level: requests/s, end-to-end latency p50/p95/p99, time to first
+byte (first event) and to first answer token p50/p95/p99, errors, and peak
+RSS per worker. Results can be saved as JSON and compared with an earlier
+run, e.g. one from the previous commit:
+
+    python benchmarks/load_test.py --concurrency 1 8 32 --output after.json --compare before.json
+
+The response cache is turned off unless --cache is given, since the question
+mix repeats.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import resource
+import platform
+import subprocess
+import multiprocessing
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.join(HERE, '..')
+sys.path.insert(0, HERE)
+
+QUESTIONS = [
+    "Give me a summary of financial market developments and open market operations in January 2023",
+    "Tell me the participants view on economic conditions and economic outlook",
+    "Provide any important information I should know about consumer inflation, or rising prices",
+    "Create a portfolio with 3 companies in the real estate industry",
+    "Create a portfolio of 4 companies that are in the technology industry",
+    "Return me information on the company on TechStashNova Inc.",
+]
+
+
+# ---------------------------------------------------------------------
+# FAKE RUNTIME PROCESS
+# ---------------------------------------------------------------------
+def serve_fake_runtime(config, ready):
+    # ActionLambda prints every event; keep the server process quiet.
+    sys.stdout = open(os.devnull, 'w')
+    from fake_agent_runtime import FakeAgentRuntime
+    runtime = FakeAgentRuntime(config)
+    ready.put(runtime.endpoint)
+    runtime.server.serve_forever()
+
+
+# ---------------------------------------------------------------------
+# WORKERS
+# ---------------------------------------------------------------------
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def sync_worker(worker_id, endpoint, threads, requests_per_worker, timeout):
+    from concurrent.futures import ThreadPoolExecutor
+
+    import invoke_agent
+    from event_stream import ChunkEvent
+
+    invoke_agent.configure_client(pool_maxsize=max(threads, 1), read_timeout=timeout)
+    rng = random.Random(worker_id)
+
+    def one(index):
+        session_id = f"load-{worker_id}-{index % threads}"
+        question = rng.choice(QUESTIONS)
+        start = time.perf_counter()
+        first_byte = first_token = None
+        try:
+            for event in invoke_agent.askQuestion_stream(question, invoke_agent.agent_url(session_id)):
+                now = time.perf_counter()
+                if first_byte is None:
+                    first_byte = now - start
+                if first_token is None and isinstance(event, ChunkEvent):
+                    first_token = now - start
+            return time.perf_counter() - start, first_byte, first_token, None
+        except Exception as e:
+            return time.perf_counter() - start, first_byte, first_token, type(e).__name__
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        return list(pool.map(one, range(requests_per_worker)))
+
+
+def async_worker(worker_id, endpoint, concurrency, requests_per_worker, timeout):
+    import asyncio
+
+    from async_invoke_agent import AsyncAgentClient
+    from event_stream import ChunkEvent
+
+    rng = random.Random(worker_id)
+
+    async def one(client, slots, index):
+        # Like a thread pool, only start the clock once a slot is free.
+        async with slots:
+            return await timed(client, index)
+
+    async def timed(client, index):
+        session_id = f"load-{worker_id}-{index % concurrency}"
+        start = time.perf_counter()
+        first_byte = first_token = None
+        try:
+            async for event in client.ask_question_stream(rng.choice(QUESTIONS), session_id):
+                now = time.perf_counter()
+                if first_byte is None:
+                    first_byte = now - start
+                if first_token is None and isinstance(event, ChunkEvent):
+                    first_token = now - start
+            return time.perf_counter() - start, first_byte, first_token, None
+        except Exception as e:
+            return time.perf_counter() - start, first_byte, first_token, type(e).__name__
+
+    async def run():
+        async with AsyncAgentClient(
+            "LOADTEST", "LOADTEST", endpoint_url=endpoint, max_concurrency=concurrency, timeout=timeout
+        ) as client:
+            slots = asyncio.Semaphore(concurrency)
+            return await asyncio.gather(*(one(client, slots, index) for index in range(requests_per_worker)))
+
+    return asyncio.run(run())
+
+
+def run_worker(client, worker_id, endpoint, concurrency, requests_per_worker, timeout, cache):
+    os.environ["AGENT_RUNTIME_ENDPOINT"] = endpoint
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "AKIDLOADTEST")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "loadtest-secret")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-west-2")
+    if not cache:
+        os.environ["AGENT_CACHE_BACKEND"] = "off"
+    sys.path.insert(0, os.path.join(ROOT, 'streamlit_app'))
+
+    worker = sync_worker if client == "sync" else async_worker
+    results = worker(worker_id, endpoint, concurrency, requests_per_worker, timeout)
+    # ru_maxrss is KiB on Linux and bytes on macOS.
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    peak_rss_mib = peak_rss / (1024 * 1024) if sys.platform == "darwin" else peak_rss / 1024
+    return results, peak_rss_mib
+
+
+def run_level(args, endpoint, concurrency):
+    per_worker = max(concurrency // args.workers, 1)
+    context = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    with context.Pool(args.workers) as pool:
+        outputs = pool.starmap(run_worker, [
+            (args.client, worker_id, endpoint, per_worker, args.requests, args.timeout, args.cache)
+            for worker_id in range(args.workers)
+        ])
+    elapsed = time.perf_counter() - start
+
+    results = [result for worker_results, _ in outputs for result in worker_results]
+    ok = [result for result in results if result[3] is None]
+    latencies = [result[0] * 1000 for result in ok]
+    first_bytes = [result[1] * 1000 for result in ok if result[1] is not None]
+    first_tokens = [result[2] * 1000 for result in ok if result[2] is not None]
+    errors = {}
+    for result in results:
+        if result[3] is not None:
+            errors[result[3]] = errors.get(result[3], 0) + 1
+
+    def summary(values):
+        return {name: percentile(values, fraction) for name, fraction in (("p50", 0.5), ("p95", 0.95), ("p99", 0.99))}
+
+    return {
+        "concurrency": per_worker * args.workers,
+        "workers": args.workers,
+        "requests": len(results),
+        "elapsed_s": elapsed,
+        # Includes worker start-up, so it is a lower bound at low request counts.
+        "requests_per_s": len(results) / elapsed,
+        "latency_ms": summary(latencies),
+        "ttfb_ms": summary(first_bytes),
+        "first_token_ms": summary(first_tokens),
+        "errors": errors,
+        "peak_rss_mib_per_worker": max(rss for _, rss in outputs),
+    }
+
+
+# ---------------------------------------------------------------------
+# REPORTING
+# ---------------------------------------------------------------------
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_level(level, baseline=None):
+    def fmt(value):
+        return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+    line = (
+        f"{level['concurrency']:>5} {level['requests_per_s']:8.1f} "
+        f"{fmt(level['latency_ms']['p50'])} {fmt(level['latency_ms']['p95'])} {fmt(level['latency_ms']['p99'])} "
+        f"{fmt(level['ttfb_ms']['p50'])} {fmt(level['first_token_ms']['p50'])} "
+        f"{sum(level['errors'].values()):>6} {level['peak_rss_mib_per_worker']:8.1f}"
+    )
+    if baseline is not None:
+        line += (
+            f"   rps {level['requests_per_s'] / baseline['requests_per_s'] - 1:+.0%}"
+            f" p95 {level['latency_ms']['p95'] / baseline['latency_ms']['p95'] - 1:+.0%}"
+        )
+    print(line)
+
+
+def main():
+    from fake_agent_runtime import add_config_arguments, config_from_args
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--client", choices=["sync", "async"], default="sync")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes per level")
+    parser.add_argument("--requests", type=int, default=100, help="Requests per worker per level")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--cache", action="store_true", help="Leave the response cache on")
+    parser.add_argument("--endpoint", help="Use a running runtime instead of starting the fake one")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Earlier JSON results to compare against")
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    config = config_from_args(args)
+    server = None
+    endpoint = args.endpoint
+    if endpoint is None:
+        context = multiprocessing.get_context("spawn")
+        ready = context.Queue()
+        server = context.Process(target=serve_fake_runtime, args=(config, ready), daemon=True)
+        server.start()
+        endpoint = ready.get(timeout=30)
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = {level["concurrency"]: level for level in json.load(f)["levels"]}
+
+    print(f"{args.client} client against {endpoint}, {args.workers} worker(s), {args.requests} requests per worker")
+    print(f"{'conc':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'ttfb50':>8} {'tok50':>8} "
+          f"{'errors':>6} {'rss MiB':>8}")
+    levels = []
+    try:
+        for concurrency in args.concurrency:
+            level = run_level(args, endpoint, concurrency)
+            levels.append(level)
+            print_level(level, baseline.get(level["concurrency"]))
+    finally:
+        if server is not None:
+            server.terminate()
+
+    if args.output:
+        results = {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "python": platform.python_version(),
+            "client": args.client,
+            "runtime_config": config._asdict(),
+            "levels": levels,
+        }
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import json
+from collections import namedtuple
+
+from trace_collector import RECORD_RETURN_CONTROL_RESULTS, RECORD_TRACE
+
+# ---------------------------------------------------------------------
+# STRUCTURED ACTION RESULTS
+#
+# Action group results reach the client inside the orchestration trace:
+# an invocationInput step names the action (actionGroupName, apiPath) and
+# the following observation carries the Lambda's response body as text in
+# actionGroupInvocationOutput. Tabular results are tagged with
+# TABLE_CONTENT_TYPE and sent column by column (see table_result in
+# ActionLambda.py), so they are turned into DataFrames without touching the
+# answer text.
+#
+# With return of control (see return_control.py) the client runs the action
+# itself, and the results it sent back are read from the collector instead.
+# ---------------------------------------------------------------------
+# Must match TABLE_CONTENT_TYPE in ActionLambda.py
+TABLE_CONTENT_TYPE = "application/vnd.bedrock-agent.table+json"
+JSON_CONTENT_TYPE = "application/json"
+TEXT_CONTENT_TYPE = "text/plain"
+
+# One action group result. schema is a list of {"name", "type"} dicts for
+# tables and None otherwise; data is the columns dict for tables, the
+# decoded JSON value for JSON and the raw text for text.
+ActionResult = namedtuple('ActionResult', ['action_group', 'api_path', 'content_type', 'schema', 'data'])
+
+# OpenAPI type name -> pandas dtype. Nullable integer and boolean dtypes,
+# so a missing value does not turn a whole column into floats or objects.
+_PANDAS_DTYPES = {
+    "integer": "Int64",
+    "number": "float64",
+    "boolean": "boolean",
+    "string": "string",
+}
+
+
+def parse_action_output(text):
+    """Returns (content_type, schema, data) for an action group output text."""
+    try:
+        value = json.loads(text)
+    except (TypeError, ValueError):
+        return TEXT_CONTENT_TYPE, None, text
+    if isinstance(value, dict) and value.get("contentType") == TABLE_CONTENT_TYPE:
+        return TABLE_CONTENT_TYPE, value.get("schema") or [], value.get("columns") or {}
+    return JSON_CONTENT_TYPE, None, value
+
+
+class ActionResultExtractor:
+    """
+    Pairs action group invocation inputs with their observations, one trace
+    event at a time. Feed it trace event dicts (TraceEvent.trace) in stream
+    order and collect the ActionResults it returns.
+    """
+
+    def __init__(self):
+        self._pending = None
+
+    def observe(self, trace):
+        """Returns an ActionResult if the trace event completes an action invocation, else None."""
+        orchestration = trace.get('trace', {}).get('orchestrationTrace')
+        if not orchestration:
+            return None
+        invocation = orchestration.get('invocationInput', {}).get('actionGroupInvocationInput')
+        if invocation is not None:
+            self._pending = invocation
+            return None
+        output = orchestration.get('observation', {}).get('actionGroupInvocationOutput')
+        if output is None:
+            return None
+        invocation, self._pending = self._pending or {}, None
+        content_type, schema, data = parse_action_output(output.get('text'))
+        return ActionResult(invocation.get('actionGroupName'), invocation.get('apiPath'), content_type, schema, data)
+
+
+def action_results_from_traces(traces):
+    """Returns the ActionResults found in a sequence of trace event dicts."""
+    extractor = ActionResultExtractor()
+    results = []
+    for trace in traces:
+        result = extractor.observe(trace)
+        if result is not None:
+            results.append(result)
+    return results
+
+
+def action_result_from_invocation_result(entry):
+    """Returns the ActionResult for one returnControlInvocationResults entry, or None."""
+    result = entry.get('apiResult')
+    if result is None:
+        return None
+    body = (result.get('responseBody') or {}).get('application/json', {}).get('body')
+    content_type, schema, data = parse_action_output(body)
+    return ActionResult(result.get('actionGroup'), result.get('apiPath'), content_type, schema, data)
+
+
+def action_results_from_events(events):
+    """
+    Returns the ActionResults of a turn from TraceCollector.events() pairs:
+    observations in trace events and results sent back for returned control.
+    """
+    extractor = ActionResultExtractor()
+    results = []
+    for kind, data in events:
+        if kind == RECORD_TRACE:
+            result = extractor.observe(data)
+            if result is not None:
+                results.append(result)
+        elif kind == RECORD_RETURN_CONTROL_RESULTS:
+            for entry in data:
+                result = action_result_from_invocation_result(entry)
+                if result is not None:
+                    results.append(result)
+    return results
+
+
+def to_dataframe(result):
+    """
+    Builds a DataFrame from a table ActionResult, one typed column at a time.
+    Returns None for results that are not tables.
+    """
+    if result.content_type != TABLE_CONTENT_TYPE:
+        return None
+    # Imported here: invoke_agent's Lambda handler uses this module without pandas
+    import pandas as pd
+
+    columns = {}
+    for field in result.schema:
+        name = field["name"]
+        dtype = _PANDAS_DTYPES.get(field.get("type"), "object")
+        columns[name] = pd.Series(result.data.get(name, []), dtype=dtype, name=name)
+    return pd.DataFrame(columns)
@@ -1,12 +1,30 @@
 import invoke_agent as agenthelper
 import streamlit as st
-import json
+import io
+import os
+import codecs
+import time
+import altair as alt
 import pandas as pd
 from PIL import Image, ImageOps, ImageDraw
+from event_stream import ChunkEvent, ReturnControlEvent, ReturnControlResultsEvent, TraceEvent
+from trace_collector import TraceCollector
+from session_manager import ServerBusy, SessionBusy, session_manager_from_env
+from history import ANSWER_TABLE, decode_answer, decode_table, history_from_env
+from action_results import action_results_from_events, to_dataframe
+import telemetry
 
 # Streamlit page configuration
 st.set_page_config(page_title="Co. Portfolio Creator", page_icon=":robot_face:", layout="wide")
 
+# Avatar images live next to this file unless APP_ASSET_DIR points elsewhere
+ASSET_DIR = os.environ.get("APP_ASSET_DIR", os.path.dirname(os.path.abspath(__file__)))
+
+# Only the newest HISTORY_WINDOW turns are drawn with full widgets on every
+# rerun; older turns are drawn on request, HISTORY_PAGE_SIZE at a time
+HISTORY_WINDOW = int(os.environ.get("APP_HISTORY_WINDOW", 10))
+HISTORY_PAGE_SIZE = int(os.environ.get("APP_HISTORY_PAGE_SIZE", 20))
+
 # Function to crop image into a circle
 def crop_to_circle(image):
     mask = Image.new('L', image.size, 0)
@@ -16,6 +34,20 @@ def crop_to_circle(image):
     result.putalpha(mask)
     return result
 
+# Circular avatar rendered once per server process and kept as PNG bytes, so
+# reruns neither reopen the file nor redo the crop. It is rendered at the exact
+# width it is shown at: st.image decodes, resizes and re-encodes any image
+# wider than the requested width on every call.
+@st.cache_resource
+def load_avatar(filename, width):
+    with Image.open(os.path.join(ASSET_DIR, filename)) as image:
+        image = image.convert("RGB")
+        image.thumbnail((width, width))
+        avatar = crop_to_circle(image)
+    buffer = io.BytesIO()
+    avatar.save(buffer, format="PNG", optimize=True)
+    return buffer.getvalue()
+
 # Title
 st.title("Co. Portfolio Creator")
 
@@ -32,99 +64,262 @@ end_session_button = st.button("End Session")
 # Sidebar for user input
 st.sidebar.title("Trace Data")
 
+# Repeated questions are answered from the response cache unless bypassed
+response_cache = agenthelper.get_response_cache()
+bypass_cache = st.sidebar.checkbox("Bypass response cache", value=False, disabled=response_cache is None)
+
+# One session manager per server process, shared by every browser session.
+# It caps concurrent agent calls and ends idle agent sessions in the background.
+@st.cache_resource
+def get_session_manager():
+    manager = session_manager_from_env(agenthelper.end_session)
+    # Enough pooled connections for every allowed in-flight call
+    agenthelper.configure_client(pool_maxsize=manager.max_in_flight)
+    return manager
+
+session_manager = get_session_manager()
+
 # Session State Management
 if 'history' not in st.session_state:
-    st.session_state['history'] = []
+    st.session_state['history'] = history_from_env()
+
+# Each browser session talks to its own agent session. Every rerun marks it
+# as used; one that was ended as idle in the meantime is replaced, and the
+# user is told the agent no longer remembers the conversation
+if 'agent_session_id' not in st.session_state:
+    st.session_state['agent_session_id'] = session_manager.new_session()
+elif not session_manager.touch(st.session_state['agent_session_id']):
+    if response_cache is not None:
+        response_cache.end_session(st.session_state['agent_session_id'])
+    st.session_state['agent_session_id'] = session_manager.new_session()
+    st.info(
+        f"Your conversation was ended after {session_manager.idle_timeout / 60:.0f} minutes without activity. "
+        "Ask a question to start a new one."
+    )
+agent_session_id = st.session_state['agent_session_id']
 
-# Function to parse and format response
-def format_response(response_body):
+# Tables returned by action groups this turn, built from the typed results
+# in the trace (or run locally for returned control) rather than parsed out
+# of the answer text
+def result_tables(collector):
+    tables = []
+    for result in action_results_from_events(collector.events()):
+        frame = to_dataframe(result)
+        if frame is not None:
+            tables.append(frame)
+    return tables
+
+# Turn the streamed agent events into answer text for st.write_stream, while
+# trace events are written to the sidebar as they arrive
+def stream_answer(question, timings, queue_notice):
+    turn, token = telemetry.start_turn("agent.turn", source="app")
+    timings['turn'] = turn
     try:
-        # Try to load the response as JSON
-        data = json.loads(response_body)
-        # If it's a list, convert it to a DataFrame for better visualization
-        if isinstance(data, list):
-            return pd.DataFrame(data)
-        else:
-            return response_body
-    except json.JSONDecodeError:
-        # If response is not JSON, return as is
-        return response_body
+        yield from _stream_answer(question, timings, queue_notice)
+    finally:
+        telemetry.end_turn(turn, token)
+
+def _stream_answer(question, timings, queue_notice):
+    timings['start'] = time.monotonic()
+    if response_cache is not None and not bypass_cache:
+        cached = agenthelper.lookup_cached_answer(response_cache, question, agent_session_id)
+        if cached is not None:
+            timings['cached'] = True
+            timings['first_token'] = timings['end'] = time.monotonic()
+            collector, cached_answer = cached
+            for trace in collector.traces():
+                st.sidebar.json(trace, expanded=False)
+            st.session_state['trace_data'] = collector
+            yield cached_answer
+            return
+
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    # One collector per turn: concurrent sessions never share trace state
+    collector = TraceCollector()
+    answer = []
+    completed = False
+    # Time spent in st.write_stream between our yields, i.e. rendering
+    render_seconds = 0.0
+    # Wait for a free agent call slot, telling the user where they are in the queue
+    def show_queue_position(position):
+        queue_notice.info(f"The agent is busy right now. Your question is number {position} in line...")
+
+    try:
+        with session_manager.slot(agent_session_id, on_wait=show_queue_position):
+            queue_notice.empty()
+            for event in agenthelper.askQuestion_stream(question, agenthelper.agent_url(agent_session_id)):
+                collector.record(event)
+                if isinstance(event, ChunkEvent):
+                    text = decoder.decode(event.bytes)
+                    if text:
+                        if 'first_token' not in timings:
+                            timings['first_token'] = time.monotonic()
+                        answer.append(text)
+                        yielded = time.monotonic()
+                        yield text
+                        render_seconds += time.monotonic() - yielded
+                elif isinstance(event, TraceEvent):
+                    st.sidebar.json(event.trace, expanded=False)
+                elif isinstance(event, (ReturnControlEvent, ReturnControlResultsEvent)):
+                    # Actions the agent handed back, and their local results
+                    st.sidebar.json(event._asdict(), expanded=False)
+        tail = decoder.decode(b'', final=True)
+        if tail:
+            answer.append(tail)
+            yield tail
+        completed = True
+    finally:
+        timings['end'] = time.monotonic()
+        turn = timings.get('turn')
+        if turn is not None:
+            if 'first_token' in timings:
+                turn.add_span("app.first_token", timings['start'], timings['first_token'])
+            turn.add_span("app.render", timings['start'], timings['end'], renderMs=round(render_seconds * 1000, 3))
+        st.session_state['trace_data'] = collector
+        # Only complete answers are cached, never one cut short by an error
+        if response_cache is not None:
+            agenthelper.record_answer(
+                response_cache, question, agent_session_id, collector, "".join(answer) if completed else None
+            )
+
+# Per-turn latency waterfall: one bar per span, from its start to its end
+def show_latency_waterfall(turn):
+    rows = turn.waterfall()
+    if not rows:
+        return
+    spans = pd.DataFrame(rows)[["name", "start_ms", "duration_ms"]]
+    spans["end_ms"] = spans["start_ms"] + spans["duration_ms"]
+    chart = alt.Chart(spans).mark_bar().encode(
+        x=alt.X("start_ms", title="ms since question"),
+        x2="end_ms",
+        y=alt.Y("name", sort=None, title=None),
+        tooltip=["name", alt.Tooltip("start_ms", format=".1f"), alt.Tooltip("duration_ms", format=".1f")]
+    )
+    st.sidebar.subheader("Latency")
+    st.sidebar.altair_chart(chart, use_container_width=True)
+    st.sidebar.caption(f"Total {turn.duration_ms:.0f} ms")
 
 # Handling user input and responses
 if submit_button and prompt:
-    event = {
-        "sessionId": "MYSESSION",
-        "question": prompt
-    }
-    response = agenthelper.lambda_handler(event, None)
-    
-    try:
-        # Parse the JSON string
-        if response and 'body' in response and response['body']:
-            response_data = json.loads(response['body'])
-            print("TRACE & RESPONSE DATA ->  ", response_data)
-        else:
-            print("Invalid or empty response received")
-    except json.JSONDecodeError as e:
-        print("JSON decoding error:", e)
-        response_data = None 
-    
+    timings = {}
+    queue_notice = st.empty()
     try:
-        # Extract the response and trace data
-        all_data = format_response(response_data['response'])
-        the_response = response_data['trace_data']
-    except:
-        all_data = "..." 
-        the_response = "Apologies, but an error occurred. Please rerun the application" 
-
-    # Use trace_data and formatted_response as needed
-    st.sidebar.text_area("", value=all_data, height=300)
-    st.session_state['history'].append({"question": prompt, "answer": the_response})
-    st.session_state['trace_data'] = the_response
-  
+        the_response = st.write_stream(stream_answer(prompt, timings, queue_notice))
+    except SessionBusy:
+        the_response = "Your previous question is still being answered. Please wait for it to finish."
+        st.warning(the_response)
+    except ServerBusy:
+        queue_notice.empty()
+        the_response = "The agent is handling too many questions right now. Please try again in a moment."
+        st.warning(the_response)
+    except Exception as e:
+        print("Agent invocation error:", e)
+        the_response = "Apologies, but an error occurred. Please rerun the application"
+
+    # Show how long the user waited for the first token and for the whole answer
+    metric_ttft, metric_total = st.columns(2)
+    if 'first_token' in timings:
+        metric_ttft.metric("Time to first token", f"{timings['first_token'] - timings['start']:.2f} s")
+    if 'end' in timings:
+        metric_total.metric("Total response time", f"{timings['end'] - timings['start']:.2f} s")
+    if timings.get('cached'):
+        st.caption("Answered from the response cache")
+    if timings.get('turn') is not None:
+        show_latency_waterfall(timings['turn'])
+
+    tables = []
+    if 'end' in timings:
+        tables = result_tables(st.session_state['trace_data'])
+        for table in tables:
+            st.dataframe(table)
+
+    if not isinstance(the_response, str):
+        the_response = "".join(str(part) for part in the_response)
+    st.session_state['history'].append(prompt, the_response, tables)
 
 if end_session_button:
-    st.session_state['history'].append({"question": "Session Ended", "answer": "Thank you for using AnyCompany Support Agent!"})
-    event = {
-        "sessionId": "MYSESSION",
-        "question": "placeholder to end session",
-        "endSession": True
-    }
-    agenthelper.lambda_handler(event, None)
+    st.session_state['history'].append("Session Ended", "Thank you for using AnyCompany Support Agent!")
+    # Ended in the background; this browser continues in a fresh agent session
+    session_manager.end(agent_session_id)
+    if response_cache is not None:
+        response_cache.end_session(agent_session_id)
+    st.session_state['agent_session_id'] = session_manager.new_session()
     st.session_state['history'].clear()
 
+manager_stats = session_manager.stats()
+st.sidebar.caption(
+    f"Agent sessions: {manager_stats['sessions']} active, {manager_stats['in_flight']} answering, "
+    f"{manager_stats['waiting']} waiting"
+)
+
+if response_cache is not None:
+    stats = response_cache.stats.as_dict()
+    st.sidebar.caption(
+        f"Response cache: {stats['hits']} hits, {stats['misses']} misses ({stats['hit_rate']:.0%} hit rate)"
+    )
+
 # Display conversation history
 st.write("## Conversation History")
 
-# Load images outside the loop to optimize performance
-human_image = Image.open('/home/ubuntu/app/streamlit_app/human_face.png')
-robot_image = Image.open('/home/ubuntu/app/streamlit_app/robot_face.jpg')
-circular_human_image = crop_to_circle(human_image)
-circular_robot_image = crop_to_circle(robot_image)
+# Cached across reruns and sessions, see load_avatar
+circular_human_image = load_avatar('human_face.png', 125)
+circular_robot_image = load_avatar('robot_face.jpg', 150)
+small_robot_image = load_avatar('robot_face.jpg', 100)
+
+history = st.session_state['history']
 
-for index, chat in enumerate(reversed(st.session_state['history'])):
+# Widget keys use the turn number, so a turn keeps its widgets as new turns arrive
+for chat in history.recent(HISTORY_WINDOW):
     # Creating columns for Question
     col1_q, col2_q = st.columns([2, 10])
     with col1_q:
         st.image(circular_human_image, width=125)
     with col2_q:
         # Generate a unique key for each question text area
-        st.text_area("Q:", value=chat["question"], height=68, key=f"question_{index}", disabled=True)
+        st.text_area("Q:", value=chat.question, height=68, key=f"question_{chat.turn}", disabled=True)
 
     # Creating columns for Answer
     col1_a, col2_a = st.columns([2, 10])
-    if isinstance(chat["answer"], pd.DataFrame):
+    if chat.answer_format == ANSWER_TABLE:
         with col1_a:
-            st.image(circular_robot_image, width=100)
+            st.image(small_robot_image, width=100)
         with col2_a:
             # Generate a unique key for each answer dataframe
-            st.dataframe(chat["answer"], key=f"answer_df_{index}")
+            st.dataframe(decode_answer(chat), key=f"answer_df_{chat.turn}")
     else:
         with col1_a:
             st.image(circular_robot_image, width=150)
         with col2_a:
             # Generate a unique key for each answer text area
-            st.text_area("A:", value=chat["answer"], height=100, key=f"answer_{index}")
+            st.text_area("A:", value=chat.answer, height=100, key=f"answer_{chat.turn}")
+    for number, table in enumerate(chat.tables):
+        with col2_a:
+            st.dataframe(decode_table(table), key=f"answer_table_{chat.turn}_{number}")
+
+# Older turns cost nothing until asked for. Not an st.expander: its contents
+# would still be built on every rerun, just hidden.
+older_turns = len(history) - HISTORY_WINDOW
+if older_turns > 0 and st.toggle(f"Show {older_turns} earlier turns", key="show_earlier_turns"):
+    pages = -(-older_turns // HISTORY_PAGE_SIZE)
+    page = 1
+    if pages > 1:
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1, key="history_page")
+    for chat in history.older(HISTORY_WINDOW, page - 1, HISTORY_PAGE_SIZE):
+        st.caption(f"Q{chat.turn + 1}: {chat.question}")
+        if chat.answer_format == ANSWER_TABLE:
+            st.dataframe(decode_answer(chat))
+        else:
+            st.text(chat.answer)
+        for table in chat.tables:
+            st.dataframe(decode_table(table))
+if history.dropped_turns:
+    st.caption(f"{history.dropped_turns} of the oldest turns were dropped to keep this session's history small.")
+
+# Example prompt tables are turned into DataFrames once per server process;
+# only the name is hashed, the rows are the constant lists below
+@st.cache_resource
+def prompt_table(name, _rows):
+    return pd.DataFrame(_rows)
 
 # Example Prompts Section
 st.write("## Test Knowledge Base Prompts")
@@ -138,7 +333,7 @@ knowledge_base_prompts = [
 ]
 
 # Displaying the Knowledge Base prompts as a table
-st.table(knowledge_base_prompts)
+st.table(prompt_table("knowledge_base", knowledge_base_prompts))
 
 # Test Action Group Prompts
 st.write("## Test Action Group Prompts")
@@ -151,7 +346,7 @@ action_group_prompts = [
 ]
 
 # Displaying the Action Group prompts as a table
-st.table(action_group_prompts)
+st.table(prompt_table("action_group", action_group_prompts))
 
 st.write("## Test KB, AG, History Prompt")
 
@@ -162,4 +357,4 @@ task_prompts = [
 ]
 
 # Displaying the task prompt as a table
-st.table(task_prompts)
+st.table(prompt_table("task", task_prompts))
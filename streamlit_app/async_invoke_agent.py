@@ -0,0 +1,245 @@
+"""
+Asyncio client for invoking a Bedrock Agent.
+
+Async counterpart of invoke_agent.py: same SigV4 signing and event-stream
+decoding, but requests run on an aiohttp session so many agent calls can be
+in flight from a single process. Requires aiohttp (listed in requirements.txt).
+
+Example:
+    async with AsyncAgentClient(agentId, agentAliasId, max_concurrency=8) as client:
+        async for result in client.invoke_many(questions, session_ids):
+            print(result.session_id, result.response)
+"""
+import json
+import time
+import asyncio
+import contextlib
+from collections import namedtuple
+
+import aiohttp
+
+from event_stream import (
+    AgentStreamError,
+    ChunkEvent,
+    ErrorEvent,
+    TraceEvent,
+    aiter_agent_events,
+    final_response_from_trace,
+)
+from sigv4_client import RETRY_STATUS_CODES, AgentRequestError, SigV4Signer
+
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT = 300
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+
+# One finished agent call from invoke_many. error is None on success.
+AgentResult = namedtuple('AgentResult', ['session_id', 'question', 'response', 'traces', 'error', 'latency'])
+
+
+class AsyncAgentClient:
+    """
+    Asyncio client for Bedrock Agent InvokeAgent calls.
+
+    At most max_concurrency calls are in flight at once; extra calls wait on a
+    semaphore. Each call has its own timeout and can be cancelled like any
+    other asyncio task, which closes its connection.
+    """
+
+    def __init__(
+        self,
+        agent_id,
+        agent_alias_id,
+        region='us-west-2',
+        endpoint_url=None,
+        max_concurrency=DEFAULT_MAX_CONCURRENCY,
+        timeout=DEFAULT_TIMEOUT,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+        signer=None
+    ):
+        """
+        Args:
+            agent_id: The Bedrock Agent ID.
+            agent_alias_id: The agent alias ID.
+            region: The AWS region. Defaults to 'us-west-2'.
+            endpoint_url: Override for the agent runtime endpoint (e.g. a local fake).
+            max_concurrency: Maximum number of agent calls in flight.
+            timeout: Default per-call timeout in seconds, covering the whole turn.
+            max_retries: Retries for connection errors and timeouts before a
+                response, throttling and transient gateway errors.
+            backoff_factor: Exponential backoff factor between retries (seconds).
+            signer: SigV4Signer to use. Defaults to a new one.
+        """
+        self.agent_id = agent_id
+        self.agent_alias_id = agent_alias_id
+        self.region = region
+        self.endpoint_url = endpoint_url or f'https://bedrock-agent-runtime.{region}.amazonaws.com'
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.signer = signer or SigV4Signer()
+        self._max_concurrency = max_concurrency
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self._session = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self._max_concurrency, keepalive_timeout=60)
+        self._session = aiohttp.ClientSession(connector=connector)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        """Closes the underlying aiohttp session and its connections."""
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    def agent_url(self, sessionId):
+        """Builds the InvokeAgent URL for the given session."""
+        return f'{self.endpoint_url}/agents/{self.agent_id}/agentAliases/{self.agent_alias_id}/sessions/{sessionId}/text'
+
+    async def ask_question_stream(self, question, sessionId, endSession=False, streamFinalResponse=True):
+        """
+        Async generator yielding ChunkEvent, TraceEvent and ReturnControlEvent
+        objects as they are decoded. Holds one concurrency slot until the
+        stream is exhausted or the generator is closed.
+
+        Raises:
+            AgentRequestError: If the runtime answers with a non-200 status.
+            AgentStreamError: If the runtime sends an exception frame.
+        """
+        async with self._semaphore:
+            async for event in self._stream_events(question, sessionId, endSession, streamFinalResponse):
+                yield event
+
+    async def ask_question(self, question, sessionId, endSession=False, timeout=None):
+        """
+        Asks one question and returns (final_response, trace_events).
+
+        Args:
+            question: The user input text.
+            sessionId: The agent session ID.
+            endSession: Whether to end the agent session after this turn.
+            timeout: Seconds for the whole call. Defaults to the client timeout.
+        Raises:
+            asyncio.TimeoutError: If the call does not finish in time.
+        """
+        # The timeout starts once a concurrency slot is free, so time spent
+        # queued behind other calls does not count against it.
+        async with self._semaphore:
+            return await asyncio.wait_for(
+                self._collect(question, sessionId, endSession),
+                timeout or self.timeout
+            )
+
+    async def invoke_many(self, questions, session_ids, timeout=None):
+        """
+        Runs many questions concurrently (bounded by max_concurrency) and
+        yields an AgentResult for each one as soon as it completes. Failures
+        and timeouts are reported in AgentResult.error instead of raised, so
+        one bad call does not stop the batch.
+
+        Args:
+            questions: Iterable of question strings.
+            session_ids: Iterable of session IDs, one per question.
+            timeout: Per-call timeout in seconds. Defaults to the client timeout.
+        """
+        tasks = [
+            asyncio.ensure_future(self._invoke_one(question, sessionId, timeout))
+            for question, sessionId in zip(questions, session_ids)
+        ]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield await next_done
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _invoke_one(self, question, sessionId, timeout):
+        start = time.monotonic()
+        try:
+            response, traces = await self.ask_question(question, sessionId, timeout=timeout)
+            return AgentResult(sessionId, question, response, traces, None, time.monotonic() - start)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            return AgentResult(sessionId, question, None, [], "Timed out", time.monotonic() - start)
+        except Exception as e:
+            return AgentResult(sessionId, question, None, [], str(e), time.monotonic() - start)
+
+    async def _stream_events(self, question, sessionId, endSession, streamFinalResponse):
+        if self._session is None:
+            raise RuntimeError("AsyncAgentClient must be used with 'async with' or opened via __aenter__")
+
+        myobj = {
+            "inputText": question,
+            "enableTrace": True,
+            "endSession": endSession
+        }
+        if streamFinalResponse:
+            myobj["streamingConfigurations"] = {"streamFinalResponse": True}
+
+        response = await self._send(self.agent_url(sessionId), json.dumps(myobj))
+        try:
+            async for event in aiter_agent_events(response.content.iter_any()):
+                if isinstance(event, ErrorEvent):
+                    raise AgentStreamError(event.error_type, event.message)
+                yield event
+        finally:
+            response.release()
+
+    async def _collect(self, question, sessionId, endSession):
+        answer_chunks = []
+        traces = []
+        trace_final_response = None
+        # aclosing releases the connection right away when the call times out
+        # or is cancelled mid-stream.
+        events = self._stream_events(question, sessionId, endSession, streamFinalResponse=False)
+        async with contextlib.aclosing(events):
+            async for event in events:
+                if isinstance(event, ChunkEvent):
+                    answer_chunks.append(event.bytes)
+                elif isinstance(event, TraceEvent):
+                    traces.append(event.trace)
+                    trace_final_response = final_response_from_trace(event) or trace_final_response
+
+        if answer_chunks:
+            return b"".join(answer_chunks).decode('utf-8'), traces
+        return trace_final_response or "", traces
+
+    async def _send(self, url, body):
+        headers = {
+            'content-type': 'application/json',
+            'accept': 'application/json',
+        }
+        attempt = 0
+        while True:
+            # Re-sign every attempt so the signature timestamp stays fresh.
+            prepared_req = self.signer.sign(url, 'POST', body, None, headers, 'bedrock', self.region)
+            try:
+                response = await self._session.request(
+                    prepared_req.method,
+                    prepared_req.url,
+                    headers=dict(prepared_req.headers),
+                    data=prepared_req.body
+                )
+            except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                # No response yet, so the turn has not started: retry like
+                # the sync client does for connection errors
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+                attempt += 1
+                continue
+            if response.status == 200:
+                return response
+
+            message = await response.text()
+            response.release()
+            if response.status not in RETRY_STATUS_CODES or attempt >= self.max_retries:
+                raise AgentRequestError(response.status, message)
+            await asyncio.sleep(self.backoff_factor * (2 ** attempt))
+            attempt += 1
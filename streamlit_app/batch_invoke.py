@@ -0,0 +1,531 @@
+"""
+Batch runner for agent questions, e.g. nightly evaluation sets.
+
+Runs many {sessionId, question} items through the same code path as
+invoke_agent.lambda_handler, from a bounded thread pool sharing one
+SigV4Client of its own, so the process-wide client used for single
+questions keeps its settings. Items of the same session are turns of one
+conversation: they run one after another, in input order, in one worker,
+while different sessions run concurrently. Results are written to a sink as
+they finish, one JSON line per item:
+
+  * JsonlSink: a local JSONL file, appended and flushed per result,
+  * S3Sink: numbered JSONL part objects under an s3://bucket/prefix/
+    (any S3-compatible store via AWS_ENDPOINT_URL_S3).
+
+The sink is also the checkpoint: with resume, items that already have a
+successful result in it are skipped, so an interrupted run (or a Lambda
+invocation that ran out of time) is continued by running the same batch
+again.
+
+Each item has a deadline covering the whole turn. Throttling (HTTP 429 or
+a throttlingException frame), transient gateway and service errors,
+connection errors and timeouts are retried with exponential backoff and
+full jitter, up to max_attempts per item, but only when the attempt failed
+before any event of the turn arrived. Once part of the turn was streamed
+the agent session may already hold it, so asking again in the same session
+would add the question twice; such items fail instead.
+
+Example:
+    stats = run_batch(read_items("questions.jsonl"), JsonlSink("results.jsonl"), max_concurrency=16)
+    print(stats._asdict())
+
+Or from the command line:
+    python streamlit_app/batch_invoke.py questions.jsonl --output s3://bucket/results/ --concurrency 16
+"""
+import os
+import json
+import time
+import uuid
+import random
+import argparse
+import threading
+from collections import OrderedDict, namedtuple
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import requests
+
+import invoke_agent
+import telemetry
+from action_results import action_results_from_events
+from event_stream import AgentStreamError
+from sigv4_client import DEFAULT_READ_TIMEOUT, RETRY_STATUS_CODES, AgentRequestError, SigV4Client
+from trace_collector import TraceCollector
+
+# ---------------------------------------------------------------------
+# DEFAULTS
+# ---------------------------------------------------------------------
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_ITEM_TIMEOUT = 300
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF_BASE = 1.0
+DEFAULT_BACKOFF_MAX = 30.0
+DEFAULT_S3_PART_SIZE = 100
+# Stop starting items when less than this is left of the Lambda invocation
+LAMBDA_TIME_MARGIN = 10
+
+# Exception frames worth asking again
+RETRYABLE_ERROR_TYPES = ("throttlingException", "internalServerException", "serviceUnavailableException")
+
+STATUS_OK = "ok"
+STATUS_FAILED = "failed"
+STATUS_TIMEOUT = "timeout"
+
+# One question of a batch. item_id identifies it in the results and the checkpoint.
+BatchItem = namedtuple('BatchItem', ['item_id', 'session_id', 'question', 'end_session'])
+
+# The outcome of one item, as written to the sink. response is the final
+# answer, action_results the typed action group results (dicts), error the
+# last error text; latency_ms covers all attempts.
+BatchResult = namedtuple('BatchResult', [
+    'item_id', 'session_id', 'question', 'status', 'response', 'action_results', 'error', 'attempts', 'latency_ms'
+])
+
+# Aggregate figures of a run_batch call. pending counts items not started
+# because the run was stopped (stop_at); latencies are of successful items.
+BatchStats = namedtuple('BatchStats', [
+    'items', 'skipped', 'succeeded', 'failed', 'timed_out', 'pending', 'retries', 'throttled',
+    'wall_seconds', 'items_per_second', 'latency_p50_ms', 'latency_p95_ms', 'latency_p99_ms', 'latency_max_ms'
+])
+
+
+class ItemTimeout(Exception):
+    """The item's deadline passed before the agent finished the turn."""
+
+
+# ---------------------------------------------------------------------
+# ITEMS
+# ---------------------------------------------------------------------
+def batch_items(entries):
+    """
+    Builds BatchItems from dicts with sessionId and question (and optionally
+    id and endSession). Items without an id are numbered by position.
+    """
+    items = []
+    for index, entry in enumerate(entries):
+        items.append(BatchItem(
+            str(entry.get("id", index)),
+            entry["sessionId"],
+            entry["question"],
+            str(entry.get("endSession", "false")).lower() == "true"
+        ))
+    return items
+
+
+def group_by_session(items):
+    """Splits items into one list per session, each in input order, sessions in order of first appearance."""
+    sessions = OrderedDict()
+    for item in items:
+        sessions.setdefault(item.session_id, []).append(item)
+    return list(sessions.values())
+
+
+def read_items(uri):
+    """Reads BatchItems from a JSONL file or s3://bucket/key object, one dict per line."""
+    if uri.startswith("s3://"):
+        bucket, key = split_s3_uri(uri)
+        text = s3_client().get_object(Bucket=bucket, Key=key)["Body"].read().decode("utf-8")
+    else:
+        with open(uri) as f:
+            text = f.read()
+    return batch_items(json.loads(line) for line in text.splitlines() if line.strip())
+
+
+# ---------------------------------------------------------------------
+# SINKS
+# ---------------------------------------------------------------------
+def split_s3_uri(uri):
+    bucket, _, key = uri[len("s3://"):].partition("/")
+    return bucket, key
+
+
+_s3 = None
+
+
+def s3_client():
+    global _s3
+    if _s3 is None:
+        import boto3
+        _s3 = boto3.client("s3")
+    return _s3
+
+
+def completed_item_ids(lines):
+    """item_ids with a successful result in JSONL lines. Partly written lines are ignored."""
+    done = set()
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue
+        if record.get("status") == STATUS_OK:
+            done.add(record["item_id"])
+    return done
+
+
+class JsonlSink:
+    """Appends results to a local JSONL file, flushed after every line."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self._lock = threading.Lock()
+
+    def completed(self):
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path) as f:
+            return completed_item_ids(f)
+
+    def write(self, result):
+        line = json.dumps(result._asdict()) + "\n"
+        with self._lock:
+            if self._file is None:
+                self._file = open(self.path, "a+")
+                # Start on a new line if an earlier run died mid-write
+                if self._file.tell():
+                    self._file.seek(self._file.tell() - 1)
+                    if self._file.read(1) != "\n":
+                        self._file.write("\n")
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class S3Sink:
+    """
+    Writes results as JSONL part objects under prefix, a part per
+    part_size results (and one for the rest on close). Objects cannot be
+    appended to, so results not yet in a part are lost if the process dies;
+    resume runs those items again.
+    """
+
+    def __init__(self, bucket, prefix, part_size=DEFAULT_S3_PART_SIZE, s3=None):
+        self.bucket = bucket
+        self.prefix = prefix
+        self.part_size = part_size
+        self.s3 = s3 or s3_client()
+        # Parts of different runs never overwrite each other
+        self._run_id = time.strftime("%Y%m%dT%H%M%S") + "-" + uuid.uuid4().hex[:8]
+        self._parts = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+
+    def completed(self):
+        done = set()
+        for page in self.s3.get_paginator("list_objects_v2").paginate(Bucket=self.bucket, Prefix=self.prefix):
+            for item in page.get("Contents", ()):
+                if item["Key"].endswith(".jsonl"):
+                    body = self.s3.get_object(Bucket=self.bucket, Key=item["Key"])["Body"].read()
+                    done |= completed_item_ids(body.decode("utf-8").splitlines())
+        return done
+
+    def write(self, result):
+        with self._lock:
+            self._buffer.append(json.dumps(result._asdict()))
+            if len(self._buffer) >= self.part_size:
+                self._flush()
+
+    def close(self):
+        with self._lock:
+            self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        self._parts += 1
+        body = ("\n".join(self._buffer) + "\n").encode("utf-8")
+        key = f"{self.prefix}part-{self._run_id}-{self._parts:05d}.jsonl"
+        self.s3.put_object(Bucket=self.bucket, Key=key, Body=body, ContentType="application/x-ndjson")
+        self._buffer = []
+
+
+class ListSink:
+    """Keeps results in memory, e.g. to return them from a small Lambda batch."""
+
+    def __init__(self):
+        self.results = []
+        self._lock = threading.Lock()
+
+    def completed(self):
+        return set()
+
+    def write(self, result):
+        with self._lock:
+            self.results.append(result)
+
+    def close(self):
+        pass
+
+
+def sink_from_uri(uri, part_size=DEFAULT_S3_PART_SIZE):
+    """S3Sink for s3://bucket/prefix/, JsonlSink for anything else."""
+    if uri.startswith("s3://"):
+        bucket, prefix = split_s3_uri(uri)
+        return S3Sink(bucket, prefix, part_size)
+    return JsonlSink(uri)
+
+
+# ---------------------------------------------------------------------
+# RUN
+# ---------------------------------------------------------------------
+def is_retryable(error):
+    """Returns (retryable, throttled) for an exception raised by an attempt."""
+    if isinstance(error, AgentRequestError):
+        return error.status in RETRY_STATUS_CODES, error.status == 429
+    if isinstance(error, (ItemTimeout, requests.ConnectionError, requests.Timeout)):
+        return True, False
+    if isinstance(error, AgentStreamError):
+        return error.error_type in RETRYABLE_ERROR_TYPES, error.error_type == "throttlingException"
+    return False, False
+
+
+def backoff_delay(attempt, base=DEFAULT_BACKOFF_BASE, cap=DEFAULT_BACKOFF_MAX):
+    """Full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def ask_with_deadline(item, deadline, client, progress):
+    """
+    One attempt at an item: (collector, final_response), or ItemTimeout once
+    deadline passes. progress["events"] counts the events received.
+    """
+    events = invoke_agent.iter_turn_events(
+        item.question, invoke_agent.agent_url(item.session_id), item.end_session, client=client
+    )
+
+    def bounded():
+        for event in events:
+            if time.monotonic() > deadline:
+                raise ItemTimeout("No answer within the item timeout")
+            progress["events"] += 1
+            yield event
+
+    try:
+        with telemetry.turn("agent.turn", endSession=item.end_session, batch=True):
+            return invoke_agent.decode_events(bounded(), TraceCollector())
+    finally:
+        # Closes the response if the turn was cut short
+        events.close()
+
+
+def run_item(item, item_timeout, max_attempts, backoff_base, counters, client):
+    """
+    Asks one item, retrying retryable errors that happened before any event
+    of the turn arrived. Returns its BatchResult.
+    """
+    start = time.monotonic()
+    error = None
+    status = STATUS_FAILED
+    for attempt in range(max_attempts):
+        if attempt:
+            with counters["lock"]:
+                counters["retries"] += 1
+        deadline = time.monotonic() + item_timeout
+        progress = {"events": 0}
+        try:
+            collector, final_response = ask_with_deadline(item, deadline, client, progress)
+        except Exception as e:
+            error = e
+            retryable, throttled = is_retryable(e)
+            # Part of the turn was streamed: the session may already hold it
+            retryable = retryable and not progress["events"]
+            if throttled:
+                with counters["lock"]:
+                    counters["throttled"] += 1
+            # A read timeout mid-stream surfaces as a ConnectionError
+            timed_out = isinstance(e, (ItemTimeout, requests.Timeout)) or time.monotonic() >= deadline
+            status = STATUS_TIMEOUT if timed_out else STATUS_FAILED
+            if not retryable or attempt + 1 >= max_attempts:
+                break
+            time.sleep(backoff_delay(attempt, backoff_base))
+            continue
+        action_results = [result._asdict() for result in action_results_from_events(collector.events())]
+        return BatchResult(item.item_id, item.session_id, item.question, STATUS_OK, final_response,
+                           action_results, None, attempt + 1, round((time.monotonic() - start) * 1000, 3))
+    return BatchResult(item.item_id, item.session_id, item.question, status, None, [],
+                       f"{type(error).__name__}: {error}", attempt + 1, round((time.monotonic() - start) * 1000, 3))
+
+
+def run_session(items, item_timeout, max_attempts, backoff_base, counters, client, sink, stop_at=None):
+    """
+    Asks the items of one session in order, writing each BatchResult to sink
+    as it finishes. Returns (results, pending), pending being the items not
+    started because stop_at passed.
+    """
+    results = []
+    for index, item in enumerate(items):
+        if stop_at is not None and time.monotonic() >= stop_at:
+            return results, len(items) - index
+        result = run_item(item, item_timeout, max_attempts, backoff_base, counters, client)
+        sink.write(result)
+        results.append(result)
+    return results, 0
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def run_batch(
+    items,
+    sink,
+    max_concurrency=DEFAULT_MAX_CONCURRENCY,
+    item_timeout=DEFAULT_ITEM_TIMEOUT,
+    max_attempts=DEFAULT_MAX_ATTEMPTS,
+    backoff_base=DEFAULT_BACKOFF_BASE,
+    resume=True,
+    stop_at=None
+):
+    """
+    Runs BatchItems and writes a BatchResult per item to sink as each
+    finishes. The items of a session run in order, one at a time. Returns
+    BatchStats.
+
+    Args:
+        items: BatchItems, see batch_items and read_items.
+        sink: JsonlSink, S3Sink or ListSink. Closed when the run ends.
+        max_concurrency: Sessions in flight at once. The run gets its own
+            client with a connection pool of this size, no retries of its
+            own and a read timeout of at most item_timeout.
+        item_timeout: Seconds for one attempt at an item, whole turn included.
+        max_attempts: Attempts per item, including the first.
+        backoff_base: Base of the exponential backoff between attempts (seconds).
+        resume: Skip items that already have a successful result in sink.
+        stop_at: time.monotonic() after which no new item is started
+            (e.g. shortly before a Lambda invocation times out). Later
+            items of a session already running count as pending too.
+    """
+    started = time.monotonic()
+    done = sink.completed() if resume else set()
+    todo = [item for item in items if item.item_id not in done]
+    # Retries are done per item here, so the client does not retry as well
+    client = SigV4Client(
+        pool_maxsize=max(max_concurrency, 1),
+        max_retries=0,
+        read_timeout=min(DEFAULT_READ_TIMEOUT, item_timeout)
+    )
+
+    counters = {"lock": threading.Lock(), "retries": 0, "throttled": 0}
+    results = []
+    pending = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="batch") as pool:
+            queue = iter(group_by_session(todo))
+            running = set()
+            while True:
+                # Keep max_concurrency sessions submitted, so a stop request
+                # leaves the rest unstarted instead of queued in the pool
+                while len(running) < max_concurrency:
+                    if stop_at is not None and time.monotonic() >= stop_at:
+                        break
+                    session_items = next(queue, None)
+                    if session_items is None:
+                        break
+                    running.add(pool.submit(
+                        run_session, session_items, item_timeout, max_attempts, backoff_base, counters, client,
+                        sink, stop_at
+                    ))
+                if not running:
+                    break
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    session_results, session_pending = future.result()
+                    results.extend(session_results)
+                    pending += session_pending
+            pending += sum(len(session_items) for session_items in queue)
+    finally:
+        sink.close()
+        client.close()
+
+    wall_seconds = time.monotonic() - started
+    latencies = sorted(result.latency_ms for result in results if result.status == STATUS_OK)
+    return BatchStats(
+        items=len(items),
+        skipped=len(items) - len(todo),
+        succeeded=len(latencies),
+        failed=sum(1 for result in results if result.status == STATUS_FAILED),
+        timed_out=sum(1 for result in results if result.status == STATUS_TIMEOUT),
+        pending=pending,
+        retries=counters["retries"],
+        throttled=counters["throttled"],
+        wall_seconds=round(wall_seconds, 3),
+        items_per_second=round(len(results) / wall_seconds, 3) if wall_seconds else None,
+        latency_p50_ms=percentile(latencies, 0.50),
+        latency_p95_ms=percentile(latencies, 0.95),
+        latency_p99_ms=percentile(latencies, 0.99),
+        latency_max_ms=latencies[-1] if latencies else None,
+    )
+
+
+def handle_batch_event(event, context=None):
+    """
+    The batch form of invoke_agent.lambda_handler. The event carries the
+    items inline ("items": [{"sessionId", "question", "id"?, "endSession"?}])
+    or as a JSONL object ("input": "s3://bucket/key.jsonl"), and optionally:
+
+        output          s3://bucket/prefix/ or a file path for the results;
+                        without it the results are returned in the body
+        maxConcurrency  sessions in flight (default 8)
+        itemTimeout     seconds per attempt (default 300)
+        maxAttempts     attempts per item (default 4)
+        resume          skip items already answered in output (default true)
+
+    Stops starting items LAMBDA_TIME_MARGIN seconds before the invocation
+    times out; the body's stats report them as pending, and invoking again
+    with the same event continues the batch.
+    """
+    items = batch_items(event["items"]) if "items" in event else read_items(event["input"])
+    output = event.get("output")
+    sink = sink_from_uri(output) if output else ListSink()
+    stop_at = None
+    if context is not None and hasattr(context, "get_remaining_time_in_millis"):
+        stop_at = time.monotonic() + context.get_remaining_time_in_millis() / 1000 - LAMBDA_TIME_MARGIN
+
+    stats = run_batch(
+        items,
+        sink,
+        max_concurrency=int(event.get("maxConcurrency", DEFAULT_MAX_CONCURRENCY)),
+        item_timeout=float(event.get("itemTimeout", DEFAULT_ITEM_TIMEOUT)),
+        max_attempts=int(event.get("maxAttempts", DEFAULT_MAX_ATTEMPTS)),
+        resume=str(event.get("resume", "true")).lower() == "true",
+        stop_at=stop_at
+    )
+    body = {"stats": stats._asdict()}
+    if output:
+        body["output"] = output
+    else:
+        body["results"] = [result._asdict() for result in sink.results]
+    return body
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file or s3://bucket/key of {sessionId, question} items")
+    parser.add_argument("--output", required=True, help="JSONL file or s3://bucket/prefix/ for the results")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_MAX_CONCURRENCY)
+    parser.add_argument("--item-timeout", type=float, default=DEFAULT_ITEM_TIMEOUT)
+    parser.add_argument("--max-attempts", type=int, default=DEFAULT_MAX_ATTEMPTS)
+    parser.add_argument("--no-resume", action="store_true")
+    args = parser.parse_args()
+
+    stats = run_batch(
+        read_items(args.input),
+        sink_from_uri(args.output),
+        max_concurrency=args.concurrency,
+        item_timeout=args.item_timeout,
+        max_attempts=args.max_attempts,
+        resume=not args.no_resume
+    )
+    print(json.dumps(stats._asdict(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
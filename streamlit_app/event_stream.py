@@ -0,0 +1,346 @@
+import json
+import base64
+import struct
+import zlib
+from collections import namedtuple
+
+# ---------------------------------------------------------------------
+# EVENT STREAM FRAMING (application/vnd.amazon.eventstream)
+#
+# Every message on the wire looks like:
+#
+#   [total length: 4][headers length: 4][prelude crc: 4]
+#   [headers: headers length][payload: ...][message crc: 4]
+#
+# All integers are big-endian. The prelude CRC covers the first 8 bytes,
+# the message CRC covers everything except its own 4 bytes.
+# ---------------------------------------------------------------------
+PRELUDE_LENGTH = 12
+CRC_LENGTH = 4
+MIN_MESSAGE_LENGTH = PRELUDE_LENGTH + CRC_LENGTH
+MAX_MESSAGE_LENGTH = 24 * 1024 * 1024
+MAX_HEADERS_LENGTH = 128 * 1024
+
+_PRELUDE = struct.Struct('>III')
+_UINT32 = struct.Struct('>I')
+
+# Header value type codes. Fixed-size types are unpacked with the structs
+# below; variable length types (bytes, string) carry a 2 byte length prefix.
+HEADER_BOOL_TRUE = 0
+HEADER_BOOL_FALSE = 1
+HEADER_BYTE = 2
+HEADER_SHORT = 3
+HEADER_INTEGER = 4
+HEADER_LONG = 5
+HEADER_BYTES = 6
+HEADER_STRING = 7
+HEADER_TIMESTAMP = 8
+HEADER_UUID = 9
+
+_FIXED_HEADER_TYPES = {
+    HEADER_BYTE: struct.Struct('>b'),
+    HEADER_SHORT: struct.Struct('>h'),
+    HEADER_INTEGER: struct.Struct('>i'),
+    HEADER_LONG: struct.Struct('>q'),
+    HEADER_TIMESTAMP: struct.Struct('>q'),
+}
+_UINT16 = struct.Struct('>H')
+
+
+class EventStreamError(Exception):
+    """Raised when the byte stream is not valid event-stream framing."""
+
+
+class ChecksumMismatch(EventStreamError):
+    """Raised when a prelude or message CRC does not match its contents."""
+
+
+class AgentStreamError(RuntimeError):
+    """Raised for an exception frame (ErrorEvent) sent by the agent runtime."""
+
+    def __init__(self, error_type, message):
+        super().__init__(f"{error_type}: {message}")
+        self.error_type = error_type
+        self.message = message
+
+
+# A single decoded frame: headers dict (name -> value) and raw payload bytes.
+Message = namedtuple('Message', ['headers', 'payload'])
+
+# Typed Bedrock Agent events built on top of the raw frames.
+ChunkEvent = namedtuple('ChunkEvent', ['bytes', 'attribution'])
+TraceEvent = namedtuple('TraceEvent', ['trace'])
+ReturnControlEvent = namedtuple('ReturnControlEvent', ['invocation_id', 'invocation_inputs'])
+ErrorEvent = namedtuple('ErrorEvent', ['error_type', 'message'])
+# Not a wire event: the results the client sent back for a ReturnControlEvent,
+# yielded in stream order so they can be recorded with the rest of the turn.
+ReturnControlResultsEvent = namedtuple('ReturnControlResultsEvent', ['invocation_id', 'results'])
+
+
+# ---------------------------------------------------------------------
+# DECODER
+# ---------------------------------------------------------------------
+class EventStreamDecoder:
+    """
+    Incremental decoder for event-stream frames.
+
+    Feed it byte chunks of any size as they arrive from the network and it
+    returns the complete Message objects. Partial frames stay in an internal
+    bytearray until the rest arrives, so the work done per byte is constant
+    and memory is bounded by the largest single frame.
+    """
+
+    def __init__(self, max_message_length=MAX_MESSAGE_LENGTH):
+        self._buffer = bytearray()
+        self._max_message_length = max_message_length
+
+    def feed(self, data):
+        """
+        Appends data to the buffer and returns every complete message in it.
+
+        Args:
+            data: A bytes-like object with the next part of the stream.
+        Returns:
+            A list of Message tuples in stream order (possibly empty).
+        """
+        self._buffer += data
+        messages = []
+        offset = 0
+        while True:
+            message, consumed = self._parse_message(offset)
+            if message is None:
+                break
+            messages.append(message)
+            offset += consumed
+
+        # Dropping the consumed prefix of a bytearray is cheap in CPython;
+        # only the incomplete tail (at most one frame) is kept around.
+        if offset:
+            del self._buffer[:offset]
+        return messages
+
+    def close(self):
+        """Raises EventStreamError if the stream ended in the middle of a frame."""
+        if self._buffer:
+            raise EventStreamError(
+                f"Stream ended with {len(self._buffer)} bytes of an incomplete message"
+            )
+
+    @property
+    def pending_bytes(self):
+        return len(self._buffer)
+
+    def _parse_message(self, offset):
+        buffer = self._buffer
+        available = len(buffer) - offset
+        if available < PRELUDE_LENGTH:
+            return None, 0
+
+        total_length, headers_length, prelude_crc = _PRELUDE.unpack_from(buffer, offset)
+        if zlib.crc32(buffer[offset:offset + 8]) != prelude_crc:
+            raise ChecksumMismatch("Prelude checksum mismatch")
+        if total_length < MIN_MESSAGE_LENGTH or total_length > self._max_message_length:
+            raise EventStreamError(f"Invalid message length: {total_length}")
+        if headers_length > MAX_HEADERS_LENGTH or headers_length > total_length - MIN_MESSAGE_LENGTH:
+            raise EventStreamError(f"Invalid headers length: {headers_length}")
+        if available < total_length:
+            return None, 0
+
+        with memoryview(buffer) as view:
+            frame = view[offset:offset + total_length]
+            (message_crc,) = _UINT32.unpack_from(frame, total_length - CRC_LENGTH)
+            # The prelude CRC doubles as the running value for the message CRC.
+            if zlib.crc32(frame[8:total_length - CRC_LENGTH], prelude_crc) != message_crc:
+                raise ChecksumMismatch("Message checksum mismatch")
+
+            headers_end = PRELUDE_LENGTH + headers_length
+            headers = _decode_headers(frame[PRELUDE_LENGTH:headers_end])
+            payload = bytes(frame[headers_end:total_length - CRC_LENGTH])
+            frame.release()
+
+        return Message(headers, payload), total_length
+
+
+def _decode_headers(view):
+    headers = {}
+    position = 0
+    end = len(view)
+    while position < end:
+        name_length = view[position]
+        position += 1
+        name = bytes(view[position:position + name_length]).decode('utf-8')
+        position += name_length
+        value_type = view[position]
+        position += 1
+
+        if value_type == HEADER_BOOL_TRUE:
+            value = True
+        elif value_type == HEADER_BOOL_FALSE:
+            value = False
+        elif value_type in _FIXED_HEADER_TYPES:
+            fmt = _FIXED_HEADER_TYPES[value_type]
+            (value,) = fmt.unpack_from(view, position)
+            position += fmt.size
+        elif value_type in (HEADER_BYTES, HEADER_STRING):
+            (length,) = _UINT16.unpack_from(view, position)
+            position += 2
+            value = bytes(view[position:position + length])
+            position += length
+            if value_type == HEADER_STRING:
+                value = value.decode('utf-8')
+        elif value_type == HEADER_UUID:
+            value = bytes(view[position:position + 16])
+            position += 16
+        else:
+            raise EventStreamError(f"Unknown header value type: {value_type}")
+
+        if position > end:
+            raise EventStreamError("Header value runs past the end of the headers block")
+        headers[name] = value
+    return headers
+
+
+# ---------------------------------------------------------------------
+# ENCODER (used by local fakes and benchmarks)
+# ---------------------------------------------------------------------
+def encode_message(headers, payload):
+    """
+    Encodes one event-stream frame with string-typed headers.
+
+    Args:
+        headers: Mapping of header name -> string value.
+        payload: The payload bytes.
+    Returns:
+        The encoded frame as bytes.
+    """
+    encoded_headers = bytearray()
+    for name, value in headers.items():
+        name_bytes = name.encode('utf-8')
+        value_bytes = value.encode('utf-8')
+        encoded_headers.append(len(name_bytes))
+        encoded_headers += name_bytes
+        encoded_headers.append(HEADER_STRING)
+        encoded_headers += _UINT16.pack(len(value_bytes))
+        encoded_headers += value_bytes
+
+    total_length = PRELUDE_LENGTH + len(encoded_headers) + len(payload) + CRC_LENGTH
+    prelude = struct.pack('>II', total_length, len(encoded_headers))
+    prelude_crc = zlib.crc32(prelude)
+    frame = bytearray(prelude)
+    frame += _UINT32.pack(prelude_crc)
+    frame += encoded_headers
+    frame += payload
+    frame += _UINT32.pack(zlib.crc32(frame[8:], prelude_crc))
+    return bytes(frame)
+
+
+def encode_agent_event(event_type, body):
+    """Encodes a Bedrock Agent event (chunk, trace, returnControl) with a JSON body."""
+    return encode_message(
+        {
+            ':event-type': event_type,
+            ':content-type': 'application/json',
+            ':message-type': 'event',
+        },
+        json.dumps(body).encode('utf-8')
+    )
+
+
+def encode_chunk_event(text):
+    """Encodes a chunk event carrying text the same way the agent runtime does."""
+    return encode_agent_event('chunk', {'bytes': base64.b64encode(text.encode('utf-8')).decode('ascii')})
+
+
+def encode_error_event(error_type, message):
+    """Encodes a modeled exception frame."""
+    return encode_message(
+        {
+            ':exception-type': error_type,
+            ':content-type': 'application/json',
+            ':message-type': 'exception',
+        },
+        json.dumps({'message': message}).encode('utf-8')
+    )
+
+
+# ---------------------------------------------------------------------
+# BEDROCK AGENT EVENTS
+# ---------------------------------------------------------------------
+def to_agent_event(message):
+    """
+    Converts a raw Message into a typed Bedrock Agent event.
+
+    Returns ChunkEvent, TraceEvent, ReturnControlEvent or ErrorEvent, or None
+    for event types this client does not use.
+    """
+    headers = message.headers
+    message_type = headers.get(':message-type', 'event')
+
+    if message_type != 'event':
+        error_type = headers.get(':exception-type') or headers.get(':error-code') or 'UnknownError'
+        text = headers.get(':error-message')
+        if text is None:
+            try:
+                text = json.loads(message.payload).get('message', '')
+            except (ValueError, AttributeError):
+                text = message.payload.decode('utf-8', errors='replace')
+        return ErrorEvent(error_type, text)
+
+    event_type = headers.get(':event-type')
+    body = json.loads(message.payload) if message.payload else {}
+
+    if event_type == 'chunk':
+        return ChunkEvent(base64.b64decode(body.get('bytes', '')), body.get('attribution'))
+    if event_type == 'trace':
+        return TraceEvent(body)
+    if event_type == 'returnControl':
+        return ReturnControlEvent(body.get('invocationId'), body.get('invocationInputs', []))
+    return None
+
+
+def iter_agent_events(byte_chunks, decoder=None):
+    """
+    Decodes an iterable of raw byte chunks into typed Bedrock Agent events.
+
+    Args:
+        byte_chunks: Any iterable of bytes, e.g. response.iter_content(...).
+        decoder: Optional EventStreamDecoder to reuse.
+    Yields:
+        ChunkEvent, TraceEvent, ReturnControlEvent and ErrorEvent tuples.
+    """
+    if decoder is None:
+        decoder = EventStreamDecoder()
+    for data in byte_chunks:
+        if not data:
+            continue
+        for message in decoder.feed(data):
+            event = to_agent_event(message)
+            if event is not None:
+                yield event
+    decoder.close()
+
+
+async def aiter_agent_events(byte_chunks, decoder=None):
+    """
+    Async counterpart of iter_agent_events for an async iterable of byte
+    chunks, e.g. aiohttp's response.content.iter_any().
+    """
+    if decoder is None:
+        decoder = EventStreamDecoder()
+    async for data in byte_chunks:
+        if not data:
+            continue
+        for message in decoder.feed(data):
+            event = to_agent_event(message)
+            if event is not None:
+                yield event
+    decoder.close()
+
+
+def final_response_from_trace(trace_event):
+    """Returns orchestrationTrace.observation.finalResponse.text, or None."""
+    orchestration = trace_event.trace.get('trace', {}).get('orchestrationTrace', {})
+    final_response = orchestration.get('observation', {}).get('finalResponse')
+    if final_response:
+        return final_response.get('text')
+    return None
@@ -0,0 +1,121 @@
+import io
+import os
+from collections import deque, namedtuple
+
+import pandas as pd
+
+# ---------------------------------------------------------------------
+# DEFAULTS (override with environment variables, see history_from_env)
+# ---------------------------------------------------------------------
+DEFAULT_MAX_BYTES = 4 * 1024 * 1024
+DEFAULT_MAX_TURNS = 2000
+
+ANSWER_TEXT = "text"
+ANSWER_TABLE = "parquet"
+
+# One question/answer pair. turn is the 0-based turn number in the session,
+# answer is text or Parquet bytes depending on answer_format, tables holds
+# the Parquet bytes of any result tables shown with the answer, and size is
+# what the entry counts against the history memory cap.
+HistoryEntry = namedtuple('HistoryEntry', ['turn', 'question', 'answer', 'answer_format', 'tables', 'size'])
+
+
+def encode_table(frame):
+    """
+    Returns a DataFrame as Parquet bytes, which are several times smaller
+    than a live DataFrame, hold no references to pandas blocks and keep the
+    column dtypes.
+    """
+    buffer = io.BytesIO()
+    frame.to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+def decode_table(payload):
+    return pd.read_parquet(io.BytesIO(payload))
+
+
+def encode_answer(answer):
+    """Returns (payload, answer_format): DataFrames as Parquet bytes, anything else as text."""
+    if isinstance(answer, pd.DataFrame):
+        return encode_table(answer), ANSWER_TABLE
+    return str(answer), ANSWER_TEXT
+
+
+def decode_answer(entry):
+    """Returns the answer of a HistoryEntry as a DataFrame or text."""
+    if entry.answer_format == ANSWER_TABLE:
+        return decode_table(entry.answer)
+    return entry.answer
+
+
+class ConversationHistory:
+    """
+    The question/answer turns of one browser session, oldest first.
+
+    Answers are stored compactly (see encode_answer). When the total size
+    passes max_bytes, or the count passes max_turns, the oldest turns are
+    dropped and counted in dropped_turns, so a long session cannot grow
+    without bound.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, max_turns=DEFAULT_MAX_TURNS):
+        self.max_bytes = max_bytes
+        self.max_turns = max_turns
+        self.size_bytes = 0
+        self.dropped_turns = 0
+        self._entries = deque()
+        self._next_turn = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __iter__(self):
+        return iter(self._entries)
+
+    def append(self, question, answer, tables=()):
+        """Adds a turn. tables are DataFrames shown along with the answer."""
+        payload, answer_format = encode_answer(answer)
+        tables = tuple(encode_table(table) for table in tables)
+        size = len(question) + len(payload) + sum(len(table) for table in tables)
+        self._entries.append(HistoryEntry(self._next_turn, question, payload, answer_format, tables, size))
+        self._next_turn += 1
+        self.size_bytes += size
+        # Always keep the newest turn, even if it alone is over the cap
+        while len(self._entries) > 1 and (
+            self.size_bytes > self.max_bytes or len(self._entries) > self.max_turns
+        ):
+            self.size_bytes -= self._entries.popleft().size
+            self.dropped_turns += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.size_bytes = 0
+        self.dropped_turns = 0
+
+    def recent(self, count):
+        """The newest count turns, newest first."""
+        count = min(count, len(self._entries))
+        return [self._entries[-1 - i] for i in range(count)]
+
+    def older(self, skip, page, page_size):
+        """
+        One page of the turns older than the newest skip turns, newest first.
+        page is 0-based.
+        """
+        start = skip + page * page_size
+        stop = min(start + page_size, len(self._entries))
+        return [self._entries[-1 - i] for i in range(start, stop)]
+
+
+def history_from_env():
+    """
+    Builds a ConversationHistory configured by environment variables:
+
+        APP_HISTORY_MAX_BYTES   history kept per browser session (default 4 MiB)
+        APP_HISTORY_MAX_TURNS   turns kept per browser session (default 2000)
+    """
+    return ConversationHistory(
+        max_bytes=int(os.environ.get("APP_HISTORY_MAX_BYTES", DEFAULT_MAX_BYTES)),
+        max_turns=int(os.environ.get("APP_HISTORY_MAX_TURNS", DEFAULT_MAX_TURNS))
+    )
@@ -1,17 +1,53 @@
 import os
 import json
-import base64
-import io
-import sys
+import time
 import boto3
 
-from boto3.session import Session
-from botocore.auth import SigV4Auth
-from botocore.awsrequest import AWSRequest
-from botocore.credentials import Credentials
-from requests import request
+from event_stream import (
+    AgentStreamError,
+    ChunkEvent,
+    ErrorEvent,
+    ReturnControlEvent,
+    ReturnControlResultsEvent,
+    TraceEvent,
+    final_response_from_trace,
+    iter_agent_events,
+)
+from action_results import action_results_from_events
+from response_cache import response_cache_from_env
+from return_control import MAX_RETURN_CONTROL_ROUNDS, run_return_control
+from sigv4_client import AgentRequestError, SigV4Client
+from trace_collector import TraceCollector
+import telemetry
 
-ssm = boto3.client('ssm')
+# ---------------------------------------------------------------------
+# REGION CONFIGURATION:
+# ---------------------------------------------------------------------
+theRegion = "us-west-2"
+os.environ["AWS_REGION"] = theRegion
+
+# Point AGENT_RUNTIME_ENDPOINT at a local stand-in (e.g. benchmarks/fake_agent_runtime.py)
+# to run the app or load tests without calling Bedrock.
+agentRuntimeEndpoint = os.environ.get(
+    "AGENT_RUNTIME_ENDPOINT",
+    f"https://bedrock-agent-runtime.{theRegion}.amazonaws.com"
+)
+
+# ---------------------------------------------------------------------
+# AWS CLIENTS (created on first use, not at import)
+# ---------------------------------------------------------------------
+_ssm = None
+
+def get_ssm_client():
+    """
+    Returns the process-wide SSM client, creating it on first use so that
+    importing this module (on every cold app start) does not build a boto3
+    client that is only needed when reading the agent IDs from SSM.
+    """
+    global _ssm
+    if _ssm is None:
+        _ssm = boto3.client('ssm', region_name=theRegion)
+    return _ssm
 
 # ---------------------------------------------------------------------
 # Replace with your actual Agent ID and Alias ID below:
@@ -21,33 +57,66 @@ agentId = "<YOUR AGENT ID>" #INPUT YOUR AGENT ID HERE.
 agentAliasId = "<YOUR ALIAS ID>" #INPUT YOUR ALIAS ID HERE.
 
 # Fetch parameters
-#agentId = ssm.get_parameter(Name='/agent-id', WithDecryption=True)['Parameter']['Value'] #valid if CFN infrastructure templates were ran
-#agentAliasId = ssm.get_parameter(Name='/alias-id', WithDecryption=True)['Parameter']['Value'] #valid if CFN infrastructure templates were ran
+#agentId = get_ssm_client().get_parameter(Name='/agent-id', WithDecryption=True)['Parameter']['Value'] #valid if CFN infrastructure templates were ran
+#agentAliasId = get_ssm_client().get_parameter(Name='/alias-id', WithDecryption=True)['Parameter']['Value'] #valid if CFN infrastructure templates were ran
 
 
 # ---------------------------------------------------------------------
-# REGION CONFIGURATION:
+# SHARED HTTP CLIENT
 # ---------------------------------------------------------------------
-theRegion = "us-west-2"
-os.environ["AWS_REGION"] = theRegion
+_client = None
+
+def get_client():
+    """
+    Returns the process-wide SigV4Client, creating it on first use. The client
+    keeps connections to bedrock-agent-runtime alive between questions and
+    resolves credentials once instead of on every request.
+    """
+    global _client
+    if _client is None:
+        _client = SigV4Client()
+    return _client
+
+def configure_client(**kwargs):
+    """
+    Replaces the process-wide client, e.g. configure_client(pool_maxsize=50,
+    max_retries=5, read_timeout=120). See SigV4Client for all options.
+    """
+    global _client
+    old_client = _client
+    _client = SigV4Client(**kwargs)
+    if old_client is not None:
+        old_client.close()
+    return _client
 
 # ---------------------------------------------------------------------
-# HELPER FUNCTION TO GET AWS CREDENTIALS SAFELY
+# RESPONSE CACHE
 # ---------------------------------------------------------------------
-def get_frozen_credentials():
+_response_cache = None
+_response_cache_loaded = False
+
+def get_response_cache():
     """
-    Safely obtain frozen AWS credentials from the current Boto3 Session.
-    Raise an error if credentials are not found to clarify what's missing.
+    Returns the process-wide ResponseCache configured by the AGENT_CACHE_*
+    environment variables (see response_cache.py), or None when caching is
+    turned off with AGENT_CACHE_BACKEND=off.
     """
-    session = Session()
-    creds = session.get_credentials()
-    if not creds:
-        raise EnvironmentError(
-            "No valid AWS credentials found. Ensure you've configured AWS credentials "
-            "correctly (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, etc.) or set up an "
-            "AWS profile that Boto3 can discover."
-        )
-    return creds.get_frozen_credentials()
+    global _response_cache, _response_cache_loaded
+    if not _response_cache_loaded:
+        _response_cache = response_cache_from_env()
+        _response_cache_loaded = True
+    return _response_cache
+
+def configure_cache(cache):
+    """
+    Replaces the process-wide response cache, e.g.
+    configure_cache(ResponseCache(SQLiteCache('/tmp/answers.db'))). Pass None
+    to turn caching off.
+    """
+    global _response_cache, _response_cache_loaded
+    _response_cache = cache
+    _response_cache_loaded = True
+    return cache
 
 # ---------------------------------------------------------------------
 # SIGNED REQUEST FUNCTION
@@ -60,10 +129,12 @@ def sigv4_request(
     headers=None,
     service='execute-api',
     region=None,
-    credentials=None
+    credentials=None,
+    stream=False,
+    client=None
 ):
     """
-    Sends an HTTP request signed with SigV4.
+    Sends an HTTP request signed with SigV4 over the shared, pooled client.
     
     Args:
         url: The request URL (e.g. 'https://www.example.com').
@@ -73,50 +144,56 @@ def sigv4_request(
         headers: The request headers (e.g. { 'content-type': 'application/json' }).
         service: The AWS service name. Defaults to 'execute-api'.
         region: The AWS region. Defaults to whatever is set by the environment variable "AWS_REGION".
-        credentials: The AWS credentials to use. Defaults to get_frozen_credentials().
+        credentials: The AWS credentials to use. Defaults to the client's cached credentials.
+        stream: If True, the body is read lazily (e.g. via iter_content). Defaults to False.
+        client: SigV4Client to send with instead of the shared one.
     Returns:
         The HTTP response (requests.Response object).
     """
     if region is None:
         region = os.environ.get("AWS_REGION", "us-west-2")
-    if credentials is None:
-        credentials = get_frozen_credentials()
 
-    # sign request
-    req = AWSRequest(
+    return (client or get_client()).request(
+        url,
         method=method,
-        url=url,
-        data=body,
+        body=body,
         params=params,
-        headers=headers
-    )
-    SigV4Auth(credentials, service, region).add_auth(req)
-    prepared_req = req.prepare()
-
-    # send request
-    return request(
-        method=prepared_req.method,
-        url=prepared_req.url,
-        headers=prepared_req.headers,
-        data=prepared_req.body
+        headers=headers,
+        service=service,
+        region=region,
+        credentials=credentials,
+        stream=stream
     )
 
 # ---------------------------------------------------------------------
 # ASK QUESTION / INVOKE AGENT
 # ---------------------------------------------------------------------
-def askQuestion(question, url, endSession=False):
+def agent_url(sessionId):
     """
-    Sends a JSON POST request to the Bedrock Agent endpoint and returns the
-    captured output (for debugging) and the final LLM response text.
+    Builds the InvokeAgent URL for your Bedrock Agent and the given session.
+    """
+    return f'{agentRuntimeEndpoint}/agents/{agentId}/agentAliases/{agentAliasId}/sessions/{sessionId}/text'
+
+def send_question(question, url, endSession=False, streamFinalResponse=False, sessionState=None, client=None):
+    """
+    Sends the signed InvokeAgent POST request and returns the streaming
+    requests.Response without reading its body. sessionState carries the
+    results of returned control back to the agent (see iter_turn_events).
+    client is a SigV4Client to use instead of the shared one.
     """
     myobj = {
         "inputText": question,
         "enableTrace": True,
         "endSession": endSession
     }
-    
-    # send request
-    response = sigv4_request(
+    if sessionState is not None:
+        myobj["sessionState"] = sessionState
+    if streamFinalResponse:
+        # Ask the agent to emit the final answer as incremental chunks
+        # instead of one chunk once orchestration is done.
+        myobj["streamingConfigurations"] = {"streamFinalResponse": True}
+
+    return sigv4_request(
         url,
         method='POST',
         service='bedrock',
@@ -125,72 +202,245 @@ def askQuestion(question, url, endSession=False):
             'accept': 'application/json',
         },
         region=theRegion,
-        body=json.dumps(myobj)
+        body=json.dumps(myobj),
+        stream=True,
+        client=client
     )
-    
-    return decode_response(response)
+
+def askQuestion(question, url, endSession=False):
+    """
+    Sends a JSON POST request to the Bedrock Agent endpoint and returns the
+    TraceCollector with the decoded events (for debugging) and the final LLM
+    response text.
+    """
+    with telemetry.turn("agent.turn", endSession=endSession):
+        with telemetry.span("agent.decode"):
+            return decode_events(iter_turn_events(question, url, endSession))
+
+def askQuestion_cached(question, sessionId, endSession=False, bypassCache=False):
+    """
+    askQuestion with the response cache in front of it. Repeated questions
+    are answered from the cache, trace output included, without calling the
+    agent. Ending a session always goes to the agent.
+
+    Args:
+        question: The user input text.
+        sessionId: The agent session ID.
+        endSession: Whether to end the agent session after this turn.
+        bypassCache: Skip the cache lookup and refresh the entry with a new answer.
+    Returns:
+        (trace_collector, final_response), like askQuestion.
+    """
+    cache = get_response_cache()
+    if cache is None:
+        return askQuestion(question, agent_url(sessionId), endSession)
+    if endSession:
+        cache.end_session(sessionId)
+        return askQuestion(question, agent_url(sessionId), endSession)
+
+    if not bypassCache:
+        cached = lookup_cached_answer(cache, question, sessionId)
+        if cached is not None:
+            return cached
+
+    try:
+        collector, final_response = askQuestion(question, agent_url(sessionId), endSession)
+    except Exception:
+        record_answer(cache, question, sessionId, None, None)
+        raise
+    record_answer(cache, question, sessionId, collector, final_response)
+    return collector, final_response
+
+def lookup_cached_answer(cache, question, sessionId):
+    """
+    Looks the question up in the response cache, counting the hit or miss in
+    telemetry. Returns (trace_collector, final_response) on a hit, else None.
+    """
+    with telemetry.span("cache.lookup"):
+        cached = cache.get(question, agentId, agentAliasId, sessionId)
+    if cached is None:
+        telemetry.increment("cache.misses")
+        return None
+    telemetry.increment("cache.hits")
+    return TraceCollector.from_records(cached["trace"]), cached["response"]
+
+def record_answer(cache, question, sessionId, collector, final_response):
+    """
+    Records an agent turn in the response cache. Pass final_response=None for
+    a turn that reached the agent but did not complete: no later turn of the
+    session is then answered from the cache.
+    """
+    if final_response is None:
+        cache.invalidate(sessionId)
+    else:
+        cache.put(question, agentId, agentAliasId, sessionId, final_response, collector.to_records())
+
+def askQuestion_stream(question, url, endSession=False, streamFinalResponse=True):
+    """
+    Generator counterpart of askQuestion. Yields ChunkEvent, TraceEvent and
+    ReturnControlEvent objects as soon as each frame is decoded, so callers
+    can render the answer and the trace before the agent finishes. Returned
+    control is answered in-process, see iter_turn_events.
+
+    Args:
+        question: The user input text.
+        url: The agent runtime .../sessions/{sessionId}/text URL.
+        endSession: Whether to end the agent session after this turn.
+        streamFinalResponse: Ask the agent to stream the final answer in parts.
+    Yields:
+        Typed events from event_stream.
+    Raises:
+        RuntimeError: If the agent runtime sends an exception frame.
+    """
+    with telemetry.turn("agent.turn", endSession=endSession):
+        yield from iter_turn_events(question, url, endSession, streamFinalResponse)
+
+def iter_turn_events(question, url, endSession=False, streamFinalResponse=False, client=None):
+    """
+    Yields the events of one agent turn, which may take several requests.
+
+    When the agent returns control (an action group configured with
+    RETURN_CONTROL), the requested actions are run in-process by
+    return_control.run_return_control, a ReturnControlResultsEvent with
+    their results is yielded after the ReturnControlEvent, and the results
+    are sent back in sessionState on a new request that continues the turn.
+
+    Requests go over client, or the shared SigV4Client if None. Raises
+    AgentRequestError if a request is answered with a non-200 status.
+    """
+    sessionState = None
+    for _ in range(MAX_RETURN_CONTROL_ROUNDS + 1):
+        response = send_question(question, url, endSession, streamFinalResponse, sessionState, client)
+        if response.status_code != 200:
+            # Throttling still left after the client's retries, validation
+            # errors etc. come back as JSON, not as an event stream
+            message = response.text
+            response.close()
+            raise AgentRequestError(response.status_code, message)
+        returned = None
+        try:
+            for event in iter_response_events(response):
+                if isinstance(event, ReturnControlEvent):
+                    returned = event
+                yield event
+        finally:
+            response.close()
+        if returned is None:
+            return
+        sessionState = run_return_control(returned)
+        yield ReturnControlResultsEvent(returned.invocation_id, sessionState["returnControlInvocationResults"])
+    raise RuntimeError(f"Agent returned control more than {MAX_RETURN_CONTROL_ROUNDS} times in one turn")
+
+def end_session(sessionId):
+    """
+    Ends an agent session so the service can release its conversation state.
+    Used by the session manager for explicit and idle-timeout cleanup.
+    """
+    response = send_question("End session", agent_url(sessionId), endSession=True)
+    try:
+        for _ in iter_response_events(response):
+            pass
+    finally:
+        response.close()
 
 # ---------------------------------------------------------------------
 # DECODE RESPONSE
 # ---------------------------------------------------------------------
-def decode_response(response):
+STREAM_READ_SIZE = 64 * 1024
+
+def iter_response_events(response):
     """
-    Decodes the chunked/streamed response, looking for base64-encoded 
-    segments. Returns a tuple of (debug_string, final_response).
+    Yields typed agent events from a streaming response, raising an
+    AgentStreamError (a RuntimeError) when an exception frame is received.
+    Orchestration steps found in trace events are timed as spans of the
+    current turn.
     """
-    captured_output = io.StringIO()
-    sys.stdout = captured_output
+    orchestration = telemetry.OrchestrationTimer()
+    byte_chunks = timed_reads(response.iter_content(chunk_size=STREAM_READ_SIZE))
+    for event in iter_agent_events(byte_chunks):
+        if isinstance(event, ErrorEvent):
+            telemetry.increment("agent.errors")
+            raise AgentStreamError(event.error_type, event.message)
+        if isinstance(event, TraceEvent):
+            orchestration.observe(event.trace)
+        yield event
 
-    string = ""
-    for line in response.iter_content():
-        try:
-            string += line.decode(encoding='utf-8')
-        except:
-            # If a particular chunk can't be decoded as UTF-8, just skip it
-            continue
-
-    print("Decoded response:", string)
-    split_response = string.split(":message-type")
-    print(f"Split Response: {split_response}")
-    print(f"Length of split: {len(split_response)}")
-
-    final_response = ""
-    for idx in range(len(split_response)):
-        if "bytes" in split_response[idx]:
-            encoded_last_response = split_response[idx].split("\"")[3]
-            decoded = base64.b64decode(encoded_last_response)
-            final_response_chunk = decoded.decode('utf-8')
-            print(final_response_chunk)
-        else:
-            print(f"No bytes at index {idx}")
-            print(split_response[idx])
-            
-    # Attempt to parse the last part for finalResponse
-    last_response = split_response[-1]
-    print(f"Last Response: {last_response}")
-    if "bytes" in last_response:
-        print("Bytes in last response")
-        encoded_last_response = last_response.split("\"")[3]
-        decoded = base64.b64decode(encoded_last_response)
-        final_response = decoded.decode('utf-8')
-    else:
-        print("No bytes in last response")
-        part1 = string[string.find('finalResponse')+len('finalResponse":'):]
-        part2 = part1[:part1.find('"}')+2]
-        final_response = json.loads(part2)['text']
+def timed_reads(byte_chunks):
+    """
+    Passes byte chunks through while recording, on the current turn, a
+    stream.first_byte span and a stream.body span. stream.body separates
+    time spent waiting on the network (readWaitMs) from time spent by the
+    consumer between reads (processingMs: decoding, and rendering in the app).
+    """
+    turn = telemetry.current_turn()
+    if turn is None:
+        yield from byte_chunks
+        return
+
+    start = time.monotonic()
+    waited = 0.0
+    received = 0
+    first_byte = None
+    chunks = iter(byte_chunks)
+    try:
+        while True:
+            before = time.monotonic()
+            data = next(chunks, None)
+            after = time.monotonic()
+            waited += after - before
+            if data is None:
+                break
+            if first_byte is None:
+                first_byte = after
+                turn.add_span("stream.first_byte", start, after)
+            received += len(data)
+            yield data
+    finally:
+        end = time.monotonic()
+        turn.add_span(
+            "stream.body", start, end,
+            bytesReceived=received,
+            readWaitMs=round(waited * 1000, 3),
+            processingMs=round((end - start - waited) * 1000, 3)
+        )
 
-    # Cleanup the final response
-    final_response = final_response.replace("\"", "")
-    final_response = final_response.replace("{input:{value:", "")
-    final_response = final_response.replace(",source:null}}", "")
+def decode_response(response, collector=None):
+    """
+    Decodes the application/vnd.amazon.eventstream response body frame by
+    frame. Answer chunks are concatenated and every event is recorded in a
+    TraceCollector for debugging. Returns a tuple of (collector, final_response).
+
+    Args:
+        response: The streaming requests.Response from send_question.
+        collector: Optional TraceCollector to record into. Defaults to a new one.
+    """
+    return decode_events(iter_response_events(response), collector)
+
+def decode_events(events, collector=None):
+    """decode_response for an iterable of events, e.g. from iter_turn_events."""
+    if collector is None:
+        collector = TraceCollector()
 
-    # Restore original stdout
-    sys.stdout = sys.__stdout__
+    answer_chunks = []
+    trace_final_response = None
+    for event in events:
+        collector.record(event)
+        if isinstance(event, ChunkEvent):
+            answer_chunks.append(event.bytes)
+        elif isinstance(event, TraceEvent):
+            trace_final_response = final_response_from_trace(event) or trace_final_response
 
-    # Get debug string
-    captured_string = captured_output.getvalue()
+    if answer_chunks:
+        final_response = b"".join(answer_chunks).decode('utf-8')
+    elif trace_final_response is not None:
+        # No chunk events, use the finalResponse from the trace
+        final_response = trace_final_response
+    else:
+        final_response = ""
 
-    return captured_string, final_response
+    # The answer is returned as the agent wrote it. Structured action output
+    # is read from the trace by action_results, not scraped from this text.
+    return collector, final_response
 
 # ---------------------------------------------------------------------
 # LAMBDA HANDLER (if used in AWS Lambda)
@@ -199,7 +449,18 @@ def lambda_handler(event, context):
     """
     AWS Lambda entry point that handles incoming events, obtains a response from
     askQuestion, and returns structured JSON data.
+
+    An event with "items" (or an "input" JSONL object) instead of a single
+    question runs a batch, see batch_invoke.handle_batch_event.
     """
+    if "items" in event or "input" in event:
+        # Imported here: batch_invoke imports this module
+        from batch_invoke import handle_batch_event
+        try:
+            return {"status_code": 200, "body": json.dumps(handle_batch_event(event, context))}
+        except Exception as e:
+            return {"status_code": 500, "body": json.dumps({"error": str(e)})}
+
     sessionId = event["sessionId"]
     question = event["question"]
     endSession = False
@@ -211,15 +472,22 @@ def lambda_handler(event, context):
             endSession = True
     except:
         endSession = False
-    
-    # Example of building your Bedrock Agent's URL:
-    url = f'https://bedrock-agent-runtime.{theRegion}.amazonaws.com/agents/{agentId}/agentAliases/{agentAliasId}/sessions/{sessionId}/text'
+
+    bypassCache = str(event.get("bypassCache", "false")).lower() == "true"
     
     try:
-        response, trace_data = askQuestion(question, url, endSession)
+        with telemetry.turn("agent.turn", endSession=endSession):
+            collector, final_response = askQuestion_cached(question, sessionId, endSession, bypassCache)
+        # Field names kept as they were: "response" carries the debug text.
+        # "action_results" holds the typed action group results of the turn.
+        action_results = [result._asdict() for result in action_results_from_events(collector.events())]
         return {
             "status_code": 200,
-            "body": json.dumps({"response": response, "trace_data": trace_data})
+            "body": json.dumps({
+                "response": collector.to_text(),
+                "trace_data": final_response,
+                "action_results": action_results
+            })
         }
     except Exception as e:
         return {
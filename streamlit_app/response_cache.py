@@ -0,0 +1,338 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import uuid
+import hashlib
+import threading
+from collections import OrderedDict
+
+from trace_collector import RECORD_RETURN_CONTROL, RECORD_TRACE
+
+# ---------------------------------------------------------------------
+# DEFAULTS (override with environment variables, see response_cache_from_env)
+# ---------------------------------------------------------------------
+DEFAULT_BACKEND = "off"
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_SQLITE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "bedrock-agent-responses.sqlite3")
+# Sessions whose conversation state is tracked; the least recently used are
+# forgotten first and count as new conversations again.
+DEFAULT_MAX_SESSIONS = 10000
+
+# Action group operations with side effects. A turn that called one is never
+# cached: replaying its answer (e.g. "email sent") would skip the action.
+SIDE_EFFECT_API_PATHS = frozenset({"/sendEmail"})
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_question(question):
+    """
+    Normalizes question text so trivially different prompts share a cache
+    entry: case, surrounding/repeated whitespace and trailing punctuation.
+    """
+    text = _WHITESPACE.sub(" ", question.strip().lower())
+    return text.rstrip(" ?!.")
+
+
+def is_cacheable_turn(records):
+    """
+    False for turns that called an operation in SIDE_EFFECT_API_PATHS, or an
+    action without an apiPath (function details), either through the action
+    group Lambda or by returning control. Turns that only ran read-only
+    operations such as /companyResearch or /createPortfolio are cacheable.
+
+    Args:
+        records: TraceCollector.to_records() output for the turn.
+    """
+    api_paths = []
+    for kind, data in records:
+        if kind == RECORD_TRACE:
+            orchestration = data.get('trace', {}).get('orchestrationTrace', {})
+            invocation = orchestration.get('invocationInput', {}).get('actionGroupInvocationInput')
+            if invocation is not None:
+                api_paths.append(invocation.get('apiPath'))
+        elif kind == RECORD_RETURN_CONTROL:
+            for invocation_input in data:
+                api_paths.append((invocation_input.get('apiInvocationInput') or {}).get('apiPath'))
+    return all(path is not None and path not in SIDE_EFFECT_API_PATHS for path in api_paths)
+
+
+class CacheStats:
+    """Hit/miss/eviction counters for a cache backend."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expired = 0
+
+    def as_dict(self):
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "expired": self.expired,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+# ---------------------------------------------------------------------
+# BACKENDS
+#
+# Backends store opaque bytes under a string key with a TTL and keep their
+# total size under max_bytes by evicting least recently used entries.
+# ---------------------------------------------------------------------
+class MemoryCache:
+    """In-process LRU cache with per-entry TTL and a total size limit in bytes."""
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL_SECONDS):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.stats.misses += 1
+                return None
+            expires, value = entry
+            if expires < time.time():
+                del self._entries[key]
+                self.size_bytes -= len(value)
+                self.stats.expired += 1
+                self.stats.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return value
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self.size_bytes -= len(old[1])
+            self._entries[key] = (time.time() + self.ttl, value)
+            self.size_bytes += len(value)
+            self.stats.stores += 1
+            while self.size_bytes > self.max_bytes:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                self.size_bytes -= len(evicted)
+                self.stats.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+
+class SQLiteCache:
+    """
+    On-disk cache in a SQLite file, so answers survive app restarts. Same
+    TTL and byte-size LRU semantics as MemoryCache.
+    """
+
+    def __init__(self, path=DEFAULT_SQLITE_PATH, max_bytes=DEFAULT_MAX_BYTES, ttl=DEFAULT_TTL_SECONDS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.stats = CacheStats()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            " key TEXT PRIMARY KEY, value BLOB NOT NULL, size INTEGER NOT NULL,"
+            " expires REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_access ON responses (last_access)")
+
+    @property
+    def size_bytes(self):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            row = self._db.execute("SELECT value, expires FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+            value, expires = row
+            if expires < now:
+                self._db.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.stats.expired += 1
+                self.stats.misses += 1
+                return None
+            self._db.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self.stats.hits += 1
+            return bytes(value)
+
+    def set(self, key, value):
+        if len(value) > self.max_bytes:
+            return
+        now = time.time()
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO responses (key, value, size, expires, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now + self.ttl, now)
+                )
+                self._db.execute("DELETE FROM responses WHERE expires < ?", (now,))
+                total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > self.max_bytes:
+                    for old_key, size in self._db.execute(
+                        "SELECT key, size FROM responses ORDER BY last_access"
+                    ).fetchall():
+                        if total <= self.max_bytes:
+                            break
+                        self._db.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                        total -= size
+                        self.stats.evictions += 1
+                self._db.execute("COMMIT")
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self.stats.stores += 1
+
+    def clear(self):
+        with self._lock:
+            self._db.execute("DELETE FROM responses")
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+# ---------------------------------------------------------------------
+# RESPONSE CACHE
+# ---------------------------------------------------------------------
+class ResponseCache:
+    """
+    Caches agent answers (final response text plus the trace, so the sidebar
+    still has something to show) keyed on the normalized question, the
+    agent/alias ID and the conversation so far. With session_independent=False
+    the session ID is part of the key as well, so answers are only reused
+    within one conversation.
+
+    The conversation so far is a digest chained over each turn the agent
+    answered in the session, so a follow-up such as "yes" or "why?" only
+    matches an answer given after the same earlier turns. Within one session
+    that rarely repeats; most reuse comes from sessions that open with the
+    same questions, with session_independent=True. Turns that ran side-effecting
+    actions are never stored (see is_cacheable_turn).
+
+    Answers served from the cache are not part of the chain: the agent session
+    never saw those turns, so the next question is keyed (and, on a miss,
+    answered by the agent) without them. A follow-up to a cached answer is
+    therefore answered without that answer in the agent's context.
+    """
+
+    def __init__(self, backend, session_independent=False, max_sessions=DEFAULT_MAX_SESSIONS):
+        self.backend = backend
+        self.session_independent = session_independent
+        self.max_sessions = max_sessions
+        self._contexts = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def stats(self):
+        return self.backend.stats
+
+    def context(self, sessionId):
+        """Digest of the session's turns so far ("" for a new conversation)."""
+        with self._lock:
+            return self._contexts.get(sessionId or "", "")
+
+    def _advance(self, sessionId, context, question, response):
+        digest = hashlib.sha256("\x1f".join([context, normalize_question(question), response]).encode("utf-8"))
+        self._set_context(sessionId, digest.hexdigest())
+
+    def _set_context(self, sessionId, context):
+        with self._lock:
+            self._contexts[sessionId or ""] = context
+            self._contexts.move_to_end(sessionId or "")
+            while len(self._contexts) > self.max_sessions:
+                self._contexts.popitem(last=False)
+
+    def key(self, question, agentId, agentAliasId, sessionId=None, context=""):
+        parts = [agentId, agentAliasId, normalize_question(question), context]
+        if not self.session_independent:
+            parts.append(sessionId or "")
+        return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+    def get(self, question, agentId, agentAliasId, sessionId=None):
+        """
+        Returns the cached {'response': ..., 'trace': ...} dict, or None. A hit
+        leaves the session's context as it was, since the agent never saw it.
+        """
+        value = self.backend.get(self.key(question, agentId, agentAliasId, sessionId, self.context(sessionId)))
+        if value is None:
+            return None
+        return json.loads(value)
+
+    def put(self, question, agentId, agentAliasId, sessionId, response, trace):
+        """
+        Records a turn answered by the agent and stores the answer unless the
+        turn ran a side-effecting action. trace is the TraceCollector.to_records() list.
+        """
+        context = self.context(sessionId)
+        if is_cacheable_turn(trace):
+            value = json.dumps({"response": response, "trace": trace}).encode("utf-8")
+            self.backend.set(self.key(question, agentId, agentAliasId, sessionId, context), value)
+        self._advance(sessionId, context, question, response)
+
+    def invalidate(self, sessionId):
+        """
+        Call when a turn reached the agent but did not complete: the agent's
+        view of the conversation is unknown, so no later turn of the session
+        is answered from the cache.
+        """
+        self._set_context(sessionId, uuid.uuid4().hex)
+
+    def end_session(self, sessionId):
+        """Forgets the session's conversation state."""
+        with self._lock:
+            self._contexts.pop(sessionId or "", None)
+
+
+def response_cache_from_env():
+    """
+    Builds the ResponseCache configured by environment variables, or returns
+    None if caching is turned off:
+
+        AGENT_CACHE_BACKEND      memory, sqlite or off (default)
+        AGENT_CACHE_PATH         SQLite file path
+        AGENT_CACHE_TTL          seconds an answer stays valid (default 3600)
+        AGENT_CACHE_MAX_BYTES    total cache size limit (default 64 MiB)
+        AGENT_CACHE_SHARE_ACROSS_SESSIONS   true to reuse answers across sessions
+    """
+    backend_name = os.environ.get("AGENT_CACHE_BACKEND", DEFAULT_BACKEND).lower()
+    if backend_name in ("off", "none", ""):
+        return None
+    ttl = float(os.environ.get("AGENT_CACHE_TTL", DEFAULT_TTL_SECONDS))
+    max_bytes = int(os.environ.get("AGENT_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES))
+    if backend_name == "sqlite":
+        backend = SQLiteCache(os.environ.get("AGENT_CACHE_PATH", DEFAULT_SQLITE_PATH), max_bytes, ttl)
+    elif backend_name == "memory":
+        backend = MemoryCache(max_bytes, ttl)
+    else:
+        raise ValueError(f"Unknown AGENT_CACHE_BACKEND: {backend_name}")
+    share = os.environ.get("AGENT_CACHE_SHARE_ACROSS_SESSIONS", "false").lower() == "true"
+    return ResponseCache(backend, session_independent=share)
@@ -0,0 +1,159 @@
+import os
+import sys
+import json
+import importlib
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import telemetry
+
+# ---------------------------------------------------------------------
+# RETURN CONTROL
+#
+# When an action group is configured with customControl RETURN_CONTROL,
+# the agent does not invoke the action Lambda. It ends the response with a
+# returnControl event listing the API invocations it wants, and waits for
+# the client to send their results in sessionState.returnControlInvocationResults
+# on the next InvokeAgent request.
+#
+# The invocations are answered here, in-process, by the same
+# lambda_handler the action group Lambda runs (ActionLambda.py at the
+# root of this repository, or ACTION_HANDLER_MODULE on ACTION_HANDLER_DIR).
+# Several invocations in one event run in parallel.
+# ---------------------------------------------------------------------
+ACTION_HANDLER_MODULE = os.environ.get("ACTION_HANDLER_MODULE", "ActionLambda")
+ACTION_HANDLER_DIR = os.environ.get(
+    "ACTION_HANDLER_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+)
+DEFAULT_MAX_WORKERS = 8
+# Guards against an agent that keeps returning control within one turn
+MAX_RETURN_CONTROL_ROUNDS = 10
+
+_handler = None
+_pool = None
+
+
+def get_action_handler():
+    """
+    Returns the action group lambda_handler, importing its module on first
+    use. The module is imported by name, so this is the same module object
+    as any other import of it in the process.
+    """
+    global _handler
+    if _handler is None:
+        try:
+            module = importlib.import_module(ACTION_HANDLER_MODULE)
+        except ImportError:
+            sys.path.append(os.path.abspath(ACTION_HANDLER_DIR))
+            module = importlib.import_module(ACTION_HANDLER_MODULE)
+        _handler = module.lambda_handler
+    return _handler
+
+
+def configure_action_handler(handler):
+    """Replaces the handler used for returned invocations, e.g. with a stub or a wrapped handler."""
+    global _handler
+    _handler = handler
+    return handler
+
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        max_workers = int(os.environ.get("AGENT_RETURN_CONTROL_WORKERS", DEFAULT_MAX_WORKERS))
+        _pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="return-control")
+    return _pool
+
+
+def lambda_event(api_input, session_id=None):
+    """Builds the action group Lambda input event for one apiInvocationInput."""
+    event = {
+        "messageVersion": "1.0",
+        "actionGroup": api_input.get("actionGroup"),
+        "apiPath": api_input.get("apiPath"),
+        "httpMethod": api_input.get("httpMethod", "POST"),
+        "parameters": api_input.get("parameters") or [],
+    }
+    if api_input.get("requestBody"):
+        event["requestBody"] = api_input["requestBody"]
+    if session_id is not None:
+        event["sessionId"] = session_id
+    return event
+
+
+def api_result(api_input, lambda_response):
+    """Turns a lambda_handler response into an apiResult for returnControlInvocationResults."""
+    response = lambda_response["response"]
+    content = {}
+    for content_type, value in (response.get("responseBody") or {}).items():
+        body = value.get("body")
+        # The agent expects the body as a string
+        content[content_type] = {"body": body if isinstance(body, str) else json.dumps(body)}
+    return {
+        "apiResult": {
+            "actionGroup": response.get("actionGroup", api_input.get("actionGroup")),
+            "apiPath": response.get("apiPath", api_input.get("apiPath")),
+            "httpMethod": response.get("httpMethod", api_input.get("httpMethod")),
+            "httpStatusCode": response.get("httpStatusCode", 200),
+            "responseBody": content,
+        }
+    }
+
+
+def _error_result(invocation_input, error):
+    api_input = invocation_input.get("apiInvocationInput")
+    if api_input is None:
+        function_input = invocation_input.get("functionInvocationInput") or {}
+        return {
+            "functionResult": {
+                "actionGroup": function_input.get("actionGroup"),
+                "function": function_input.get("function"),
+                "responseState": "FAILURE",
+                "responseBody": {"TEXT": {"body": str(error)}},
+            }
+        }
+    return {
+        "apiResult": {
+            "actionGroup": api_input.get("actionGroup"),
+            "apiPath": api_input.get("apiPath"),
+            "httpMethod": api_input.get("httpMethod"),
+            "httpStatusCode": 500,
+            "responseBody": {"application/json": {"body": json.dumps({"error": str(error)})}},
+        }
+    }
+
+
+def run_invocation(invocation_input, session_id=None):
+    """
+    Runs one returned invocation through the action handler and returns its
+    result entry. A failing handler is reported to the agent as an HTTP 500
+    result rather than ending the turn.
+    """
+    api_input = invocation_input.get("apiInvocationInput")
+    if api_input is None:
+        return _error_result(invocation_input, "Only API schema action groups are handled locally")
+    with telemetry.span("action.local", apiPath=api_input.get("apiPath")):
+        try:
+            return api_result(api_input, get_action_handler()(lambda_event(api_input, session_id), None))
+        except Exception as e:
+            return _error_result(invocation_input, e)
+
+
+def run_return_control(event, session_id=None):
+    """
+    Answers a ReturnControlEvent. Returns the sessionState to send back:
+    {"invocationId": ..., "returnControlInvocationResults": [...]}, results
+    in the order of event.invocation_inputs.
+    """
+    inputs = event.invocation_inputs
+    if len(inputs) == 1:
+        results = [run_invocation(inputs[0], session_id)]
+    else:
+        # Worker threads do not inherit the current telemetry turn
+        context = contextvars.copy_context()
+        results = list(_get_pool().map(
+            lambda invocation_input: context.copy().run(run_invocation, invocation_input, session_id),
+            inputs
+        ))
+    return {"invocationId": event.invocation_id, "returnControlInvocationResults": results}
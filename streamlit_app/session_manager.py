@@ -0,0 +1,319 @@
+import os
+import time
+import uuid
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# ---------------------------------------------------------------------
+# DEFAULTS (override with environment variables, see session_manager_from_env)
+# ---------------------------------------------------------------------
+# Kept below the agent's IdleSessionTTLInSeconds (900 in the CFN template) so
+# idle sessions are ended explicitly before the service expires them.
+DEFAULT_IDLE_TIMEOUT = 600
+DEFAULT_MAX_IN_FLIGHT = 32
+DEFAULT_MAX_QUEUE = 256
+DEFAULT_QUEUE_TIMEOUT = 120
+DEFAULT_SWEEP_INTERVAL = 30
+DEFAULT_END_BATCH_SIZE = 16
+DEFAULT_END_CONCURRENCY = 4
+
+
+class ServerBusy(Exception):
+    """Raised when no agent call slot frees up in time, or the queue is full."""
+
+
+class SessionBusy(Exception):
+    """Raised when a session already has an agent call in flight."""
+
+
+class AgentSession:
+    """Bookkeeping for one browser's agent conversation."""
+
+    __slots__ = ('session_id', 'created', 'last_used', 'turns', 'in_flight')
+
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.created = self.last_used = time.monotonic()
+        self.turns = 0
+        self.in_flight = False
+
+
+class SessionManager:
+    """
+    Tracks the agent sessions of one app process.
+
+    Every browser session gets its own agent session ID, so conversations
+    never mix. Agent calls take one of max_in_flight process-wide slots;
+    extra calls queue in FIFO order (up to max_queue) and fail with ServerBusy
+    after queue_timeout. Sessions that stay idle longer than idle_timeout,
+    and sessions ended explicitly, are closed with endSession calls made by a
+    background thread in batches, so ending a session never blocks a page.
+    """
+
+    def __init__(
+        self,
+        end_session,
+        idle_timeout=DEFAULT_IDLE_TIMEOUT,
+        max_in_flight=DEFAULT_MAX_IN_FLIGHT,
+        max_queue=DEFAULT_MAX_QUEUE,
+        queue_timeout=DEFAULT_QUEUE_TIMEOUT,
+        sweep_interval=DEFAULT_SWEEP_INTERVAL,
+        end_batch_size=DEFAULT_END_BATCH_SIZE,
+        end_concurrency=DEFAULT_END_CONCURRENCY
+    ):
+        """
+        Args:
+            end_session: Callable taking a session ID that ends it on the agent side.
+            idle_timeout: Seconds without a turn after which a session is ended.
+            max_in_flight: Maximum concurrent agent calls in this process.
+            max_queue: Maximum calls waiting for a slot before new ones are refused.
+            queue_timeout: Default seconds a call may wait for a slot.
+            sweep_interval: Seconds between idle session sweeps.
+            end_batch_size: Sessions ended per background batch.
+            end_concurrency: Concurrent endSession calls within a batch.
+        """
+        self.end_session = end_session
+        self.idle_timeout = idle_timeout
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.sweep_interval = sweep_interval
+        self.end_batch_size = end_batch_size
+        self.end_concurrency = end_concurrency
+
+        self.in_flight = 0
+        self.ended = 0
+        self.end_errors = 0
+        self._sessions = {}
+        self._waiters = deque()
+        self._to_end = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._worker = None
+
+    # -----------------------------------------------------------------
+    # SESSIONS
+    # -----------------------------------------------------------------
+    def new_session(self):
+        """Creates and tracks a new agent session; returns its ID."""
+        session_id = uuid.uuid4().hex
+        with self._lock:
+            self._sessions[session_id] = AgentSession(session_id)
+        self._ensure_worker()
+        return session_id
+
+    def touch(self, session_id):
+        """
+        Marks a session as used now, so an open page keeps its session alive
+        between turns. Returns False if the session is no longer tracked
+        (ended, or swept as idle), in which case the caller needs a new one.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                return False
+            session.last_used = time.monotonic()
+            return True
+
+    def end(self, session_id):
+        """Stops tracking a session and queues its endSession call."""
+        with self._lock:
+            if self._sessions.pop(session_id, None) is not None:
+                self._to_end.append(session_id)
+        self._wake.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "sessions": len(self._sessions),
+                "in_flight": self.in_flight,
+                "waiting": len(self._waiters),
+                "pending_end": len(self._to_end),
+                "ended": self.ended,
+                "end_errors": self.end_errors,
+            }
+
+    # -----------------------------------------------------------------
+    # IN-FLIGHT LIMIT
+    # -----------------------------------------------------------------
+    def acquire(self, session_id, timeout=None, on_wait=None):
+        """
+        Takes an agent call slot for the session, waiting in FIFO order if all
+        slots are taken. on_wait(position) is called once, before waiting, so
+        the caller can tell the user where they are in the queue.
+        If on_wait raises, the place in the queue is given up and the error
+        propagates.
+
+        Raises:
+            SessionBusy: If this session already has a call in flight.
+            ServerBusy: If the queue is full or no slot frees up within timeout.
+        """
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = self._sessions[session_id] = AgentSession(session_id)
+            if session.in_flight:
+                raise SessionBusy("A question for this session is already being answered")
+            if self.in_flight < self.max_in_flight and not self._waiters:
+                self.in_flight += 1
+                session.in_flight = True
+                session.last_used = time.monotonic()
+                return
+            if len(self._waiters) >= self.max_queue:
+                raise ServerBusy("Too many questions are waiting for the agent")
+            waiter = threading.Event()
+            self._waiters.append(waiter)
+            position = len(self._waiters)
+            # Reserved now so a second tab of the same session cannot queue too
+            session.in_flight = True
+
+        if on_wait is not None:
+            try:
+                on_wait(position)
+            except BaseException:
+                # e.g. a Streamlit rerun/stop raised from the callback
+                self._abandon(session, waiter)
+                raise
+        granted = waiter.wait(self.queue_timeout if timeout is None else timeout)
+
+        with self._lock:
+            if not granted and waiter in self._waiters:
+                self._waiters.remove(waiter)
+                session.in_flight = False
+                raise ServerBusy("Timed out waiting for the agent")
+            # Granted by release(), possibly just as the wait timed out
+            session.last_used = time.monotonic()
+
+    def _abandon(self, session, waiter):
+        """Undoes a queued acquire(): dequeues the waiter, or passes on the slot it was already handed."""
+        with self._lock:
+            session.in_flight = False
+            if waiter in self._waiters:
+                self._waiters.remove(waiter)
+            elif self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self.in_flight -= 1
+
+    def release(self, session_id):
+        """Returns the session's slot, handing it straight to the oldest waiter."""
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None:
+                session.in_flight = False
+                session.turns += 1
+                session.last_used = time.monotonic()
+            if self._waiters:
+                self._waiters.popleft().set()
+            else:
+                self.in_flight -= 1
+
+    def slot(self, session_id, timeout=None, on_wait=None):
+        """Context manager form of acquire()/release()."""
+        return _Slot(self, session_id, timeout, on_wait)
+
+    # -----------------------------------------------------------------
+    # BACKGROUND CLEANUP
+    # -----------------------------------------------------------------
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name="agent-session-cleanup", daemon=True)
+                    self._worker.start()
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.end_concurrency) as pool:
+            while not self._stopped.is_set():
+                self._wake.wait(self.sweep_interval)
+                self._wake.clear()
+                self._queue_idle_sessions()
+                while self._flush_batch(pool):
+                    pass
+
+    def _queue_idle_sessions(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        with self._lock:
+            idle = [
+                session_id for session_id, session in self._sessions.items()
+                if not session.in_flight and session.last_used < cutoff
+            ]
+            for session_id in idle:
+                del self._sessions[session_id]
+                self._to_end.append(session_id)
+
+    def _flush_batch(self, pool):
+        with self._lock:
+            batch = [self._to_end.popleft() for _ in range(min(self.end_batch_size, len(self._to_end)))]
+        if not batch:
+            return False
+        for session_id, error in zip(batch, pool.map(self._end_one, batch)):
+            with self._lock:
+                if error is None:
+                    self.ended += 1
+                else:
+                    self.end_errors += 1
+            if error is not None:
+                print(f"Failed to end agent session {session_id}: {error}")
+        return True
+
+    def _end_one(self, session_id):
+        try:
+            self.end_session(session_id)
+            return None
+        except Exception as e:
+            return e
+
+    def close(self, end_sessions=True):
+        """
+        Stops the background thread. With end_sessions, every tracked session
+        is ended first (e.g. on shutdown).
+        """
+        if end_sessions:
+            with self._lock:
+                self._to_end.extend(self._sessions)
+                self._sessions.clear()
+            if self._worker is not None:
+                with ThreadPoolExecutor(max_workers=self.end_concurrency) as pool:
+                    while self._flush_batch(pool):
+                        pass
+        self._stopped.set()
+        self._wake.set()
+
+
+class _Slot:
+    __slots__ = ('manager', 'session_id', 'timeout', 'on_wait')
+
+    def __init__(self, manager, session_id, timeout, on_wait):
+        self.manager = manager
+        self.session_id = session_id
+        self.timeout = timeout
+        self.on_wait = on_wait
+
+    def __enter__(self):
+        self.manager.acquire(self.session_id, self.timeout, self.on_wait)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.manager.release(self.session_id)
+        return False
+
+
+def session_manager_from_env(end_session):
+    """
+    Builds a SessionManager configured by environment variables:
+
+        AGENT_SESSION_IDLE_TIMEOUT   seconds before an idle session is ended (default 600)
+        AGENT_MAX_IN_FLIGHT          concurrent agent calls per process (default 32)
+        AGENT_MAX_QUEUE              calls allowed to wait for a slot (default 256)
+        AGENT_QUEUE_TIMEOUT          seconds a call may wait for a slot (default 120)
+    """
+    return SessionManager(
+        end_session,
+        idle_timeout=float(os.environ.get("AGENT_SESSION_IDLE_TIMEOUT", DEFAULT_IDLE_TIMEOUT)),
+        max_in_flight=int(os.environ.get("AGENT_MAX_IN_FLIGHT", DEFAULT_MAX_IN_FLIGHT)),
+        max_queue=int(os.environ.get("AGENT_MAX_QUEUE", DEFAULT_MAX_QUEUE)),
+        queue_timeout=float(os.environ.get("AGENT_QUEUE_TIMEOUT", DEFAULT_QUEUE_TIMEOUT))
+    )
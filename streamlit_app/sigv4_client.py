@@ -0,0 +1,239 @@
+import threading
+
+import requests
+from boto3.session import Session
+from botocore.auth import SigV4Auth
+from botocore.awsrequest import AWSRequest
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import telemetry
+
+# ---------------------------------------------------------------------
+# DEFAULTS
+# ---------------------------------------------------------------------
+DEFAULT_POOL_CONNECTIONS = 10
+DEFAULT_POOL_MAXSIZE = 20
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_CONNECT_TIMEOUT = 5
+DEFAULT_READ_TIMEOUT = 300
+
+# Throttling and transient gateway errors are safe to retry because the
+# agent runtime has not started the turn when it returns them.
+RETRY_STATUS_CODES = (429, 502, 503, 504)
+
+
+class AgentRequestError(Exception):
+    """Raised when the agent runtime returns a non-200 status."""
+
+    def __init__(self, status, message):
+        super().__init__(f"HTTP {status}: {message}")
+        self.status = status
+
+
+# ---------------------------------------------------------------------
+# SIGNER
+# ---------------------------------------------------------------------
+class CachedKeySigV4Auth(SigV4Auth):
+    """
+    SigV4Auth that derives the signing key once per (secret, date) instead of
+    running the four HMAC steps on every request. Only the string to sign,
+    which changes with each request, is signed per call.
+    """
+
+    def __init__(self, credentials, service_name, region_name):
+        super().__init__(credentials, service_name, region_name)
+        # (secret key, yyyymmdd) -> derived key, stored as one tuple so that
+        # concurrent signers never see a key paired with the wrong date.
+        self._signing_key_cache = (None, None)
+
+    def signature(self, string_to_sign, request):
+        key_id = (self.credentials.secret_key, request.context['timestamp'][0:8])
+        cached_id, signing_key = self._signing_key_cache
+        if cached_id != key_id:
+            k_date = self._sign(('AWS4' + key_id[0]).encode('utf-8'), key_id[1])
+            k_region = self._sign(k_date, self._region_name)
+            k_service = self._sign(k_region, self._service_name)
+            signing_key = self._sign(k_service, 'aws4_request')
+            self._signing_key_cache = (key_id, signing_key)
+        return self._sign(signing_key, string_to_sign, hex=True)
+
+
+# ---------------------------------------------------------------------
+# CREDENTIALS + SIGNER CACHE
+# ---------------------------------------------------------------------
+class SigV4Signer:
+    """
+    Signs requests with SigV4, resolving the boto3 credential chain once and
+    caching one signer per (service, region). Refreshable credentials are
+    re-read on every call, which is a cheap check unless they are about to
+    expire. Shared by the sync and asyncio clients.
+    """
+
+    def __init__(self, boto_session=None):
+        """
+        Args:
+            boto_session: boto3 Session used to resolve credentials. Defaults to a new Session().
+        """
+        self._boto_session = boto_session
+        self._credentials = None
+        self._signers = {}
+        self._lock = threading.Lock()
+
+    def get_credentials(self):
+        """
+        Returns frozen credentials, resolving the provider chain only once.
+        Raises EnvironmentError if no credentials can be found.
+        """
+        if self._credentials is None:
+            with self._lock:
+                if self._credentials is None:
+                    session = self._boto_session or Session()
+                    creds = session.get_credentials()
+                    if not creds:
+                        raise EnvironmentError(
+                            "No valid AWS credentials found. Ensure you've configured AWS credentials "
+                            "correctly (AWS_ACCESS_KEY_ID, AWS_SECRET_ACCESS_KEY, etc.) or set up an "
+                            "AWS profile that Boto3 can discover."
+                        )
+                    self._credentials = creds
+        return self._credentials.get_frozen_credentials()
+
+    def get_signer(self, service, region, credentials=None):
+        """
+        Returns the cached signer for (service, region), replacing it only when
+        the credentials have been rotated or refreshed.
+        """
+        if credentials is None:
+            credentials = self.get_credentials()
+        key = (service, region)
+        signer = self._signers.get(key)
+        if signer is None or signer.credentials != credentials:
+            signer = CachedKeySigV4Auth(credentials, service, region)
+            self._signers[key] = signer
+        return signer
+
+    def sign(
+        self,
+        url,
+        method='GET',
+        body=None,
+        params=None,
+        headers=None,
+        service='execute-api',
+        region='us-west-2',
+        credentials=None
+    ):
+        """
+        Signs a request and returns the prepared botocore AWSPreparedRequest
+        (method, url, headers, body) ready to hand to any HTTP library.
+        """
+        req = AWSRequest(
+            method=method,
+            url=url,
+            data=body,
+            params=params,
+            headers=headers
+        )
+        self.get_signer(service, region, credentials).add_auth(req)
+        return req.prepare()
+
+
+# ---------------------------------------------------------------------
+# CLIENT
+# ---------------------------------------------------------------------
+class SigV4Client:
+    """
+    Reusable client for SigV4-signed HTTP requests.
+
+    Owns a pooled, keep-alive requests.Session so repeated calls to the same
+    endpoint reuse TCP+TLS connections, and a SigV4Signer so credentials and
+    signers are not rebuilt for every call.
+    """
+
+    def __init__(
+        self,
+        pool_connections=DEFAULT_POOL_CONNECTIONS,
+        pool_maxsize=DEFAULT_POOL_MAXSIZE,
+        max_retries=DEFAULT_MAX_RETRIES,
+        backoff_factor=DEFAULT_BACKOFF_FACTOR,
+        connect_timeout=DEFAULT_CONNECT_TIMEOUT,
+        read_timeout=DEFAULT_READ_TIMEOUT,
+        boto_session=None
+    ):
+        """
+        Args:
+            pool_connections: Number of per-host connection pools to keep.
+            pool_maxsize: Maximum open connections kept per host.
+            max_retries: Retries for connection errors and throttling responses.
+            backoff_factor: Exponential backoff factor between retries (seconds).
+            connect_timeout: Seconds to wait for a connection.
+            read_timeout: Seconds to wait between bytes of the response.
+            boto_session: boto3 Session used to resolve credentials. Defaults to a new Session().
+        """
+        retry = Retry(
+            total=max_retries,
+            connect=max_retries,
+            read=0,
+            status=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=RETRY_STATUS_CODES,
+            allowed_methods=None,
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.http = requests.Session()
+        self.http.mount('https://', adapter)
+        self.http.mount('http://', adapter)
+        self.timeout = (connect_timeout, read_timeout)
+        self.signer = SigV4Signer(boto_session)
+
+    def get_credentials(self):
+        """Returns the cached frozen credentials. See SigV4Signer.get_credentials."""
+        return self.signer.get_credentials()
+
+    def request(
+        self,
+        url,
+        method='GET',
+        body=None,
+        params=None,
+        headers=None,
+        service='execute-api',
+        region='us-west-2',
+        credentials=None,
+        stream=False,
+        timeout=None
+    ):
+        """
+        Signs and sends a request over the pooled session.
+
+        Arguments match sigv4_request in invoke_agent.py, plus an optional
+        timeout (seconds or a (connect, read) tuple) overriding the default.
+        Returns the requests.Response object.
+
+        Records a sigv4.sign span and an http.request span; the latter covers
+        connecting (if no pooled connection is free), sending and waiting for
+        the response headers, i.e. time to first byte when stream=True.
+        """
+        with telemetry.span("sigv4.sign", service=service):
+            prepared_req = self.signer.sign(url, method, body, params, headers, service, region, credentials)
+
+        with telemetry.span("http.request", method=method) as request_span:
+            response = self.http.request(
+                method=prepared_req.method,
+                url=prepared_req.url,
+                headers=prepared_req.headers,
+                data=prepared_req.body,
+                stream=stream,
+                timeout=timeout or self.timeout
+            )
+            if telemetry.ENABLED:
+                request_span.attributes["status"] = response.status_code
+        return response
+
+    def close(self):
+        """Closes all pooled connections."""
+        self.http.close()
@@ -0,0 +1,429 @@
+import os
+import json
+import time
+import uuid
+import bisect
+import random
+import itertools
+import threading
+import contextlib
+import contextvars
+from collections import namedtuple
+
+# ---------------------------------------------------------------------
+# CONFIGURATION
+#
+#   AGENT_TELEMETRY=off        turn all instrumentation into no-ops
+#   TELEMETRY_EXPORT=json|emf|otel  print a structured log line per finished turn
+#                              (otel: an OTLP/JSON traces request for a collector)
+#   TELEMETRY_NAMESPACE        CloudWatch namespace for EMF (default BedrockAgentApp)
+#   OTEL_SERVICE_NAME          service.name of exported OTLP spans (default bedrock-agent-app)
+# ---------------------------------------------------------------------
+ENABLED = os.environ.get("AGENT_TELEMETRY", "on").lower() not in ("off", "false", "0")
+EXPORT_FORMAT = os.environ.get("TELEMETRY_EXPORT", "").lower()
+NAMESPACE = os.environ.get("TELEMETRY_NAMESPACE", "BedrockAgentApp")
+SERVICE_NAME = os.environ.get("OTEL_SERVICE_NAME", "bedrock-agent-app")
+
+# Histogram bucket upper bounds in milliseconds.
+DEFAULT_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+# Span IDs only need to be unique within a trace; a counter with a random
+# start is much cheaper than a uuid per span.
+_span_ids = itertools.count(random.getrandbits(48))
+
+# One timed operation within a turn. start/end are time.monotonic() seconds.
+Span = namedtuple('Span', ['span_id', 'parent_id', 'name', 'start', 'end', 'attributes'])
+
+
+# ---------------------------------------------------------------------
+# PROCESS-WIDE METRICS
+# ---------------------------------------------------------------------
+class Histogram:
+    """Fixed-bucket latency histogram (milliseconds) with count, sum, min and max."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS_MS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None or value < self.min else self.min
+        self.max = value if self.max is None or value > self.max else self.max
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of observations."""
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        seen = 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def as_dict(self):
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.5),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+            "buckets": dict(zip([str(b) for b in self.buckets] + ["+Inf"], self.counts)),
+        }
+
+
+class Metrics:
+    """Thread-safe counters and latency histograms shared by all turns in the process."""
+
+    def __init__(self):
+        self._counters = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name, value_ms):
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(value_ms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": dict(self._counters),
+                "histograms": {name: h.as_dict() for name, h in self._histograms.items()},
+            }
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+metrics = Metrics()
+
+
+# ---------------------------------------------------------------------
+# TURNS AND SPANS
+# ---------------------------------------------------------------------
+class Turn:
+    """
+    The spans recorded for one agent turn. Spans started with span() while
+    the turn is current (see start_turn) are added to it, nested under the
+    innermost open span.
+    """
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self.trace_id = uuid.uuid4().hex
+        self.spans = []
+        self.wall_start = time.time()
+        self.start = time.monotonic()
+        self.end = None
+        self._open = []
+
+    @property
+    def duration_ms(self):
+        end = self.end if self.end is not None else time.monotonic()
+        return (end - self.start) * 1000
+
+    def add_span(self, name, start, end, parent_id=None, **attributes):
+        """Adds an already measured span, e.g. one derived from trace events."""
+        if parent_id is None and self._open:
+            parent_id = self._open[-1]
+        span = Span(f"{next(_span_ids):016x}", parent_id, name, start, end, attributes)
+        self.spans.append(span)
+        return span
+
+    def waterfall(self):
+        """Spans as rows of {name, start_ms, duration_ms} relative to the turn start, in start order."""
+        rows = [
+            {
+                "name": span.name,
+                "start_ms": (span.start - self.start) * 1000,
+                "duration_ms": (span.end - span.start) * 1000,
+                **span.attributes,
+            }
+            for span in sorted(self.spans, key=lambda span: span.start)
+        ]
+        return rows
+
+    def to_log_record(self):
+        """Structured JSON log record for the turn."""
+        return {
+            "turn": self.name,
+            "traceId": self.trace_id,
+            "timestamp": int(self.wall_start * 1000),
+            "durationMs": self.duration_ms,
+            "attributes": self.attributes,
+            "spans": self.waterfall(),
+        }
+
+    def to_emf(self, namespace=NAMESPACE):
+        """
+        CloudWatch Embedded Metric Format record: total turn duration plus the
+        summed duration of each span name, in milliseconds.
+        """
+        durations = {}
+        for span in self.spans:
+            durations[span.name] = durations.get(span.name, 0.0) + (span.end - span.start) * 1000
+        durations[self.name] = self.duration_ms
+        record = {
+            "_aws": {
+                "Timestamp": int(self.wall_start * 1000),
+                "CloudWatchMetrics": [{
+                    "Namespace": namespace,
+                    "Dimensions": [["Turn"]],
+                    "Metrics": [{"Name": name, "Unit": "Milliseconds"} for name in durations],
+                }],
+            },
+            "Turn": self.name,
+            "traceId": self.trace_id,
+        }
+        record.update(durations)
+        return record
+
+    def to_otel_spans(self):
+        """
+        The turn and its spans as OTLP/JSON span objects (traceId, spanId,
+        parentSpanId, start/end in unix nanoseconds), ready to post to an
+        OpenTelemetry collector's /v1/traces endpoint inside a resourceSpans
+        envelope.
+        """
+        root_id = self.trace_id[:16]
+
+        def unix_nano(monotonic):
+            return str(int((self.wall_start + monotonic - self.start) * 1e9))
+
+        def attributes(values):
+            return [{"key": key, "value": {"stringValue": str(value)}} for key, value in values.items()]
+
+        end = self.end if self.end is not None else time.monotonic()
+        spans = [{
+            "traceId": self.trace_id,
+            "spanId": root_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": unix_nano(self.start),
+            "endTimeUnixNano": unix_nano(end),
+            "attributes": attributes(self.attributes),
+        }]
+        for span in self.spans:
+            spans.append({
+                "traceId": self.trace_id,
+                "spanId": span.span_id,
+                "parentSpanId": span.parent_id or root_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": unix_nano(span.start),
+                "endTimeUnixNano": unix_nano(span.end),
+                "attributes": attributes(span.attributes),
+            })
+        return spans
+
+
+class _SpanContext:
+    __slots__ = ('turn', 'name', 'attributes', 'start', 'span_id')
+
+    def __init__(self, turn, name, attributes):
+        self.turn = turn
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self):
+        self.start = time.monotonic()
+        if self.turn is not None:
+            self.span_id = f"{next(_span_ids):016x}"
+            self.turn._open.append(self.span_id)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        end = time.monotonic()
+        if exc_type is not None:
+            self.attributes["error"] = exc_type.__name__
+        metrics.observe(self.name, (end - self.start) * 1000)
+        turn = self.turn
+        if turn is not None:
+            turn._open.remove(self.span_id)
+            parent_id = turn._open[-1] if turn._open else None
+            turn.spans.append(Span(self.span_id, parent_id, self.name, self.start, end, self.attributes))
+        return False
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+_current_turn = contextvars.ContextVar('agent_turn', default=None)
+
+
+def span(name, **attributes):
+    """
+    Times a block with the monotonic clock:
+
+        with telemetry.span("sigv4.sign"):
+            ...
+
+    The duration goes into the process-wide histogram for name and, when a
+    turn is current, into that turn's spans. Returns a shared no-op context
+    manager when telemetry is disabled.
+    """
+    if not ENABLED:
+        return _NOOP_SPAN
+    return _SpanContext(_current_turn.get(), name, attributes)
+
+
+def increment(name, value=1):
+    """Adds to a process-wide counter."""
+    if ENABLED:
+        metrics.increment(name, value)
+
+
+def current_turn():
+    """Returns the Turn being recorded in this context, or None."""
+    return _current_turn.get()
+
+
+def start_turn(name, **attributes):
+    """
+    Starts recording a turn in the current context and returns (turn, token).
+    Pass both to end_turn. Returns (None, None) when telemetry is disabled.
+    """
+    if not ENABLED:
+        return None, None
+    turn = Turn(name, **attributes)
+    return turn, _current_turn.set(turn)
+
+
+def end_turn(turn, token):
+    """Finishes a turn started with start_turn, records its duration and exports it."""
+    if turn is None:
+        return
+    turn.end = time.monotonic()
+    try:
+        _current_turn.reset(token)
+    except ValueError:
+        # Finished from a different context (e.g. a generator closed elsewhere).
+        _current_turn.set(None)
+    metrics.observe(turn.name, turn.duration_ms)
+    export(turn)
+
+
+@contextlib.contextmanager
+def turn(name, **attributes):
+    """
+    Context manager recording a turn, unless one is already current (then the
+    outer turn is reused, so nested helpers add spans to the caller's turn).
+    Yields the Turn, or None when telemetry is disabled.
+    """
+    existing = _current_turn.get()
+    if existing is not None or not ENABLED:
+        yield existing
+        return
+    new_turn, token = start_turn(name, **attributes)
+    try:
+        yield new_turn
+    finally:
+        end_turn(new_turn, token)
+
+
+def otlp_traces(spans, service_name=SERVICE_NAME):
+    """Wraps OTLP/JSON span objects in the request body of a collector's /v1/traces endpoint."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": spans}],
+        }]
+    }
+
+
+def export(turn, export_format=None):
+    """Prints the turn as a JSON log line, EMF record or OTLP traces request, per TELEMETRY_EXPORT."""
+    export_format = export_format or EXPORT_FORMAT
+    if export_format == "json":
+        print(json.dumps(turn.to_log_record()))
+    elif export_format == "emf":
+        print(json.dumps(turn.to_emf()))
+    elif export_format == "otel":
+        print(json.dumps(otlp_traces(turn.to_otel_spans())))
+
+
+# ---------------------------------------------------------------------
+# ORCHESTRATION STEPS FROM TRACE EVENTS
+# ---------------------------------------------------------------------
+# invocationInput key -> (observation key, step name)
+_INVOCATION_STEPS = {
+    "actionGroupInvocationInput": ("actionGroupInvocationOutput", "orchestration.action_group"),
+    "knowledgeBaseLookupInput": ("knowledgeBaseLookupOutput", "orchestration.kb_retrieval"),
+    "codeInterpreterInvocationInput": ("codeInterpreterInvocationOutput", "orchestration.code_interpreter"),
+}
+
+
+class OrchestrationTimer:
+    """
+    Derives per-step timings from orchestration trace events as they arrive:
+    model invocations (modelInvocationInput -> modelInvocationOutput),
+    knowledge base retrievals and action group calls (invocationInput ->
+    observation). Steps are timed by event arrival on the monotonic clock,
+    and recorded as spans on the current turn.
+    """
+
+    def __init__(self, turn=None):
+        self.turn = turn if turn is not None else current_turn()
+        self._pending = {}
+
+    def observe(self, trace, at=None):
+        if self.turn is None:
+            return
+        at = time.monotonic() if at is None else at
+        orchestration = trace.get('trace', {}).get('orchestrationTrace')
+        if not orchestration:
+            return
+
+        if 'modelInvocationInput' in orchestration:
+            self._pending['model'] = at
+        elif 'modelInvocationOutput' in orchestration:
+            self._finish('model', 'orchestration.model_invocation', at, orchestration['modelInvocationOutput'])
+        elif 'invocationInput' in orchestration:
+            invocation = orchestration['invocationInput']
+            for input_key, (output_key, _) in _INVOCATION_STEPS.items():
+                if input_key in invocation:
+                    self._pending[output_key] = at
+        elif 'observation' in orchestration:
+            observation = orchestration['observation']
+            for output_key, step_name in _INVOCATION_STEPS.values():
+                if output_key in observation:
+                    self._finish(output_key, step_name, at, {})
+
+    def _finish(self, key, step_name, at, details):
+        start = self._pending.pop(key, None)
+        if start is None:
+            return
+        attributes = {}
+        usage = details.get('metadata', {}).get('usage') if isinstance(details, dict) else None
+        if usage:
+            attributes['inputTokens'] = usage.get('inputTokens')
+            attributes['outputTokens'] = usage.get('outputTokens')
+        self.turn.add_span(step_name, start, at, **attributes)
+        metrics.observe(step_name, (at - start) * 1000)
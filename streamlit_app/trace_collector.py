@@ -0,0 +1,134 @@
+import json
+import threading
+from collections import deque
+
+from event_stream import ChunkEvent, ReturnControlEvent, ReturnControlResultsEvent, TraceEvent
+
+# ---------------------------------------------------------------------
+# DEFAULTS
+# ---------------------------------------------------------------------
+# An agent turn usually produces tens of trace events; the cap only matters
+# for runaway orchestration loops.
+DEFAULT_MAX_EVENTS = 2000
+
+RECORD_CHUNK = "chunk"
+RECORD_TRACE = "trace"
+RECORD_RETURN_CONTROL = "returnControl"
+RECORD_RETURN_CONTROL_RESULTS = "returnControlResults"
+
+_TEXT_PREFIXES = {
+    RECORD_CHUNK: "Chunk",
+    RECORD_TRACE: "Trace",
+    RECORD_RETURN_CONTROL: "Return control",
+    RECORD_RETURN_CONTROL_RESULTS: "Return control results",
+}
+
+
+class TraceCollector:
+    """
+    Collects the decoded events of one agent turn as objects.
+
+    Each request gets its own collector, so concurrent Streamlit sessions or
+    Lambda threads never share state. Events are kept in a ring buffer: once
+    max_events (or max_bytes, if set) is exceeded the oldest events are dropped
+    and counted in dropped_events. Nothing is serialized until to_text(),
+    to_records() or to_json() is called.
+    """
+
+    def __init__(self, max_events=DEFAULT_MAX_EVENTS, max_bytes=None, max_event_bytes=None):
+        """
+        Args:
+            max_events: Maximum number of events kept.
+            max_bytes: Optional cap on the total serialized size of kept events.
+            max_event_bytes: Optional cap on one event; larger events are dropped.
+        """
+        self.max_events = max_events
+        self.max_bytes = max_bytes
+        self.max_event_bytes = max_event_bytes
+        self.size_bytes = 0
+        self.dropped_events = 0
+        self._events = deque()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._events)
+
+    def record(self, event):
+        """
+        Records a ChunkEvent, TraceEvent, ReturnControlEvent or
+        ReturnControlResultsEvent. Other events are ignored.
+        """
+        if isinstance(event, ChunkEvent):
+            self.add(RECORD_CHUNK, event.bytes)
+        elif isinstance(event, TraceEvent):
+            self.add(RECORD_TRACE, event.trace)
+        elif isinstance(event, ReturnControlEvent):
+            self.add(RECORD_RETURN_CONTROL, event.invocation_inputs)
+        elif isinstance(event, ReturnControlResultsEvent):
+            self.add(RECORD_RETURN_CONTROL_RESULTS, event.results)
+
+    def add(self, kind, data):
+        """Records one (kind, data) pair; data is bytes for chunks, JSON-serializable otherwise."""
+        size = 0
+        # Sizing a trace means serializing it, so only pay for it when a
+        # size cap is actually configured.
+        if self.max_bytes is not None or self.max_event_bytes is not None:
+            size = len(data) if kind == RECORD_CHUNK else len(json.dumps(data))
+            if self.max_event_bytes is not None and size > self.max_event_bytes:
+                with self._lock:
+                    self.dropped_events += 1
+                return
+
+        with self._lock:
+            self._events.append((kind, data, size))
+            self.size_bytes += size
+            while len(self._events) > self.max_events or (
+                self.max_bytes is not None and self.size_bytes > self.max_bytes
+            ):
+                _, _, dropped_size = self._events.popleft()
+                self.size_bytes -= dropped_size
+                self.dropped_events += 1
+
+    def events(self, kind=None):
+        """Returns a snapshot list of (kind, data) pairs, optionally of one kind only."""
+        with self._lock:
+            snapshot = list(self._events)
+        return [(k, data) for k, data, _ in snapshot if kind is None or k == kind]
+
+    def traces(self):
+        """Returns the raw trace event dicts in order."""
+        return [data for _, data in self.events(RECORD_TRACE)]
+
+    def to_records(self):
+        """Returns a JSON-serializable list of [kind, data] pairs (chunks as text)."""
+        return [
+            [kind, data.decode("utf-8", errors="replace") if kind == RECORD_CHUNK else data]
+            for kind, data in self.events()
+        ]
+
+    @classmethod
+    def from_records(cls, records, **kwargs):
+        """Rebuilds a collector from to_records() output, e.g. from the response cache."""
+        collector = cls(**kwargs)
+        for kind, data in records:
+            collector.add(kind, data.encode("utf-8") if kind == RECORD_CHUNK else data)
+        return collector
+
+    def to_json(self):
+        return json.dumps(self.to_records())
+
+    def to_text(self):
+        """
+        Renders the events as the "Chunk: ... / Trace: {...}" debug text that
+        decode_response used to capture from stdout.
+        """
+        lines = []
+        for kind, data in self.to_records():
+            text = data if kind == RECORD_CHUNK else json.dumps(data)
+            lines.append(f"{_TEXT_PREFIXES[kind]}: {text}")
+        if self.dropped_events:
+            lines.append(f"({self.dropped_events} events dropped)")
+        return "\n".join(lines) + ("\n" if lines else "")
+
+    def __str__(self):
+        return self.to_text()